@@ -0,0 +1,135 @@
+# advisory.py
+from functools import lru_cache
+import numpy as np
+
+from anomaly import RANGES
+from speednslip import calculate_parameters_batch, gear_options, IMPLEMENT_WIDTH, SOIL_FACTOR
+
+# Operating-point advisor for the Tractor Advisory System page.
+#
+# The calculate_parameters equations are evaluated once over the whole
+# engine speed x throttle x gear x depth grid and the table is cached per
+# implement/soil setting (lru_cache), so it is only rebuilt when those
+# inputs change.  A recommendation then slices the table at the current
+# engine speed and picks the best feasible cell, which takes well under a
+# millisecond and can run every tick.
+
+ENGINE_SPEED_GRID = np.arange(1200, 1801, 20)  # rpm
+THROTTLE_GRID = np.arange(45, 86)              # %
+GEAR_NAMES = tuple(gear_options)
+GEAR_GRID = np.array([gear_options[name] for name in GEAR_NAMES])
+DEPTH_GRID = np.arange(5, 25.5, 0.5)           # cm
+
+# Wheel speed to ground speed: rolling diameter 1.6 m, rev/min to km/h
+WHEEL_KMH_PER_RPM = 3.14 * 1.6 * (60 / 1000)
+
+OBJECTIVES = {
+    'fuel_consumption_area': 'min',  # L/ha
+    'tractive_efficiency': 'max',    # %
+}
+
+# Metrics kept in the table, each shaped (engine speed, throttle, gear, depth)
+TABLE_METRICS = (
+    'fuel_consumption', 'fuel_consumption_area', 'implement_draft',
+    'tractive_efficiency', 'engine_power', 'forward_speed',
+)
+
+# Least engine power (hp) of a recommended setting; near zero power the
+# per-power metrics (tractive efficiency, specific fuel) blow up
+MIN_ENGINE_POWER = 10.0
+
+# Metrics that must lie within their anomaly.RANGES limits
+BOUNDED_METRICS = ('engine_torque', 'fuel_consumption', 'engine_power', 'tractive_efficiency')
+
+# Wheel slip (%) at working depth (cm): 5 % plus 0.6 % per cm, plus noise,
+# within 0-40 %.  The synthetic fleet (synthdata, as an AR(1) process) and
+# the what-if simulator (independent draws) add noise of standard deviation
+# SLIP_NOISE.
+SLIP_NOISE = 2.0
+
+def depth_slip(depth, noise=0.0):
+    return np.clip(5 + 0.6 * depth + noise, 0, 40)
+
+# Forward speed (km/h) in each gear at the given engine speed and slip
+def forward_speed(engine_speed, gear_ratio, slip):
+    return engine_speed / gear_ratio * WHEEL_KMH_PER_RPM * (1 - slip / 100)
+
+class OperatingTable:
+    def __init__(self, width, soil_factor, slip):
+        self.width = width
+        self.soil_factor = soil_factor
+        self.slip = slip
+
+        engine_speed = ENGINE_SPEED_GRID[:, None, None, None]
+        throttle = THROTTLE_GRID[None, :, None, None]
+        gear_ratio = GEAR_GRID[None, None, :, None]
+        depth = DEPTH_GRID[None, None, None, :]
+        results = calculate_parameters_batch(
+            throttle, engine_speed, forward_speed(engine_speed, gear_ratio, slip), depth, gear_ratio,
+            width=width, soil_factor=soil_factor, slip=slip,
+        )
+        self.metrics = {name: np.ascontiguousarray(results[name]) for name in TABLE_METRICS}
+
+        # Points where the fitted polynomials give non-physical torque, fuel
+        # flow, power or tractive efficiency (outside anomaly.RANGES), or too
+        # little power for the per-power metrics to mean anything, never get
+        # recommended
+        self.valid = results['engine_power'] >= MIN_ENGINE_POWER
+        for name in BOUNDED_METRICS:
+            low, high = RANGES[name]
+            self.valid &= results[name] > low
+            if high is not None:
+                self.valid &= results[name] <= high
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.metrics.values()) + self.valid.nbytes
+
+# Table for an implement/soil setting; rebuilt only when one of them changes
+@lru_cache(maxsize=8)
+def operating_table(width=IMPLEMENT_WIDTH, soil_factor=SOIL_FACTOR, slip=15.0):
+    return OperatingTable(width, soil_factor, slip)
+
+# Best throttle, gear and depth at the current engine speed.
+#
+# objective is one of OBJECTIVES; max_draft (kN) and the depth range limit
+# the feasible set.  Returns a dict describing the setting and its predicted
+# metrics, or None when no grid point satisfies the constraints.
+def recommend(engine_speed, objective='fuel_consumption_area', max_draft=None, min_depth=None, max_depth=None,
+              width=IMPLEMENT_WIDTH, soil_factor=SOIL_FACTOR, slip=15.0):
+    if objective not in OBJECTIVES:
+        raise ValueError(f"unknown objective {objective!r}, expected one of {sorted(OBJECTIVES)}")
+
+    table = operating_table(width, soil_factor, slip)
+    row = int(np.abs(ENGINE_SPEED_GRID - engine_speed).argmin())
+
+    feasible = table.valid[row].copy()
+    if max_draft is not None:
+        feasible &= table.metrics['implement_draft'][row] <= max_draft
+    if min_depth is not None:
+        feasible &= DEPTH_GRID >= min_depth
+    if max_depth is not None:
+        feasible &= DEPTH_GRID <= max_depth
+    if not feasible.any():
+        return None
+
+    values = table.metrics[objective][row]
+    if OBJECTIVES[objective] == 'min':
+        score = np.where(feasible, values, np.inf)
+        best = np.unravel_index(np.argmin(score), score.shape)
+    else:
+        score = np.where(feasible, values, -np.inf)
+        best = np.unravel_index(np.argmax(score), score.shape)
+
+    t, g, d = best
+    advice = {
+        'engine_speed': int(ENGINE_SPEED_GRID[row]),
+        'throttle': int(THROTTLE_GRID[t]),
+        'gear': GEAR_NAMES[g],
+        'gear_ratio': int(GEAR_GRID[g]),
+        'implement_depth': float(DEPTH_GRID[d]),
+        'objective': objective,
+    }
+    for name in TABLE_METRICS:
+        advice[name] = float(table.metrics[name][row][best])
+    return advice
@@ -0,0 +1,180 @@
+# anomaly.py
+import numpy as np
+
+# Streaming anomaly detection on the operating and derived channels.
+#
+# Every value goes through two checks:
+#   - range: outside the physical limits in RANGES (negative torque or
+#     power, tractive efficiency above 100 %, specific fuel consumption
+#     blowing up as engine power nears zero, ...);
+#   - spike: more than z_threshold standard deviations from the channel's
+#     exponentially weighted moving average (EWMA), once the channel has
+#     seen warmup in-range values.
+# An AnomalyDetector keeps its state in a few (streams, channels) arrays,
+# one stream per tractor, so memory per channel is constant and one update
+# scores every tractor with a handful of NumPy operations.
+#
+# The EWMA starts as a plain running mean and variance (weight 1/n) and
+# settles to weight alpha after 1/alpha values.  Spikes enter it clipped to
+# the threshold band, so a single spike does not inflate the variance but a
+# lasting change of level is followed; out-of-range and NaN values are left
+# out.
+#
+# Alerts are kept per (stream, channel, check) as a count plus the time and
+# value of the latest occurrence, so the pages can list what fired recently
+# without storing events.
+
+# Physical limits (low, high) in the units calculate_parameters produces;
+# None leaves that side open
+RANGES = {
+    'throttle': (0, 100),                      # %
+    'engine_speed': (0, 3000),                 # rpm
+    'forward_speed': (0, 30),                  # km/h
+    'implement_depth': (0, 50),                # cm, the simulators draw 5-45
+    'slip': (-10, 100),                        # %, slightly negative when the wheels skid
+    # The torque polynomial diverges outside the throttle/engine speed
+    # range it was fitted on
+    'engine_torque': (0, 400),                 # Nm
+    'fuel_consumption': (0, 20),               # L/h
+    'engine_power': (0, 100),                  # hp
+    'specific_fuel_consumption': (0, 1000),
+    'fuel_consumption_area': (0, 100),         # L/ha
+    'implement_draft': (0, None),
+    'drawbar_power': (0, None),
+    'tractive_efficiency': (0, 100),           # %
+}
+
+# Channels the pages leave out of the checks.  Tractive efficiency divides
+# drawbar power by engine power, so wherever the engine polynomials leave
+# their fitted range it is meaningless (negative, or thousands of %) along
+# with the engine power, which is checked itself; checking it as well
+# raised an alert on almost every simulator sample.
+UNCHECKED_CHANNELS = ('tractive_efficiency',)
+
+CHECKS = ('range', 'spike')
+
+class AnomalyDetector:
+    # channels are the columns of the values passed to update(); streams is
+    # the initial number of rows (it grows as higher stream indices arrive)
+    def __init__(self, channels, streams=1, alpha=0.05, z_threshold=4.0, warmup=30, ranges=None):
+        self.channels = tuple(channels)
+        ranges = RANGES if ranges is None else ranges
+        limits = [ranges.get(name, (None, None)) for name in self.channels]
+        self.low = np.array([-np.inf if low is None else low for low, _ in limits], dtype=np.float64)
+        self.high = np.array([np.inf if high is None else high for _, high in limits], dtype=np.float64)
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+
+        shape = (streams, len(self.channels))
+        self.mean = np.zeros(shape)
+        self.var = np.zeros(shape)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.alert_count = np.zeros((len(CHECKS),) + shape, dtype=np.int64)
+        self.alert_time = np.full((len(CHECKS),) + shape, np.nan)
+        self.alert_value = np.full((len(CHECKS),) + shape, np.nan)
+
+    @property
+    def streams(self):
+        return len(self.mean)
+
+    def _grow(self, streams):
+        def resize(array, axis, fill):
+            shape = list(array.shape)
+            shape[axis] = streams - array.shape[axis]
+            return np.concatenate((array, np.full(shape, fill, dtype=array.dtype)), axis=axis)
+
+        self.mean = resize(self.mean, 0, 0.0)
+        self.var = resize(self.var, 0, 0.0)
+        self.count = resize(self.count, 0, 0)
+        self.alert_count = resize(self.alert_count, 1, 0)
+        self.alert_time = resize(self.alert_time, 1, np.nan)
+        self.alert_value = resize(self.alert_value, 1, np.nan)
+
+    # Score one row of values per stream and fold them into the averages.
+    # values is (n, channels) for the streams listed in rows (default: all
+    # streams in order), time a scalar or one time per row.  Returns the
+    # out-of-range and spike flags and the z-scores, each (n, channels).
+    def update(self, values, time, rows=None):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[None, :]
+        if rows is None:
+            if len(values) > self.streams:
+                self._grow(len(values))
+            rows = slice(0, len(values))
+        else:
+            rows = np.asarray(rows, dtype=np.intp)
+            if len(rows) and rows.max() >= self.streams:
+                self._grow(max(int(rows.max()) + 1, 2 * self.streams))
+        mean, var, count = self.mean[rows], self.var[rows], self.count[rows]
+
+        finite = ~np.isnan(values)
+        out_of_range = finite & ((values < self.low) | (values > self.high))
+        usable = finite & ~out_of_range
+        std = np.sqrt(var)
+        deviation = values - mean
+        z = np.divide(deviation, std, out=np.zeros_like(deviation), where=std > 0)
+        spike = usable & (count >= self.warmup) & (np.abs(z) > self.z_threshold)
+
+        # Clip spikes to the threshold band before they enter the average
+        band = self.z_threshold * std
+        deviation = np.where(spike, np.clip(deviation, -band, band), deviation)
+        deviation = np.where(usable, deviation, 0.0)
+        count += usable
+        weight = np.maximum(self.alpha, 1.0 / np.maximum(count, 1))
+        weight = np.where(usable, weight, 0.0)
+        step = weight * deviation
+        mean += step
+        var = (1 - weight) * (var + deviation * step)
+
+        self.mean[rows], self.var[rows], self.count[rows] = mean, var, count
+        time = np.asarray(time, dtype=np.float64)
+        if time.ndim:
+            time = time[:, None]
+        for k, flags in enumerate((out_of_range, spike)):
+            self.alert_count[k][rows] += flags
+            self.alert_time[k][rows] = np.where(flags, time, self.alert_time[k][rows])
+            self.alert_value[k][rows] = np.where(flags, values, self.alert_value[k][rows])
+        return out_of_range, spike, z
+
+    # Score a column batch of one stream row by row (e.g. everything a
+    # telemetry source returned in one read)
+    def update_columns(self, columns, stream=0, time_channel='time'):
+        values = np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in self.channels])
+        rows = np.array([stream])
+        for t, row in zip(columns[time_channel].tolist(), values):
+            self.update(row, t, rows)
+
+    # Alerts that fired at or after since, newest first, as dicts with the
+    # stream, channel, check, latest value and time, and how many times the
+    # check has fired for that channel; stream=None covers every stream
+    def alerts(self, since=-np.inf, stream=None, limit=None):
+        times = self.alert_time if stream is None else self.alert_time[:, stream:stream + 1]
+        with np.errstate(invalid='ignore'):
+            k, s, c = np.nonzero(times >= since)
+        order = np.argsort(-times[k, s, c], kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        offset = 0 if stream is None else stream
+        alerts = []
+        for i in order.tolist():
+            check, row, channel = int(k[i]), int(s[i]) + offset, int(c[i])
+            alerts.append({
+                'stream': row,
+                'channel': self.channels[channel],
+                'check': CHECKS[check],
+                'value': float(self.alert_value[check, row, channel]),
+                'time': float(self.alert_time[check, row, channel]),
+                'count': int(self.alert_count[check, row, channel]),
+                'low': float(self.low[channel]),
+                'high': float(self.high[channel]),
+                'mean': float(self.mean[row, channel]),
+            })
+        return alerts
+
+    # Memory held by the state arrays (bytes)
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.mean, self.var, self.count,
+                                      self.alert_count, self.alert_time, self.alert_value))
@@ -1,23 +1,132 @@
 import streamlit as st
-from gps import show_gps_page
-from speednslip import display_parameters
-from fc import show_fc_page
-from PIL import Image
+from sessionlog import SessionRecorder
+from assets import load_image
+import perf
+from datetime import datetime
+import os
 #import sys
 #import os
 #sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-image = Image.open("logo.png")
-st.sidebar.image(image)
+
+# The pages (and folium/matplotlib behind them) and the ingestion server are
+# imported only when first used, so start-up and reruns only pay for what
+# the selected page needs
+image = load_image("logo.png")
+if image is not None:
+    st.sidebar.image(image)
 st.sidebar.title("An AI-IoT based Tractor Field Performance Monitoring cum Advisory System for Optimum Tillage")
 page = st.sidebar.selectbox("Select an option", ("Tractor Operating Parameters", "Tractor Performance Prediction","Tractor Advisory System"))
+record = st.sidebar.checkbox("Record session to disk")
+fleet = st.sidebar.checkbox("Live fleet telemetry")
+offline_map = st.sidebar.checkbox("Offline map tiles")
+
+# Optional per-phase timing panel, refreshed every 2 seconds
+@st.fragment(run_every=2.0)
+def perf_panel():
+    st.markdown(perf.panel_html(), unsafe_allow_html=True)
+
+if st.sidebar.checkbox("Show performance panel"):
+    st.sidebar.download_button("Download timings (JSON)", perf.to_json(), file_name="tracadvise-perf.json",
+                               mime="application/json")
+    with st.sidebar:
+        perf_panel()
+
+# One ingestion server per process, shared by every session
+@st.cache_resource
+def fleet_server():
+    from ingest import start_in_thread
+    return start_in_thread(host="0.0.0.0")
+
+# One producer per page, tractor and prediction engine, shared by every
+# session watching it
+@st.cache_resource
+def fleet_producer(name, tractor_id, engine='equations'):
+    from ingest import FleetSource
+    source = FleetSource(fleet_server().state, tractor_id)
+    if name == "gps":
+        from gps import make_producer
+        return make_producer(source)
+    from speednslip import make_producer
+    return make_producer(source, engine)
+
+# Pages read the selected tractor from the ingestion server, or fall back to
+# their shared simulators
+tractor_id = None
+if fleet:
+    try:
+        server = fleet_server()
+    except OSError as error:
+        st.sidebar.error(f"Fleet telemetry server could not start: {error}")
+        fleet = False
+if fleet:
+    tractor_ids = server.state.tractor_ids()
+    if tractor_ids:
+        tractor_id = st.sidebar.selectbox("Tractor ID", tractor_ids)
+    else:
+        st.sidebar.info(f"Waiting for tractors on UDP {server.udp_port} / TCP {server.tcp_port}")
+
+# One tile server per process, serving the map from the tiles/ cache (filled
+# by `python tilecache.py seed` and by the tiles viewed online).  It listens
+# on TRACADVISE_TILE_HOST, by default loopback, so only a browser on this
+# machine can reach it.  Bound to the network (0.0.0.0, for a tablet on the
+# field network) it serves seeded tiles only, instead of relaying requests
+# from anyone on the network to the OpenStreetMap servers.  The browser
+# fetches the tiles, so the URL names this machine by the host the page was
+# loaded from, unless TRACADVISE_TILE_URL gives the tile URL template: set
+# it behind a reverse proxy or HTTPS, where http://host:port is unreachable
+# or blocked as mixed content.
+TILE_HOST = os.environ.get("TRACADVISE_TILE_HOST", "127.0.0.1")
+TILE_URL = os.environ.get("TRACADVISE_TILE_URL")
+
+@st.cache_resource
+def tile_server():
+    from tilecache import DEFAULT_UPSTREAM, TileCache, loopback, start_in_thread
+    cache = TileCache(upstream=DEFAULT_UPSTREAM if loopback(TILE_HOST) else None)
+    return start_in_thread(cache, host=TILE_HOST, public_url=TILE_URL)
+
+def tile_url():
+    from urllib.parse import urlsplit
+    host = urlsplit("//" + st.context.headers.get("Host", "")).hostname
+    return tile_server().url_for(host)
+
+def page_producer(name, engine='equations'):
+    return None if tractor_id is None else fleet_producer(name, tractor_id, engine)
+
+# Each page visit records into its own directory under sessions/; the
+# recorder lives in the session state until recording stops or the page or
+# prediction engine changes.  The engine is kept in the session's metadata,
+# so the surrogate is never refitted on its own predictions.  A recorder
+# left open when the browser session ends is closed when the session state
+# is dropped, or at exit.
+def session_recorder(name, engine='equations'):
+    current = st.session_state.get('recorder')
+    if current is not None and (not record or current[0] != (name, engine)):
+        current[1].close()
+        del st.session_state['recorder']
+        current = None
+    if not record or name is None:
+        return None
+    if current is None:
+        suffix = name if engine == 'equations' else f"{name}-{engine}"
+        recorder = SessionRecorder(os.path.join("sessions", f"{datetime.now():%Y%m%d-%H%M%S}-{suffix}"),
+                                   metadata={'engine': engine})
+        current = st.session_state['recorder'] = ((name, engine), recorder)
+    return current[1]
 
 if page == "Tractor Operating Parameters":
-    show_gps_page()
+    from gps import show_gps_page
+    show_gps_page(producer=page_producer("gps"), recorder=session_recorder("gps"),
+                  tiles=tile_url() if offline_map else None)
 else:
     if page == "Tractor Performance Prediction":
-        display_parameters()
+        from speednslip import display_parameters, prediction_engine
+        engine = prediction_engine()
+        display_parameters(producer=page_producer("performance", engine),
+                           recorder=session_recorder("performance", engine), engine=engine)
     else:
         if page == "Tractor Advisory System":
-            show_fc_page()
+            from fc import show_fc_page
+            session_recorder(None)
+            show_fc_page(fleet_state=fleet_server().state if fleet else None)
         
 
@@ -0,0 +1,15 @@
+# assets.py
+import os
+
+import streamlit as st
+
+# Static images shown by the pages (logo, page banners), read once per
+# process and shared by every session.  st.image accepts the raw bytes, so
+# reruns neither touch the disk nor decode the file again.  Missing files
+# give None so the page can skip the image.
+@st.cache_resource
+def load_image(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,29 @@
+# Latency of the advisory engine: table build (on implement/soil change)
+# and per-tick recommendation.
+# Run from the repository root:  python -m benchmarks.bench_advisory [queries]
+import sys
+import time
+import numpy as np
+
+from advisory import OBJECTIVES, operating_table, recommend
+
+def main(queries=2000):
+    operating_table.cache_clear()
+    start = time.perf_counter()
+    table = operating_table()
+    build_ms = 1000 * (time.perf_counter() - start)
+    print(f"table build: {build_ms:.1f} ms, {table.nbytes / 1e6:.1f} MB")
+
+    rng = np.random.default_rng(0)
+    engine_speeds = rng.integers(1200, 1801, queries).tolist()
+    for objective in OBJECTIVES:
+        samples = []
+        for engine_speed in engine_speeds:
+            start = time.perf_counter()
+            recommend(engine_speed, objective, max_draft=6, min_depth=10)
+            samples.append(time.perf_counter() - start)
+        p50, p99 = 1000 * np.percentile(samples, [50, 99])
+        print(f"{objective:>22}: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,50 @@
+# Anomaly detector over a whole fleet: cost of scoring one tick of every
+# (tractor, channel) pair and how many injected spikes and range faults it
+# catches on otherwise normal data.
+# Run from the repository root:  python -m benchmarks.bench_anomaly [tractors] [ticks]
+import sys
+import time
+import numpy as np
+
+from anomaly import AnomalyDetector
+from ingest import ANOMALY_CHANNELS
+
+def main(tractors=770, ticks=600):
+    rng = np.random.default_rng(0)
+    channels = len(ANOMALY_CHANNELS)
+    detector = AnomalyDetector(ANOMALY_CHANNELS, streams=tractors)
+    # Plausible per-tractor levels with 2 % noise
+    level = rng.uniform(0.2, 0.8, (tractors, channels)) * np.where(np.isfinite(detector.high), detector.high, 1000)
+
+    spikes = faults = caught_spikes = caught_faults = false_alarms = 0
+    timings = []
+    for tick in range(ticks):
+        values = level * (1 + rng.normal(0, 0.02, level.shape))
+        injected = np.zeros(level.shape, dtype=bool)
+        faulty = np.zeros(level.shape, dtype=bool)
+        if tick >= detector.warmup:
+            injected = rng.random(level.shape) < 1e-3
+            values[injected] = level[injected] * 1.5
+            faulty = rng.random(level.shape) < 1e-3
+            values[faulty] = -20.0
+        t = time.perf_counter()
+        out_of_range, spike, _ = detector.update(values, float(tick))
+        timings.append(time.perf_counter() - t)
+        flagged = out_of_range | spike
+        spikes += injected.sum()
+        faults += faulty.sum()
+        caught_spikes += (flagged & injected).sum()  # range when 1.5x leaves the limits
+        caught_faults += (out_of_range & faulty).sum()
+        false_alarms += (flagged & ~injected & ~faulty).sum()
+
+    timings = np.array(timings) * 1e6
+    n = tractors * channels
+    print(f"{tractors} tractors x {channels} channels = {n} channels per tick, {ticks} ticks")
+    print(f"per tick: p50 {np.percentile(timings, 50):.0f} us, p99 {np.percentile(timings, 99):.0f} us "
+          f"({1000 * np.percentile(timings, 50) / n:.1f} ns per channel)")
+    print(f"state: {detector.nbytes / n:.0f} bytes per channel")
+    print(f"spikes caught {caught_spikes}/{spikes}, range faults caught {caught_faults}/{faults}, "
+          f"false alarms {false_alarms} ({false_alarms / (n * ticks):.1e} per value)")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,58 @@
+# Throughput of the scalar calculate_parameters loop vs the NumPy batch path,
+# failing when the two disagree by more than TOLERANCE (relative).
+# Run from the repository root:  python -m benchmarks.bench_batch [rows]
+import sys
+import time
+import numpy as np
+
+from speednslip import compute_parameters, calculate_parameters_batch, gear_ratios
+
+TOLERANCE = 1e-9
+
+def make_inputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.integers(45, 86, n),
+        rng.integers(1200, 1401, n),
+        np.round(rng.uniform(1.8, 4.5, n), 2),
+        np.round(rng.uniform(5, 25, n), 2),
+        rng.choice(gear_ratios, n),
+    )
+
+def run_scalar(inputs):
+    columns = [v.tolist() for v in inputs]
+    return [compute_parameters(*row) for row in zip(*columns)]
+
+def max_abs_error(rows, batch):
+    worst = 0.0
+    for key, column in batch.items():
+        scalar = np.array([row[key] for row in rows], dtype=np.float64)
+        scale = np.maximum(np.abs(scalar), 1.0)
+        worst = max(worst, float(np.max(np.abs(column - scalar) / scale)))
+    return worst
+
+def main(n=1_000_000, scalar_rows=100_000):
+    inputs = make_inputs(n)
+    subset = tuple(v[:scalar_rows] for v in inputs)
+
+    start = time.perf_counter()
+    rows = run_scalar(subset)
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    calculate_parameters_batch(*inputs)
+    batch_time = time.perf_counter() - start
+
+    error = max_abs_error(rows, calculate_parameters_batch(*subset))
+
+    scalar_rate = scalar_rows / scalar_time
+    batch_rate = n / batch_time
+    print(f"scalar loop : {scalar_rows:>10,} rows in {scalar_time:8.3f} s  ({scalar_rate:,.0f} rows/s)")
+    print(f"numpy batch : {n:>10,} rows in {batch_time:8.3f} s  ({batch_rate:,.0f} rows/s)")
+    print(f"speedup     : {batch_rate / scalar_rate:.1f}x")
+    print(f"max relative difference vs scalar path: {error:.2e}")
+    if not error <= TOLERANCE:
+        raise AssertionError(f"batch path differs from the scalar path by {error:.2e} > {TOLERANCE:.0e}")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,43 @@
+# Field coverage engine on a full day of 10 Hz GPS: update cost per point,
+# tile memory and area accuracy for a back-and-forth pattern of known size.
+# Overlap strips narrower than a grid cell (0.25 m by default) only show up
+# where they happen to cover a cell centre.
+# Run from the repository root:  python -m benchmarks.bench_coverage [points]
+import math
+import sys
+import time
+import numpy as np
+
+from fieldcoverage import FieldCoverage, EARTH_RADIUS_M
+
+LATITUDE, LONGITUDE = 22.31278, 87.33152
+
+# Back-and-forth passes of pass_m at speed_kmh, spacing_m apart, sampled at
+# rate_hz; returns times, latitudes, longitudes and the true swept area (ha)
+def boustrophedon(points, width_m, rate_hz=10.0, speed_kmh=4.3, pass_m=200.0, spacing_m=0.5):
+    distance = np.arange(points) * speed_kmh / 3.6 / rate_hz
+    passes = (distance // pass_m).astype(int)
+    along = distance % pass_m
+    x = np.where(passes % 2, pass_m - along, along)
+    y = passes * spacing_m
+    latitude = LATITUDE + np.degrees(y / EARTH_RADIUS_M)
+    longitude = LONGITUDE + np.degrees(x / (EARTH_RADIUS_M * math.cos(math.radians(LATITUDE))))
+    overlap = max(width_m - spacing_m, 0.0)
+    true_area = pass_m * (passes[-1] * spacing_m + width_m) / 10000
+    true_overlap = pass_m * passes[-1] * overlap / 10000
+    return np.arange(points) / rate_hz, latitude, longitude, true_area, true_overlap
+
+def main(points=864_000):
+    for width_m, spacing_m in ((0.6, 0.5), (0.6, 0.4)):
+        times, latitude, longitude, true_area, true_overlap = boustrophedon(points, width_m, spacing_m=spacing_m)
+        coverage = FieldCoverage(width_m)
+        start = time.perf_counter()
+        coverage.add_batch(times, latitude, longitude, np.full(points, 6.0))
+        elapsed = time.perf_counter() - start
+        print(f"width {width_m} m, spacing {spacing_m} m, {points} points: "
+              f"{1e6 * elapsed / points:.1f} us/point, {coverage.nbytes / 1e6:.2f} MB in {len(coverage.tiles)} tiles")
+        print(f"  tilled {coverage.tilled_ha:.4f} ha (true {true_area:.4f}), "
+              f"overlap {coverage.overlap_ha:.4f} ha (true {true_overlap:.4f}), {coverage.fuel_per_ha:.2f} L/ha")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,67 @@
+# Engine torque/fuel lookup table vs the exact polynomials: interpolation
+# error per resolution and speedup for single-sample and batch lookups.
+# Run from the repository root:  python -m benchmarks.bench_enginemap [batch_rows]
+import sys
+import time
+import numpy as np
+
+from enginemap import EngineMap
+from speednslip import engine_torque_and_fuel
+
+RESOLUTIONS = ((2.0, 20.0), (1.0, 10.0), (0.5, 5.0), (0.25, 2.5))
+
+# The scalar polynomials exactly as compute_parameters evaluates them
+def polynomials(throttle, engine_speed):
+    z = 24.49 * throttle + 42.483
+    r = z - engine_speed
+    ent = (
+        (r ** 3 * z ** 2) * (8.5558 * pow(10, -13)) +
+        (r ** 2 * z ** 2) * (-5.086 * pow(10, -9)) +
+        (r * z ** 2) * (3.1619 * pow(10, -7)) +
+        (r ** 3 * z) * (-1.909 * pow(10, -8)) +
+        (r ** 2 * z) * (1.5683 * pow(10, -5)) +
+        (r * z) * (-0.000435357) + 5.93541932
+    )
+    fcp = (
+        (z ** 3 * r ** 2) * (-2.2978 * pow(10, -25)) +
+        (z ** 2 * r ** 2) * (-3.0631 * pow(10, -11)) +
+        (z ** 3 * r) * (-5.2523 * pow(10, -23)) +
+        (z ** 2 * r) * (1.60046 * pow(10, -8)) +
+        (z ** 3) * (-5.60937 * pow(10, -21)) + 1.342006549
+    )
+    return ent, fcp
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main(batch_rows=1_000_000, scalar_rows=100_000):
+    rng = np.random.default_rng(0)
+    throttle = rng.uniform(45, 85, batch_rows)
+    engine_speed = rng.uniform(1200, 1800, batch_rows)
+    scalar_points = list(zip(throttle[:scalar_rows].tolist(), engine_speed[:scalar_rows].tolist()))
+
+    exact_scalar = best_of(lambda: [polynomials(t, e) for t, e in scalar_points])
+    exact_batch = best_of(lambda: engine_torque_and_fuel(throttle, engine_speed))
+
+    print(f"{'grid':>14} | {'cells':>7} | {'torque max err':>14} | {'fuel max err':>12} | {'scalar x':>8} | {'batch x':>7}")
+    for throttle_step, rpm_step in RESOLUTIONS:
+        engine_map = EngineMap(throttle_step, rpm_step)
+        report = engine_map.error_report()
+        table_scalar = best_of(lambda: [engine_map.lookup(t, e) for t, e in scalar_points])
+        table_batch = best_of(lambda: engine_map.lookup_batch(throttle, engine_speed))
+        cells = engine_map.shape[0] * engine_map.shape[1]
+        print(f"{f'{throttle_step}% x {rpm_step}rpm':>14} | {cells:>7} "
+              f"| {report['engine_torque']['max_abs_error']:>11.3f} Nm "
+              f"| {report['fuel_consumption']['max_abs_error']:>8.4f} L/h "
+              f"| {exact_scalar / table_scalar:>7.2f}x | {exact_batch / table_batch:>6.2f}x")
+
+    print(f"exact polynomials: {1e9 * exact_scalar / scalar_rows:.0f} ns/sample scalar, "
+          f"{1e9 * exact_batch / batch_rows:.1f} ns/sample batch")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,41 @@
+# Fuel meter on 50 Hz flow data: cost per one-second tick and agreement of
+# the streamed net litres with a one-shot trapezoidal integration.
+# Run from the repository root:  python -m benchmarks.bench_fuelflow [seconds]
+import sys
+import time
+import numpy as np
+
+from fuelflow import FuelMeter
+
+RATE_HZ = 50
+
+def main(seconds=3600):
+    rng = np.random.default_rng(0)
+    n = seconds * RATE_HZ
+    times = np.arange(n) / RATE_HZ + rng.uniform(-0.002, 0.002, n)  # sampling jitter
+    times.sort()
+    main_flow = rng.uniform(1.08, 1.24, n)
+    overflow = rng.uniform(0.98, 1.17, n)
+
+    meter = FuelMeter()
+    ticks = []
+    rows = 0
+    for start in range(0, n, RATE_HZ):
+        batch = {
+            'time': times[start:start + RATE_HZ],
+            'main_flow_rate': main_flow[start:start + RATE_HZ],
+            'overflow_flow_rate': overflow[start:start + RATE_HZ],
+        }
+        t = time.perf_counter()
+        rows += len(meter.add(batch)['time'])
+        ticks.append(time.perf_counter() - t)
+
+    exact = np.trapezoid(main_flow - overflow, times) / 60
+    ticks = np.array(ticks) * 1e6
+    print(f"{seconds} s at {RATE_HZ} Hz: {n} samples -> {rows} display rows")
+    print(f"per tick: p50 {np.percentile(ticks, 50):.1f} us, p99 {np.percentile(ticks, 99):.1f} us")
+    print(f"net fuel {meter.net_fuel_l:.6f} L, one-shot trapezoid {exact:.6f} L, "
+          f"difference {abs(meter.net_fuel_l - exact):.2e} L")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
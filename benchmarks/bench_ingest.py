@@ -0,0 +1,47 @@
+# Sustained ingestion: the simulator fleet runs in a separate process and
+# sends to an IngestServer in this process; reports frames processed per
+# second, drops and the server's CPU use (one event loop, one core).
+# Run from the repository root:
+#   python -m benchmarks.bench_ingest [tractors] [rate_hz] [seconds] [udp|tcp]
+import asyncio
+import multiprocessing
+import sys
+import time
+
+from ingest import IngestServer, simulate_fleet
+
+def run_fleet(port, tractors, rate_hz, duration, protocol):
+    asyncio.run(simulate_fleet('127.0.0.1', port, tractors, rate_hz, duration, protocol))
+
+async def bench(tractors, rate_hz, duration, protocol):
+    server = IngestServer(udp_port=0, tcp_port=0)
+    await server.start()
+    port = server.udp_port if protocol == 'udp' else server.tcp_port
+
+    client = multiprocessing.Process(target=run_fleet, args=(port, tractors, rate_hz, duration, protocol))
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    client.start()
+    while client.is_alive():
+        await asyncio.sleep(0.1)
+    # Let the worker drain what is still queued
+    while not server.queue.empty():
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    await server.close()
+
+    stats = server.stats
+    offered = tractors * rate_hz
+    print(f"{protocol}: {tractors} tractors x {rate_hz} Hz = {offered:,.0f} frames/s offered")
+    print(f"  processed {stats.frames_processed:,} of {stats.frames_received:,} received, "
+          f"dropped {stats.frames_dropped:,}, batches {stats.batches:,}")
+    print(f"  {stats.frames_processed / wall:,.0f} frames/s, server CPU {100 * cpu / wall:.1f}% of one core, "
+          f"{1e6 * cpu / max(stats.frames_processed, 1):.1f} us CPU per frame, {len(server.state)} tractors tracked")
+
+def main(tractors=500, rate_hz=10, duration=10, protocol='udp'):
+    asyncio.run(bench(int(tractors), float(rate_hz), float(duration), protocol))
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
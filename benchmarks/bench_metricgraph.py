@@ -0,0 +1,127 @@
+# Incremental metric graph vs full recomputation: a batch where all, some
+# or none of the inputs changed, the gear comparison of the what-if engine,
+# and a per-sample stream where the GPS speed updates every sample while
+# throttle and engine speed hold for several, with the closed-form
+# equations and with the learned surrogate.
+# Run from the repository root:  python -m benchmarks.bench_metricgraph [rows]
+import sys
+import time
+import numpy as np
+
+import surrogate
+from metricgraph import performance_graph
+from speednslip import calculate_parameters_batch, compute_parameters, gear_options, gear_ratios
+
+INPUTS = ('throttle', 'engine_speed', 'forward_speed', 'implement_depth', 'gear_ratio')
+
+def best_of(fn, repeat=7):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def make_inputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'throttle': rng.integers(45, 86, n).astype(np.float64),
+        'engine_speed': rng.integers(1200, 1401, n).astype(np.float64),
+        'forward_speed': np.round(rng.uniform(1.8, 4.5, n), 2),
+        'implement_depth': np.round(rng.uniform(5, 25, n), 2),
+        'gear_ratio': rng.choice(gear_ratios, n).astype(np.float64),
+    }
+
+def batch_cases(n):
+    inputs = make_inputs(n)
+    full = best_of(lambda: calculate_parameters_batch(*(inputs[name] for name in INPUTS)))
+    print(f"batch of {n:,}: calculate_parameters_batch {1e6 * full:.0f} us")
+
+    graph = performance_graph()
+    graph.update(**inputs)
+    exact = calculate_parameters_batch(*(inputs[name] for name in INPUTS))
+    results = graph.results()
+    same = all(np.array_equal(exact[name], results[name], equal_nan=True) for name in exact)
+    print(f"  graph results identical to calculate_parameters_batch: {same}")
+
+    alternatives = {name: make_inputs(n, seed=1)[name] for name in INPUTS}
+    cases = {
+        'all inputs changed': INPUTS,
+        'forward speed changed': ('forward_speed',),
+        'gear changed': ('gear_ratio',),
+        'nothing changed': (),
+    }
+    for label, changed in cases.items():
+        flip = [0]
+
+        def step():
+            # Alternate between two values so every call sees a change
+            flip[0] ^= 1
+            source = alternatives if flip[0] else inputs
+            graph.update(**{**inputs, **{name: source[name] for name in changed}})
+
+        step()
+        elapsed = best_of(step)
+        print(f"  {label:>22}: {1e6 * elapsed:6.0f} us, {graph.skipped} of {len(graph.order)} nodes skipped")
+
+def gear_comparison(n):
+    points = make_inputs(n)
+    del points['gear_ratio']
+    metrics = ('fuel_consumption_area', 'drawbar_power', 'tractive_efficiency')
+
+    def full():
+        for ratio in gear_options.values():
+            calculate_parameters_batch(*(points[name] for name in INPUTS[:-1]), ratio)
+
+    def incremental():
+        graph = performance_graph(metrics)
+        for ratio in gear_options.values():
+            graph.update(gear_ratio=ratio, **points)
+        return graph
+
+    graph = incremental()
+    print(f"{n:,} points x {len(gear_options)} gears: full {1e3 * best_of(full, 3):.0f} ms, "
+          f"graph {1e3 * best_of(incremental, 3):.0f} ms ({graph.total_skipped} node evaluations skipped)")
+
+# Throttle and engine speed held for hold samples, the GPS speed new every
+# sample
+def stream(n, hold, seed=2):
+    rng = np.random.default_rng(seed)
+    held = make_inputs(-(-n // hold), seed)
+    rows = []
+    for i in range(n):
+        rows.append((held['throttle'][i // hold].item(), held['engine_speed'][i // hold].item(),
+                     round(float(rng.uniform(1.8, 4.5)), 2), 12.0, 80.0))
+    return rows
+
+def per_sample(n=2000, hold=10):
+    rows = stream(n, hold)
+
+    def run_graph(model=None):
+        graph = performance_graph(surrogate=model)
+        for row in rows:
+            graph.update(**dict(zip(INPUTS, row)))
+            graph.results()
+        return graph
+
+    scalar = best_of(lambda: [compute_parameters(*row) for row in rows], 3) / n
+    graph = run_graph()
+    incremental = best_of(run_graph, 3) / n
+    print(f"per sample (throttle and engine speed held for {hold} samples): compute_parameters {1e6 * scalar:.1f} us, "
+          f"graph {1e6 * incremental:.1f} us, {graph.total_skipped / (graph.total_skipped + graph.total_evaluated):.0%} "
+          f"of nodes skipped")
+
+    model = surrogate.Surrogate().fit(surrogate.synthetic_samples(20000, seed=0), source="synthetic")
+    full = best_of(lambda: [calculate_parameters_batch(*row, surrogate=model) for row in rows], 3) / n
+    graph = run_graph(model)
+    incremental = best_of(lambda: run_graph(model), 3) / n
+    print(f"  with the surrogate: calculate_parameters_batch {1e6 * full:.0f} us, graph {1e6 * incremental:.0f} us, "
+          f"{graph.total_skipped / (graph.total_skipped + graph.total_evaluated):.0%} of nodes skipped")
+
+def main(n=100_000):
+    batch_cases(n)
+    gear_comparison(2 * n)
+    per_sample()
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
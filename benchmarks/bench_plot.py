@@ -0,0 +1,64 @@
+# Per-tick render time of the speed/slip page plot: rebuilding the figure
+# every tick (the old loop) vs updating one persistent LivePlot.
+# Run from the repository root:  python -m benchmarks.bench_plot [ticks]
+import io
+import sys
+import time
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from liveplot import LivePlot
+from speednslip import PLOT_SERIES
+
+HISTORY_LENGTHS = (100, 10_000, 100_000)
+
+def make_history(n, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {key: rng.uniform(0, 100, n) for key, _, _ in PLOT_SERIES}
+    return np.arange(n, dtype=np.float64), columns
+
+# The original per-tick code path: new subplots, full replot, no close
+def rebuild_tick(x, columns):
+    fig, ax = plt.subplots(len(PLOT_SERIES), 1, figsize=(10, 15), sharex=True)
+    for axis, (key, label, color) in zip(ax, PLOT_SERIES):
+        axis.plot(x, columns[key], label=label, color=color, marker='o')
+        axis.fill_between(x, columns[key], color=color, alpha=0.2)
+        axis.legend(loc="upper right")
+        axis.grid(True)
+    ax[-1].set_xlabel("Time")
+    return fig
+
+# st.pyplot encodes the figure as PNG on every call
+def encode(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.tell()
+
+def time_ticks(tick, ticks):
+    samples = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        tick()
+        samples.append(time.perf_counter() - start)
+    return 1000 * float(np.median(samples))
+
+def main(ticks=3):
+    print(f"{'samples':>8} | {'rebuild ms':>11} | {'persistent ms':>13} | {'open figures after rebuild':>26}")
+    for n in HISTORY_LENGTHS:
+        x, columns = make_history(n)
+
+        plt.close("all")
+        rebuild_ms = time_ticks(lambda: encode(rebuild_tick(x, columns)), ticks)
+        leaked = len(plt.get_fignums())
+        plt.close("all")
+
+        with LivePlot(PLOT_SERIES) as plot:
+            plot.update(x, columns)
+            persistent_ms = time_ticks(lambda: encode(plot.update(x, columns)), ticks)
+
+        print(f"{n:>8} | {rebuild_ms:>11.1f} | {persistent_ms:>13.1f} | {leaked:>26}")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,57 @@
+# Replay throughput: how many samples per second ReplaySource can hand to a
+# page loop, for binary (.npy) and CSV logs.
+# Run from the repository root:  python -m benchmarks.bench_replay [rate_hz] [minutes]
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+from telemetry import ReplaySource, save_log
+
+CHANNELS = ('engine_speed', 'throttle', 'implement_depth', 'forward_speed', 'slip', 'latitude', 'longitude')
+
+def make_log(rate_hz, minutes, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(rate_hz * minutes * 60)
+    columns = {'time': np.arange(n) / rate_hz}
+    for name in CHANNELS:
+        columns[name] = rng.uniform(0, 100, n)
+    return columns
+
+def write_csv(path, columns):
+    np.savetxt(path, np.column_stack(list(columns.values())), delimiter=',',
+               header=','.join(columns), comments='', fmt='%.6f')
+
+# Replays the whole log with a fake clock advancing one page tick per read
+def drain(path, tick_seconds=1.0):
+    now = [0.0]
+    start = time.perf_counter()
+    source = ReplaySource(path, clock=lambda: now[0])
+    load_time = time.perf_counter() - start
+
+    rows = reads = 0
+    start = time.perf_counter()
+    while not source.finished:
+        now[0] += tick_seconds
+        rows += len(source.read()['time'])
+        reads += 1
+    read_time = time.perf_counter() - start
+    return load_time, rows, reads, read_time
+
+def main(rate_hz=100, minutes=60):
+    columns = make_log(rate_hz, minutes)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {'npy': os.path.join(directory, 'log.npy'), 'csv': os.path.join(directory, 'log.csv')}
+        save_log(paths['npy'], columns)
+        write_csv(paths['csv'], columns)
+
+        print(f"{len(columns['time']):,} rows x {len(columns)} channels recorded at {rate_hz} Hz")
+        for kind, path in paths.items():
+            load_time, rows, reads, read_time = drain(path)
+            per_read_us = 1e6 * read_time / reads
+            print(f"{kind}: load {load_time * 1000:8.1f} ms | {per_read_us:7.1f} us per 1 s tick "
+                  f"| {rows / read_time:,.0f} samples/s per channel sustainable")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,118 @@
+# Memory per sample of the sample types (latest-sample records, performance
+# model results, the GPS trail's recent window) and the memory allocated per
+# producer tick on the performance, GPS and fuel pages, with the cost of a
+# history snapshot for the renderers.  CPython keeps no allocation counter,
+# so per-tick allocation is reported as the tracemalloc peak above the
+# memory held before the tick.
+# Run from the repository root:  python -m benchmarks.bench_samples [ticks]
+import gc
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+import fc
+import gps
+import speednslip
+from gpstrail import GpsTrail
+from telemetry import latest
+
+# Source clock advanced by hand, one tick at a time
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def clocked(source):
+    clock = Clock()
+    source.clock, source.start = clock, 0.0
+    return source, clock
+
+# Traced bytes per object of n objects kept alive
+def bytes_per_object(build, n=10_000):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    kept = [build(i) for i in range(n)]
+    size = tracemalloc.get_traced_memory()[0] - base - sys.getsizeof(kept)
+    tracemalloc.stop()
+    return size / n
+
+def trail_bytes_per_point(n=20_000):
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    trail = GpsTrail(recent_seconds=np.inf, chunk_points=n + 1)
+    x = np.arange(n, dtype=np.float64)
+    trail.add_batch(x, 22.3 + 1e-6 * x, 87.3 + 1e-6 * x, 3 + 1e-6 * x)
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return size / n
+
+# Per-tick cost of producer, polled by hand with its thread stopped; the
+# producers in upstream (which it reads) are polled first on each tick
+def tick_cost(name, producer, clocks, ticks, warmup=50, upstream=()):
+    for each in (*upstream, producer):
+        each.close()
+
+    def tick():
+        for clock in clocks:
+            clock.now += 1.0
+        for each in upstream:
+            each.poll()
+        producer.poll()
+
+    for _ in range(warmup):
+        tick()
+    gc.collect()
+    tracemalloc.start()
+    peaks = []
+    for _ in range(ticks):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        tick()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    rows = len(producer.history)
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    producer.snapshot()
+    snapshot = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    # Best of several runs, the tick is short enough for scheduling noise
+    # to dominate a single one
+    elapsed = np.inf
+    for _ in range(10):
+        start = time.perf_counter()
+        for _ in range(ticks // 10):
+            tick()
+        elapsed = min(elapsed, (time.perf_counter() - start) / (ticks // 10))
+    print(f"{name:>12}: {np.median(peaks) / 1024:6.1f} KiB allocated per tick, {1e6 * elapsed:5.0f} us per tick, "
+          f"snapshot of {rows} rows {snapshot / 1024:.1f} KiB")
+
+def main(ticks=300):
+    batch = speednslip.calculate_parameters_batch(np.array([60.0]), 1300, 3.0, 10.0, 80)
+    batch['time'] = np.array([1.0])
+    batch['gear_ratio'] = np.array([80.0])
+    print(f"latest sample ({len(batch)} channels): {bytes_per_object(lambda i: latest(batch)):.0f} bytes")
+    print(f"compute_parameters result: "
+          f"{bytes_per_object(lambda i: speednslip.compute_parameters(60 + i % 20, 1300, 3 + 1e-4 * i, 10.0, 80)):.0f} bytes")
+    print(f"GPS trail recent window: {trail_bytes_per_point():.0f} bytes per point")
+
+    source, clock = clocked(speednslip.simulator_source(rate_hz=1))
+    tick_cost("performance", speednslip.make_producer(source), [clock], ticks)
+    source, clock = clocked(gps.simulator_source(rate_hz=1))
+    tick_cost("gps", gps.make_producer(source), [clock], ticks)
+    # The fuel page scores the rows of a performance and a GPS producer,
+    # polled in the same tick (their share is the two lines above)
+    source, clock = clocked(fc.simulator_source())
+    performance_source, performance_clock = clocked(speednslip.simulator_source(rate_hz=1))
+    gps_source, gps_clock = clocked(gps.simulator_source(rate_hz=1))
+    operating = {'Performance': speednslip.make_producer(performance_source), 'GPS': gps.make_producer(gps_source)}
+    tick_cost(f"fc {fc.FLOW_RATE_HZ} Hz", fc.make_producer(source, operating), [clock, performance_clock, gps_clock],
+              ticks, upstream=operating.values())
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,94 @@
+# App start-up: time to the first complete run of app.py in a fresh
+# interpreter, the modules it loaded, and the latency of later reruns and
+# page switches.  Each sample starts a new process, so nothing is cached.
+# Run from the repository root:  python -m benchmarks.bench_startup [processes]
+import ast
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = ("Tractor Operating Parameters", "Tractor Performance Prediction", "Tractor Advisory System")
+
+HEAVY_MODULES = ("folium", "streamlit_folium", "matplotlib", "sklearn")
+
+# Runs in the child process: first run (cold), reruns, then each page
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+import_done = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=120)
+at.run()
+cold = time.perf_counter()
+loaded = [name for name in HEAVY if name in sys.modules]
+reruns = []
+for _ in range(5):
+    t = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - t)
+switches = {}
+for page in reversed(PAGES):
+    at.sidebar.selectbox[0].set_value(page)
+    t = time.perf_counter()
+    at.run()
+    switches[page] = time.perf_counter() - t
+print(json.dumps({
+    'streamlit_import': import_done - start, 'first_run': cold - import_done, 'heavy_loaded': loaded,
+    'rerun': sorted(reruns)[len(reruns) // 2], 'switch': switches,
+    'exceptions': [e.value for e in at.exception],
+}))
+"""
+
+# Modules app.py imports at the top level, whatever page is selected
+def top_level_imports():
+    with open(os.path.join(ROOT, "app.py")) as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            names.append(node.module)
+    return [name for name in names if name != "streamlit"]
+
+# Time to import them in a fresh interpreter (streamlit already loaded)
+def import_probe(names):
+    script = (
+        "import json, sys, time\nimport streamlit\nstart = time.perf_counter()\n"
+        + "".join(f"import {name}\n" for name in names)
+        + f"print(json.dumps({{'seconds': time.perf_counter() - start, "
+          f"'heavy': [n for n in {HEAVY_MODULES!r} if n in sys.modules]}}))"
+    )
+    out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def probe():
+    script = f"HEAVY = {HEAVY_MODULES!r}\nPAGES = {PAGES!r}\n" + PROBE
+    out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main(processes=5):
+    names = top_level_imports()
+    imports = [import_probe(names) for _ in range(processes)]
+    print(f"app.py top-level imports ({', '.join(names)}): "
+          f"{1000 * np.median([r['seconds'] for r in imports]):.1f} ms, "
+          f"heavy modules loaded: {', '.join(imports[0]['heavy']) or 'none'}")
+
+    results = [probe() for _ in range(processes)]
+    if results[0]['exceptions']:
+        print("app raised:", results[0]['exceptions'])
+    median = lambda key: 1000 * np.median([r[key] for r in results])
+    print(f"streamlit import      {median('streamlit_import'):8.1f} ms")
+    print(f"first run (cold)      {median('first_run'):8.1f} ms   heavy modules loaded: {', '.join(results[0]['heavy_loaded']) or 'none'}")
+    print(f"rerun (same page)     {median('rerun'):8.1f} ms")
+    for page in reversed(PAGES):
+        switch = 1000 * np.median([r['switch'][page] for r in results])
+        print(f"switch to {page:<32} {switch:8.1f} ms")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,70 @@
+# Learned surrogate vs the closed-form equations: fit and load time, error
+# on unseen operating points (noise-free and with sensor noise in the
+# training data), and latency per tick for batches of buffered samples
+# against one predict() per row.
+# Run from the repository root:  python -m benchmarks.bench_surrogate [max_batch]
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+import surrogate
+from speednslip import calculate_parameters_batch
+
+TARGETS = ('engine_torque', 'fuel_consumption', 'implement_draft')
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def errors(model, test):
+    ent, fcp = model.lookup_batch(test['throttle'], test['engine_speed'])
+    draft = model.draft_batch(test['forward_speed'], test['implement_depth'])
+    return {
+        target: np.sqrt(np.mean((predicted - test[target]) ** 2))
+        for target, predicted in zip(TARGETS, (ent, fcp, draft))
+    }
+
+def main(max_batch=10_000):
+    train = surrogate.synthetic_samples(20000, seed=0)
+    test = surrogate.synthetic_samples(10000, seed=1)
+    print("target RMS over the test points: " + ", ".join(
+        f"{target} {np.sqrt(np.mean(test[target] ** 2)):.3g}" for target in TARGETS))
+
+    start = time.perf_counter()
+    model = surrogate.Surrogate().fit(train, source="synthetic")
+    fit_s = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "surrogate.joblib")
+        model.save(path)
+        load_s = best_of(lambda: surrogate.load(path))
+    print(f"fit {1000 * fit_s:.0f} ms, load {1000 * load_s:.1f} ms")
+    print("RMS error, noise-free training: " + ", ".join(f"{k} {v:.2e}" for k, v in errors(model, test).items()))
+
+    # Logged data is noisy: 2 % multiplicative noise on the targets
+    rng = np.random.default_rng(2)
+    noisy = dict(train)
+    for target in TARGETS:
+        noisy[target] = train[target] * (1 + rng.normal(0, 0.02, len(train[target])))
+    noisy_model = surrogate.Surrogate().fit(noisy, source="noisy")
+    print("RMS error, 2 % noise in training: " + ", ".join(
+        f"{k} {v:.3g}" for k, v in errors(noisy_model, test).items()))
+
+    print(f"{'batch':>7} {'equations':>12} {'surrogate':>12} {'per row':>12}")
+    for n in (1, 10, 100, 1000, max_batch):
+        inputs = [test[name][:n] for name in ('throttle', 'engine_speed', 'forward_speed', 'implement_depth')]
+        exact = best_of(lambda: calculate_parameters_batch(*inputs, 80))
+        batch = best_of(lambda: calculate_parameters_batch(*inputs, 80, surrogate=model))
+        rows = min(n, 100)
+        per_row = best_of(lambda: [
+            calculate_parameters_batch(*(v[i:i + 1] for v in inputs), 80, surrogate=model) for i in range(rows)
+        ], repeat=3) * n / rows
+        print(f"{n:>7} {1e6 * exact:>10.0f}us {1e6 * batch:>10.0f}us {1e6 * per_row:>10.0f}us")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,41 @@
+# Synthetic fleet generator: rows per second in memory and written to each
+# file format, plus a reproducibility check (same seed, different chunking
+# and fleet size).
+# Run from the repository root:  python -m benchmarks.bench_synthdata [tractors] [seconds]
+import sys
+import tempfile
+import time
+import numpy as np
+
+import synthdata
+
+def main(tractors=100, seconds=3600, rate_hz=10):
+    rows = tractors * seconds * rate_hz
+    start = time.perf_counter()
+    columns = synthdata.generate(tractors, seconds, rate_hz, seed=0)
+    elapsed = time.perf_counter() - start
+    print(f"in memory: {rows:,} rows x {len(columns)} channels in {elapsed:.2f} s "
+          f"({rows / elapsed / 1e6:.2f} M rows/s)")
+
+    for fmt in ('npy', 'session', 'csv'):
+        # CSV formatting is slow whatever writes it; a tenth of the data is
+        # enough to measure it
+        duration = seconds if fmt != 'csv' else seconds / 10
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            written = synthdata.write(directory, fmt, tractors, duration, rate_hz, seed=0)
+            elapsed = time.perf_counter() - start
+        print(f"{fmt:>8}: {written:,} rows in {elapsed:.2f} s ({written / elapsed / 1e6:.2f} M rows/s)")
+
+    a = synthdata.generate(3, 600, rate_hz, seed=1, chunk_s=7)
+    b = synthdata.generate(5, 600, rate_hz, seed=1, chunk_s=60)
+    b = {name: values[b['tractor_id'] <= 3] for name, values in b.items()}
+    difference = max(float(np.max(np.abs(a[name] - b[name]))) for name in synthdata.CHANNELS)
+    print(f"same seed, other chunking and fleet size: largest difference {difference:.1e}")
+
+    m = columns['tractor_id'] == 1
+    print(f"tractor 1 correlations: throttle-engine speed {np.corrcoef(columns['throttle'][m], columns['engine_speed'][m])[0, 1]:.2f}, "
+          f"depth-slip {np.corrcoef(columns['implement_depth'][m], columns['slip'][m])[0, 1]:.2f}")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,75 @@
+# Parameter tables: bytes sent per tick and render cost of the compiled
+# templates, with icons served as static files and inlined as data URIs.
+# Run from the repository root:  python -m benchmarks.bench_tables [ticks]
+import sys
+import time
+from unittest import mock
+
+import numpy as np
+
+import gps
+import speednslip
+import tablerender
+from windowstats import StreamStats
+
+def samples(ticks):
+    rng = np.random.default_rng(0)
+    batch = {
+        'time': np.arange(ticks, dtype=np.float64),
+        'throttle': rng.integers(45, 86, ticks).astype(np.float64),
+        'engine_speed': rng.integers(1200, 1401, ticks).astype(np.float64),
+        'forward_speed': rng.uniform(1.8, 4.5, ticks).round(2),
+        'implement_depth': rng.uniform(5, 25, ticks).round(2),
+        'gear_ratio': rng.choice(speednslip.gear_ratios, ticks).astype(np.float64),
+        'latitude': 22.31278 + rng.uniform(-1e-4, 1e-4, ticks).cumsum(),
+        'longitude': 87.33152 + rng.uniform(-1e-4, 1e-4, ticks).cumsum(),
+    }
+    results = speednslip.calculate_parameters_batch(
+        batch['throttle'], batch['engine_speed'], batch['forward_speed'], batch['implement_depth'], batch['gear_ratio'],
+    )
+    return {**batch, **results}
+
+def rows(columns, i):
+    return {name: values[i].item() for name, values in columns.items()}
+
+def measure(columns, ticks, with_stats):
+    stats = StreamStats(speednslip.STATS_CHANNELS + ('slip',)) if with_stats else None
+    sent = {'performance': 0, 'gps': 0}
+    start = time.perf_counter()
+    for i in range(ticks):
+        sample = rows(columns, i)
+        summary = None
+        if stats is not None:
+            stats.extend({name: values[i:i + 1] for name, values in columns.items()})
+            summary = stats.summary()
+        sent['performance'] += len(speednslip.generate_table_html(sample, summary).encode())
+        sent['gps'] += len(gps.generate_table_html("L1", sample, summary).encode())
+    elapsed = time.perf_counter() - start
+    return {page: total / ticks for page, total in sent.items()}, 1e6 * elapsed / ticks
+
+def fresh_templates():
+    for template in (speednslip.TABLE, gps.TABLE):
+        template.chunks = None
+
+def main(ticks=2000):
+    columns = samples(ticks)
+    for static in (True, False):
+        with mock.patch.object(tablerender.st, "get_option", lambda name: static):
+            fresh_templates()
+            for with_stats in (False, True):
+                sent, us = measure(columns, ticks, with_stats)
+                print(f"icons {'static files' if static else 'data URIs':>12}, stats {'on ' if with_stats else 'off'}: "
+                      f"performance {sent['performance']:>8.0f} B/tick, gps {sent['gps']:>8.0f} B/tick, "
+                      f"{us:.1f} us/tick for both tables")
+    fresh_templates()
+
+    # Unchanged values reuse the previous HTML
+    sample = rows(columns, 0)
+    speednslip.generate_table_html(sample)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        speednslip.generate_table_html(sample)
+    print(f"unchanged performance table: {1e6 * (time.perf_counter() - start) / ticks:.1f} us/tick")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
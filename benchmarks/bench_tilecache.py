@@ -0,0 +1,128 @@
+# Offline map tile cache: seeding a field's bounding box from a local
+# directory standing in for the tile provider, the cost of a tile from the
+# memory tier, from disk and read through from upstream, and the tiles of
+# one map rebuild fetched as a browser would (six at a time) from a
+# provider with network latency, from the tile server, and with the
+# provider unreachable.
+# Run from the repository root:  python -m benchmarks.bench_tilecache [latency_ms]
+import functools
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import tilecache
+from tilecache import TileCache, count_tiles, tiles_in
+
+FIELD = (22.300, 87.320, 22.325, 87.345)   # south, west, north, east
+ZOOMS = (13, 18)
+TILE_BYTES = 20_000
+
+def best_of(fn, repeat=7):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def write_tiles(directory, tiles):
+    payload = b'\x89PNG\r\n\x1a\n' + os.urandom(TILE_BYTES - 8)
+    for z, x, y in tiles:
+        os.makedirs(os.path.join(directory, str(z), str(x)), exist_ok=True)
+        with open(os.path.join(directory, str(z), str(x), f"{y}.png"), 'wb') as f:
+            f.write(payload)
+
+# Local HTTP tile provider answering after latency seconds
+def slow_provider(directory, latency):
+    class Handler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            super().do_GET()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}.png"
+
+def fetch_all(url, tiles):
+    def fetch(tile):
+        z, x, y = tile
+        try:
+            with urllib.request.urlopen(url.format(z=z, x=x, y=y), timeout=10) as response:
+                return len(response.read())
+        except OSError:
+            return 0
+
+    with ThreadPoolExecutor(6) as pool:
+        return sum(size > 0 for size in pool.map(fetch, tiles))
+
+def main(latency_ms=150):
+    tiles = list(tiles_in(FIELD, *ZOOMS))
+    # The 4 x 4 tiles around the field centre at the page's zoom 15
+    z = 15
+    x, y = tilecache.tile_of((FIELD[0] + FIELD[2]) / 2, (FIELD[1] + FIELD[3]) / 2, z)
+    view = [(z, x + dx, y + dy) for dx in range(-2, 2) for dy in range(-2, 2)]
+
+    with tempfile.TemporaryDirectory() as root:
+        upstream = os.path.join(root, 'upstream')
+        write_tiles(upstream, set(tiles) | set(view))
+
+        cache = TileCache(os.path.join(root, 'cache'), upstream)
+        start = time.perf_counter()
+        cached, fetched, failed = cache.seed(FIELD, *ZOOMS)
+        elapsed = time.perf_counter() - start
+        print(f"seed {count_tiles(FIELD, *ZOOMS)} tiles (zoom {ZOOMS[0]}-{ZOOMS[1]}): {fetched} fetched, "
+              f"{failed} failed in {elapsed:.2f} s ({fetched / elapsed:.0f} tiles/s)")
+
+        tile = tiles[len(tiles) // 2]
+        cache.get(*tile)
+        memory = best_of(lambda: [cache.get(*tile) for _ in range(1000)]) / 1000
+        disk = best_of(lambda: [TileCache(cache.directory, None).get(*tile) for _ in range(100)]) / 100
+
+        def cold():
+            fresh = TileCache(os.path.join(root, f'cold-{time.perf_counter_ns()}'), upstream)
+            for _ in range(100):
+                fresh._load(tile)
+                os.remove(fresh.path(*tile))
+        cold_time = best_of(cold, 3) / 100
+        print(f"tile of {TILE_BYTES // 1000} kB: memory {1e6 * memory:.1f} us, disk {1e6 * disk:.0f} us, "
+              f"read through from the upstream directory {1e6 * cold_time:.0f} us")
+
+        provider, provider_url = slow_provider(upstream, latency_ms / 1000)
+        cache = TileCache(os.path.join(root, 'served'), provider_url)
+        server = tilecache.start_in_thread(cache, port=0)
+        timings = [
+            ("online provider", lambda: fetch_all(provider_url, view)),
+            ("tile server, first view", lambda: fetch_all(server.url, view)),
+            ("tile server, rebuild", lambda: fetch_all(server.url, view)),
+        ]
+        print(f"map rebuild of {len(view)} tiles, provider latency {latency_ms} ms:")
+        for label, run in timings:
+            start = time.perf_counter()
+            served = run()
+            print(f"  {label:>24}: {1e3 * (time.perf_counter() - start):6.1f} ms, {served} tiles")
+        provider.shutdown()
+        provider.server_close()
+
+        # No connectivity: the cache answers from disk, and tiles it doesn't
+        # have fail once per retry_after instead of once per rebuild
+        offline = TileCache(cache.directory, provider_url, timeout=1.0)
+        offline_server = tilecache.start_in_thread(offline, port=0)
+        outside = [(z, x + 10, y + dy) for dy in range(4)]
+        for label in ("offline, first view", "offline, rebuild"):
+            start = time.perf_counter()
+            served = fetch_all(offline_server.url, view + outside)
+            print(f"  {label:>24}: {1e3 * (time.perf_counter() - start):6.1f} ms, "
+                  f"{served} of {len(view + outside)} tiles")
+        print(f"  stats: {offline.stats.as_dict()}")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
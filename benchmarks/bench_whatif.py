@@ -0,0 +1,47 @@
+# Monte Carlo what-if engine: wall time per worker count, reproducibility
+# across worker counts, and percentile error of the merged histograms
+# against exact percentiles of the same points.
+# Run from the repository root:  python -m benchmarks.bench_whatif [samples]
+import os
+import sys
+import numpy as np
+
+import whatif
+
+def exact_percentiles(samples, seed, chunk_size=whatif.CHUNK_SIZE):
+    _, *chunks = np.random.SeedSequence(seed).spawn(1 + -(-samples // chunk_size))
+    values = {}
+    for k, chunk in enumerate(chunks):
+        n = min(chunk_size, samples - k * chunk_size)
+        for gear, metrics in whatif._evaluate(chunk, n, whatif.IMPLEMENT_WIDTH, whatif.SOIL_FACTOR).items():
+            for metric, v in metrics.items():
+                values.setdefault((gear, metric), []).append(v[np.isfinite(v)])
+    return {key: np.percentile(np.concatenate(parts), whatif.PERCENTILES) for key, parts in values.items()}
+
+def main(samples=2_000_000, seed=0):
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, cpus})
+    results = {}
+    for workers in worker_counts:
+        whatif.simulate(whatif.CHUNK_SIZE * workers, seed, workers)  # start the pool
+        results[workers] = whatif.simulate(samples, seed, workers)
+        print(f"{workers} worker(s): {samples:,} points x {len(whatif.gear_options)} gears "
+              f"in {results[workers]['seconds']:.2f} s")
+    reference = results[1]['gears']
+    same = all(result['gears'] == reference for result in results.values())
+    print(f"identical results across worker counts: {same} ({cpus} CPUs here)")
+
+    worst = 0.0
+    for (gear, metric), exact in exact_percentiles(samples, seed).items():
+        estimate = np.array([reference[gear][metric][f'p{q:g}'] for q in whatif.PERCENTILES])
+        spread = exact[-1] - exact[0]
+        worst = max(worst, np.max(np.abs(estimate - exact)) / spread)
+    print(f"largest percentile error: {worst:.1e} of the p5-p95 spread")
+
+    print(f"{'gear':>4} {'metric':>22} " + " ".join(f"{'p%g' % q:>10}" for q in whatif.PERCENTILES))
+    for gear, metrics in reference.items():
+        for metric, row in metrics.items():
+            print(f"{gear:>4} {metric:>22} " + " ".join(f"{row['p%g' % q]:>10.2f}" for q in whatif.PERCENTILES))
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
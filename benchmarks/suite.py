@@ -0,0 +1,220 @@
+# Headless benchmark suite for the dashboard hot paths.
+#
+# Every stage runs on seeded data at several history lengths and reports
+# latency percentiles and the peak memory traced while it runs.  Results are
+# written as JSON (with the git commit) so runs can be compared across
+# commits:
+#
+#   python -m benchmarks.suite                      # run, save to benchmarks/results/
+#   python -m benchmarks.suite --compare old.json   # run and compare with a saved run
+#   python -m benchmarks.suite --stages map --lengths 100 1000
+"""Run the dashboard benchmark stages and save (or compare) the results as JSON."""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import folium
+
+import gps
+import speednslip
+from gpstrail import GpsTrail
+from liveplot import LivePlot
+
+DEFAULT_LENGTHS = (100, 1_000, 10_000)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# Seeded inputs shaped like the page simulators' output
+def make_history(n, seed=0):
+    rng = np.random.default_rng(seed)
+    history = {
+        'time': np.arange(n, dtype=np.float64),
+        'throttle': rng.integers(45, 86, n),
+        'engine_speed': rng.integers(1200, 1401, n),
+        'forward_speed': np.round(rng.uniform(1.8, 4.5, n), 2),
+        'implement_depth': np.round(rng.uniform(5, 25, n), 2),
+        'gear_ratio': rng.choice(speednslip.gear_ratios, n),
+        'slip': np.round(rng.uniform(12.10, 17.85, n), 2),
+        'latitude': 22.31278 + np.cumsum(rng.uniform(-0.0001, 0.0001, n)),
+        'longitude': 87.33152 + np.cumsum(rng.uniform(-0.0001, 0.0001, n)),
+    }
+    history.update(speednslip.calculate_parameters_batch(
+        history['throttle'], history['engine_speed'], history['forward_speed'],
+        history['implement_depth'], history['gear_ratio'],
+    ))
+    return history
+
+def _row(history, i):
+    return {name: values[i].item() for name, values in history.items()}
+
+# Each stage is prepared once per history length and returns the callable
+# that is timed; setup cost is excluded
+def stage_calculate_parameters(history):
+    rows = list(zip(*(history[name].tolist() for name in
+                      ('throttle', 'engine_speed', 'forward_speed', 'implement_depth', 'gear_ratio'))))
+    return lambda: [speednslip.compute_parameters(*row) for row in rows]
+
+def stage_calculate_parameters_batch(history):
+    return lambda: speednslip.calculate_parameters_batch(
+        history['throttle'], history['engine_speed'], history['forward_speed'],
+        history['implement_depth'], history['gear_ratio'],
+    )
+
+def stage_calculate_slip(history):
+    rows = list(zip(*(history[name].tolist() for name in ('engine_speed', 'forward_speed', 'gear_ratio'))))
+    return lambda: [speednslip.calculate_slip(*row) for row in rows]
+
+# The table templates only re-render cells whose value changed, so each
+# repeat renders the next row of the history, as a new sample would be
+def _cycle(history):
+    rows = [_row(history, i) for i in range(len(history['time']))]
+    position = [0]
+
+    def next_row():
+        row = rows[position[0] % len(rows)]
+        position[0] += 1
+        return row
+    return next_row
+
+def stage_performance_table_html(history):
+    next_row = _cycle(history)
+    return lambda: speednslip.generate_table_html(next_row())
+
+def stage_gps_table_html(history):
+    next_row = _cycle(history)
+    return lambda: gps.generate_table_html("L1", next_row())
+
+def stage_plot_render(history):
+    plot = LivePlot(speednslip.PLOT_SERIES)
+
+    def render():
+        plot.update(history['time'], history)
+        buffer = io.BytesIO()
+        plot.fig.savefig(buffer, format="png", bbox_inches="tight")
+
+    render.close = plot.close
+    return render
+
+def stage_map_build(history):
+    trail = GpsTrail(recent_seconds=10)
+    trail.add_batch(history['time'], history['latitude'], history['longitude'], history['forward_speed'])
+    lat, lon = history['latitude'][-1], history['longitude'][-1]
+
+    def build():
+        m = folium.Map(location=[lat, lon], zoom_start=15)
+        trail.layer().add_to(m)
+        return m.get_root().render()
+
+    return build
+
+# name -> (stage factory, scales with history length?)
+STAGES = {
+    'calculate_parameters': (stage_calculate_parameters, True),
+    'calculate_parameters_batch': (stage_calculate_parameters_batch, True),
+    'calculate_slip': (stage_calculate_slip, True),
+    'performance_table_html': (stage_performance_table_html, False),
+    'gps_table_html': (stage_gps_table_html, False),
+    'plot_render': (stage_plot_render, True),
+    'map_build': (stage_map_build, True),
+}
+
+def measure(fn, min_repeats=5, min_seconds=0.5, max_repeats=1000):
+    fn()  # warm-up
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples = []
+    deadline = time.perf_counter() + min_seconds
+    while len(samples) < max_repeats and (len(samples) < min_repeats or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000
+    return {
+        'repeats': len(samples),
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'mean_ms': float(np.mean(samples) * 1000),
+        'peak_memory_kb': peak / 1024,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(stages=tuple(STAGES), lengths=DEFAULT_LENGTHS, seed=0):
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': seed,
+        'stages': {},
+    }
+    for name in stages:
+        factory, scales = STAGES[name]
+        results['stages'][name] = {}
+        for n in (lengths if scales else lengths[:1]):
+            fn = factory(make_history(n, seed))
+            try:
+                stats = measure(fn)
+            finally:
+                getattr(fn, 'close', lambda: None)()
+                plt.close('all')
+            results['stages'][name][str(n)] = stats
+            print(f"{name:>28} n={n:>7}: p50 {stats['p50_ms']:9.3f} ms  p99 {stats['p99_ms']:9.3f} ms  "
+                  f"peak {stats['peak_memory_kb']:10.1f} KB")
+    return results
+
+def compare(results, baseline):
+    print(f"\nvs {baseline.get('commit')} ({baseline.get('timestamp')}): p50 ratio (new / old)")
+    for name, by_length in results['stages'].items():
+        for n, stats in by_length.items():
+            old = baseline.get('stages', {}).get(name, {}).get(n)
+            if old:
+                ratio = stats['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('inf')
+                flag = "  <-- slower" if ratio > 1.2 else ""
+                print(f"{name:>28} n={n:>7}: {ratio:6.2f}x{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--lengths', nargs='+', type=int, default=list(DEFAULT_LENGTHS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="JSON file to write (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = run(args.stages, tuple(args.lengths), args.seed)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit'] or 'nogit'}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# enginemap.py
+import numpy as np
+
+from speednslip import engine_torque_and_fuel
+
+# Precomputed engine torque / fuel consumption surfaces.
+#
+# The torque (ent) and fuel (fcp) polynomials of calculate_parameters depend
+# only on throttle and engine speed.  EngineMap evaluates both once over a
+# throttle x rpm grid and answers later queries by bilinear interpolation.
+# Queries outside the grid are clamped to its edge; a NaN input gives NaN
+# torque and fuel, as with the polynomials.  Pass an EngineMap as
+# engine_map= to compute_parameters / calculate_parameters_batch to use it.
+
+THROTTLE_RANGE = (45.0, 85.0)  # %
+RPM_RANGE = (1200.0, 1800.0)   # rpm
+
+class EngineMap:
+    def __init__(self, throttle_step=1.0, rpm_step=10.0, throttle_range=THROTTLE_RANGE, rpm_range=RPM_RANGE):
+        if throttle_step <= 0 or rpm_step <= 0:
+            raise ValueError("grid steps must be positive")
+        self.throttle_min, self.throttle_max = map(float, throttle_range)
+        self.rpm_min, self.rpm_max = map(float, rpm_range)
+        self.throttle_cells = max(1, int(np.ceil((self.throttle_max - self.throttle_min) / throttle_step)))
+        self.rpm_cells = max(1, int(np.ceil((self.rpm_max - self.rpm_min) / rpm_step)))
+        # Steps are adjusted so the grid ends exactly on the range limits
+        self.throttle_step = (self.throttle_max - self.throttle_min) / self.throttle_cells
+        self.rpm_step = (self.rpm_max - self.rpm_min) / self.rpm_cells
+
+        self.throttle_axis = np.linspace(self.throttle_min, self.throttle_max, self.throttle_cells + 1)
+        self.rpm_axis = np.linspace(self.rpm_min, self.rpm_max, self.rpm_cells + 1)
+        self.torque, self.fuel = engine_torque_and_fuel(self.throttle_axis[:, None], self.rpm_axis[None, :])
+
+        # Per-cell bilinear coefficients of both surfaces, so a lookup is one
+        # gather plus f = c0 + c1 * fu + c2 * fv + c3 * fu * fv per surface
+        self.coefficients = np.concatenate(
+            (_cell_coefficients(self.torque), _cell_coefficients(self.fuel)), axis=-1
+        ).reshape(-1, 8)
+        # Python tuples for the scalar path; indexing a list is much cheaper
+        # than indexing a NumPy array one element at a time
+        self._cells = [tuple(row) for row in self.coefficients.tolist()]
+        self._throttle_scale = 1 / self.throttle_step
+        self._rpm_scale = 1 / self.rpm_step
+
+    @property
+    def shape(self):
+        return self.torque.shape
+
+    # (engine torque, fuel consumption) at one operating point
+    def lookup(self, throttle, engine_speed):
+        u = (throttle - self.throttle_min) * self._throttle_scale
+        v = (engine_speed - self.rpm_min) * self._rpm_scale
+        if u != u or v != v:
+            return float('nan'), float('nan')
+        i = int(u)
+        j = int(v)
+        if u < 0:
+            i, u = 0, 0.0
+        elif i >= self.throttle_cells:
+            i, u = self.throttle_cells - 1, float(self.throttle_cells)
+        if v < 0:
+            j, v = 0, 0.0
+        elif j >= self.rpm_cells:
+            j, v = self.rpm_cells - 1, float(self.rpm_cells)
+        fu = u - i
+        fv = v - j
+        fuv = fu * fv
+
+        t0, t1, t2, t3, f0, f1, f2, f3 = self._cells[i * self.rpm_cells + j]
+        return (t0 + t1 * fu + t2 * fv + t3 * fuv, f0 + f1 * fu + f2 * fv + f3 * fuv)
+
+    # (engine torque, fuel consumption) arrays for arrays of operating points
+    def lookup_batch(self, throttle, engine_speed):
+        throttle, engine_speed = np.broadcast_arrays(
+            np.asarray(throttle, dtype=np.float64), np.asarray(engine_speed, dtype=np.float64)
+        )
+        u = (np.clip(throttle, self.throttle_min, self.throttle_max) - self.throttle_min) * self._throttle_scale
+        v = (np.clip(engine_speed, self.rpm_min, self.rpm_max) - self.rpm_min) * self._rpm_scale
+        # NaN inputs look up the first cell and get NaN results afterwards
+        missing = np.isnan(u) | np.isnan(v)
+        if missing.any():
+            u = np.where(missing, 0.0, u)
+            v = np.where(missing, 0.0, v)
+        i = np.minimum(u.astype(np.intp), self.throttle_cells - 1)
+        j = np.minimum(v.astype(np.intp), self.rpm_cells - 1)
+        fu = u - i
+        fv = v - j
+        fuv = fu * fv
+
+        k = self.coefficients[i * self.rpm_cells + j]
+        k = np.moveaxis(k, -1, 0)
+        torque = k[0] + k[1] * fu + k[2] * fv + k[3] * fuv
+        fuel = k[4] + k[5] * fu + k[6] * fv + k[7] * fuv
+        if missing.any():
+            torque = np.where(missing, np.nan, torque)
+            fuel = np.where(missing, np.nan, fuel)
+        return torque, fuel
+
+    # Interpolation error against the exact polynomials over random points in
+    # the grid range, per surface: max/RMS absolute error and max error
+    # relative to the surface's value range
+    def error_report(self, samples=100_000, seed=0):
+        rng = np.random.default_rng(seed)
+        throttle = rng.uniform(self.throttle_min, self.throttle_max, samples)
+        engine_speed = rng.uniform(self.rpm_min, self.rpm_max, samples)
+        exact = engine_torque_and_fuel(throttle, engine_speed)
+        approx = self.lookup_batch(throttle, engine_speed)
+
+        report = {}
+        for name, table, e, a in zip(('engine_torque', 'fuel_consumption'), (self.torque, self.fuel), exact, approx):
+            error = np.abs(a - e)
+            span = float(table.max() - table.min()) or 1.0
+            report[name] = {
+                'max_abs_error': float(error.max()),
+                'rms_error': float(np.sqrt(np.mean(error ** 2))),
+                'max_error_of_range': float(error.max() / span),
+            }
+        return report
+
+# Bilinear coefficients (c0, c1, c2, c3) of every cell of a surface sampled
+# on the grid corners, shaped (cells along axis 0, cells along axis 1, 4)
+def _cell_coefficients(surface):
+    a = surface[:-1, :-1]
+    b = surface[:-1, 1:]
+    c = surface[1:, :-1]
+    d = surface[1:, 1:]
+    return np.stack((a, c - a, b - a, a - b - c + d), axis=-1)
@@ -1,5 +1,4 @@
 import streamlit as st
-st.set_option('deprecation.showPyplotGlobalUse', False)
 #@st.cache
 def show_explore_page():
     st.markdown("<h1 style='text-align: left; color: DarkRed;'>Contributors:</h1>", unsafe_allow_html=True)
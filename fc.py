@@ -1,6 +1,18 @@
 import streamlit as st
 import random
 import time
+import html
+import numpy as np
+from telemetry import SimulatorSource
+from samples import Batch
+from producer import Producer
+from fuelflow import FuelMeter
+from advisory import recommend, OBJECTIVES
+from anomaly import AnomalyDetector, UNCHECKED_CHANNELS
+import speednslip
+import perf
+import whatif
+from assets import load_image
 
 def generate_main_flow_rate():
     return round(random.uniform(1.08, 1.24), 2)
@@ -8,16 +20,299 @@ def generate_main_flow_rate():
 def generate_overflow_flow_rate():
     return round(random.uniform(0.98, 1.17), 2)
 
-def generate_mainflow_fuel_quantity():
-    return random.randint(0, 500)
+# Sample rate of the flow meters (Hz)
+FLOW_RATE_HZ = 50
 
-def generate_overflow_fuel_quantity():
-    return random.randint(0, 350)
+# Telemetry source backed by the flow rate generators above.  Line
+# quantities and total consumption are integrated from the flow rates
+# (see fuelflow.py) rather than generated.
+def simulator_source(rate_hz=FLOW_RATE_HZ):
+    return SimulatorSource({
+        'main_flow_rate': generate_main_flow_rate,
+        'overflow_flow_rate': generate_overflow_flow_rate,
+    }, rate_hz=rate_hz)
 
-def generate_total_fuel_consumption():
-    return round(random.uniform(0.12, 0.21), 2)
+# Table of the latest (decimated) fuel flow sample
+# totals adds the litres used this session, in the current field and since
+# the producer started: {'session': L, 'field': (name, L) or None, 'total': L}
+def generate_table_html(sample, totals=None):
+    rows = ""
+    if totals is not None:
+        rows += f"""
+        <tr>
+            <td>Fuel Used This Session (L)</td>
+            <td>{totals['session']:.3f}</td>
+        </tr>"""
+        if totals['field'] is not None:
+            rows += f"""
+        <tr>
+            <td>Fuel Used in Field {html.escape(totals['field'][0])} (L)</td>
+            <td>{totals['field'][1]:.3f}</td>
+        </tr>"""
+        rows += f"""
+        <tr>
+            <td>Fuel Used Since Start (L)</td>
+            <td>{totals['total']:.3f}</td>
+        </tr>"""
+    return f"""
+    <table>
+        <tr>
+            <th>Parameter</th>
+            <th>Value</th>
+        </tr>
+        <tr>
+            <td>Main Flow Line Flow Rate (L/min) </td>
+            <td>{sample['main_flow_rate']:.3f}</td>
+        </tr>
+        <tr>
+            <td>Overflow Line Flow Rate (L/min)</td>
+            <td>{sample['overflow_flow_rate']:.3f}</td>
+        </tr>
+        <tr>
+            <td>Mainflow Line Fuel Quantity (mL)</td>
+            <td>{1000 * sample['main_fuel_l']:.0f}</td>
+        </tr>
+        <tr>
+            <td>Overflow Line Fuel Quantity (mL)</td>
+            <td>{1000 * sample['overflow_fuel_l']:.0f}</td>
+        </tr>
+        <tr>
+            <td>Total Fuel Consumption (l/min)</td>
+            <td>{sample['net_flow_rate']:.3f}</td>
+        </tr>{rows}
+    </table>
+    """
+
+# Table with the recommended operating point for the current engine speed
+def advice_table_html(advice, engine_speed):
+    if advice is None:
+        return f"""
+        <table>
+            <tr><th>Recommended Setting</th></tr>
+            <tr><td>No throttle/gear/depth setting meets the draft and depth limits at {engine_speed} rpm</td></tr>
+        </table>
+        """
+    return f"""
+        <table>
+            <tr>
+                <th>Recommended Setting</th>
+                <th>Value</th>
+            </tr>
+            <tr>
+                <td>Engine Speed (rpm)</td>
+                <td>{engine_speed}</td>
+            </tr>
+            <tr>
+                <td>Gear</td>
+                <td>{advice['gear']}</td>
+            </tr>
+            <tr>
+                <td>Throttle Setting (%)</td>
+                <td>{advice['throttle']}</td>
+            </tr>
+            <tr>
+                <td>Implement Depth (cm)</td>
+                <td>{advice['implement_depth']:.1f}</td>
+            </tr>
+            <tr>
+                <td>Fuel Consumption per Tilled Area (L/ha)</td>
+                <td>{advice['fuel_consumption_area']:.2f}</td>
+            </tr>
+            <tr>
+                <td>Tractive Efficiency (%)</td>
+                <td>{advice['tractive_efficiency']:.2f}</td>
+            </tr>
+            <tr>
+                <td>Implement Draft (kN)</td>
+                <td>{advice['implement_draft']:.2f}</td>
+            </tr>
+        </table>
+        """
+
+# Operating and derived channels checked for anomalies, with their labels
+ANOMALY_CHANNELS = tuple(name for name in speednslip.HISTORY_CHANNELS[1:] if name not in UNCHECKED_CHANNELS)
+ANOMALY_LABELS = {
+    'throttle': "Throttle (%)",
+    'engine_speed': "Engine speed (rpm)",
+    'forward_speed': "Forward speed (km/h)",
+    'implement_depth': "Implement depth (cm)",
+    'slip': "Slip (%)",
+    **{name: label for name, label, _ in speednslip.PLOT_SERIES},
+}
+
+# Alerts listed on the page (seconds)
+ALERT_SECONDS = 60
+
+# Table of anomaly alerts (see anomaly.AnomalyDetector.alerts); fleet alerts
+# carry a tractor ID and page alerts the page (source), each with a column
+def alerts_table_html(alerts, title):
+    fleet = any('tractor_id' in alert for alert in alerts)
+    pages = any('source' in alert for alert in alerts)
+    columns = ((["Tractor"] if fleet else []) + (["Page"] if pages else [])
+               + ["Parameter", "Check", "Value", "Expected", "Count"])
+    rows = ""
+    for alert in alerts:
+        if alert['check'] == 'range':
+            check, expected = "Out of range", f"{alert['low']:g} – {alert['high']:g}"
+        else:
+            check, expected = "Spike", f"≈ {alert['mean']:.2f}"
+        cells = ([alert['tractor_id']] if fleet else []) + ([alert['source']] if pages else []) + [
+            ANOMALY_LABELS.get(alert['channel'], alert['channel']), check, f"{alert['value']:.2f}", expected,
+            alert['count'],
+        ]
+        rows += "<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>"
+    if not alerts:
+        rows = f"<tr><td colspan='{len(columns)}'>No anomalies in the last {ALERT_SECONDS} s</td></tr>"
+    header = "".join(f"<th>{column}</th>" for column in columns)
+    return f"""
+        <table>
+            <tr><th colspan='{len(columns)}'>{title}</th></tr>
+            <tr>{header}</tr>
+            {rows}
+        </table>
+        """
+
+# Implement, soil and objective inputs of the advisory engine
+def advisory_settings():
+    with st.expander("Advisory settings", expanded=False):
+        objective = st.radio(
+            "Optimise for", list(OBJECTIVES),
+            format_func=lambda name: {
+                'fuel_consumption_area': "Minimum fuel per tilled area",
+                'tractive_efficiency': "Maximum tractive efficiency",
+            }[name],
+        )
+        width = st.number_input("Implement width (m)", 0.2, 5.0, speednslip.IMPLEMENT_WIDTH, 0.1)
+        soil_factor = st.number_input("Soil texture factor", 0.2, 1.5, speednslip.SOIL_FACTOR, 0.01)
+        slip = st.number_input("Expected wheel slip (%)", 0.0, 40.0, 15.0, 0.5)
+        max_draft = st.number_input("Maximum implement draft (kN)", 0.0, 50.0, 6.0, 0.1)
+        min_depth = st.number_input("Minimum tillage depth (cm)", 5.0, 25.0, 10.0, 0.5)
+    return {
+        'objective': objective, 'width': width, 'soil_factor': soil_factor, 'slip': slip,
+        'max_draft': max_draft, 'min_depth': min_depth,
+    }
+
+# Monte Carlo results are cached per input, so reruns of the page and other
+# sessions asking the same question reuse them
+@st.cache_data(show_spinner=False)
+def whatif_rows(samples, seed, width, soil_factor):
+    result = whatif.simulate(samples, seed, width=width, soil_factor=soil_factor)
+    return whatif.percentile_rows(result), result['seconds']
+
+# Per-gear distribution of fuel per tilled area, drawbar power and tractive
+# efficiency over the simulator's operating ranges, for planning a job
+def whatif_planner(advice):
+    with st.expander("What-if by gear (Monte Carlo)", expanded=False):
+        col1, col2 = st.columns(2)
+        samples = col1.selectbox("Operating points", (1_000_000, 2_000_000, 5_000_000),
+                                 format_func=lambda n: f"{n / 1e6:g} million")
+        seed = col2.number_input("Seed", 0, 2 ** 31 - 1, 0)
+        if st.button("Simulate"):
+            with st.spinner("Simulating..."):
+                rows, seconds = whatif_rows(samples, int(seed), advice['width'], advice['soil_factor'])
+            st.dataframe(rows, hide_index=True)
+            st.caption(f"{samples:,} points per gear, seed {seed}, {seconds:.1f} s")
+
+# Channels kept by the shared producer: the flow rates and running litres
+# decimated to one row a second, plus the engine speed the advisory engine
+# plans around
+PRODUCER_CHANNELS = (
+    'time', 'main_flow_rate', 'overflow_flow_rate', 'net_flow_rate',
+    'main_fuel_l', 'overflow_fuel_l', 'net_fuel_l', 'engine_speed',
+)
+HISTORY_SAMPLES = 3600
+
+# Net flow graphed on the page (seconds)
+CHART_SECONDS = 600
+
+# Page producers whose rows the Advisory page checks for anomalies: the
+# ones the Performance Prediction and GPS pages show when run on their own.
+# gps is imported here, like the pages in app.py, so importing this module
+# doesn't load it.
+def operating_producers():
+    import gps
+    return {'Performance': speednslip.default_producer(), 'GPS': gps.default_producer()}
+
+# Shared producer reading source (default: the random generators above at
+# 50 Hz) once a second.  Every raw sample is integrated by a
+# fuelflow.FuelMeter; the history keeps its one-second rows.
+# operating maps a label to a page producer (default: operating_producers())
+# whose new rows are scored by an anomaly.AnomalyDetector over the channels
+# it keeps, shared as 'anomalies' (label -> detector) with the time of each
+# one's newest row as 'operating_time' (label -> time).  The engine speed of
+# the first one's latest row is attached to every row, NaN until the first
+# arrives.  The page producers are shared and not closed with this one.
+def make_producer(source=None, operating=None):
+    if source is None:
+        source = simulator_source()
+    if operating is None:
+        operating = operating_producers()
+    meter = FuelMeter(bucket_s=1.0)
+    anomalies = {label: AnomalyDetector(tuple(name for name in ANOMALY_CHANNELS if name in page.channels))
+                 for label, page in operating.items()}
+    operating_time = {label: -np.inf for label in operating}
+    cursors = dict.fromkeys(operating, 0)
+    engine_speed = [np.nan]
+
+    def read():
+        with perf.phase('fc', 'generate'):
+            batch = source.read()
+            new_rows = {}
+            for label, page in operating.items():
+                new_rows[label], cursors[label] = page.since(cursors[label])
+        with perf.phase('fc', 'compute'):
+            for i, (label, rows) in enumerate(new_rows.items()):
+                if not len(rows['time']):
+                    continue
+                if i == 0:
+                    engine_speed[0] = float(rows['engine_speed'][-1])
+                with producer.lock:
+                    anomalies[label].update_columns(rows)
+                    operating_time[label] = float(rows['time'][-1])
+        with perf.phase('fc', 'compute'), producer.lock:
+            rows = meter.add(batch)
+        if not len(rows['time']):
+            return None
+        return Batch(rows, engine_speed=np.full(len(rows['time']), engine_speed[0]))
+
+    producer = Producer(read, PRODUCER_CHANNELS, HISTORY_SAMPLES, period=1.0, page='fc',
+                        shared={'meter': meter, 'anomalies': anomalies, 'operating_time': operating_time},
+                        resources=(source,))
+    return producer.start()
+
+# Litres used this session (since baseline), in the current field and in
+# total, for generate_table_html
+def fuel_totals(producer, baseline):
+    meter = producer.shared['meter']
+    with producer.lock:
+        field = None if meter.field is None else (meter.field, meter.fields[meter.field])
+        return {'session': meter.net_fuel_l - baseline, 'field': field, 'total': meter.net_fuel_l}
+
+# Producer used when the page is not given one (e.g. run on its own)
+@st.cache_resource
+def default_producer():
+    return make_producer()
+
+# Alerts of each page producer in the last ALERT_SECONDS of its clock, up
+# to its newest row (so alerts age out once anomalies stop), labelled with
+# the page as 'source'
+def recent_alerts(producer):
+    alerts = []
+    with producer.lock:
+        for label, anomalies in producer.shared['anomalies'].items():
+            since = producer.shared['operating_time'][label] - ALERT_SECONDS
+            alerts += [{**alert, 'source': label} for alert in anomalies.alerts(since=since)]
+    return alerts
+
+# The page polls producer (default: default_producer()) once a second from a
+# fragment, so it never blocks the script.  advice holds advisory_settings();
+# fleet_state (an ingest.FleetState) adds the alerts of every tractor.
+def display_parameters(producer=None, advice=None, fleet_state=None):
+    if producer is None:
+        producer = default_producer()
+    if advice is None:
+        advice = {}
 
-def display_parameters():
     #st.title("Real-time Fuel Parameters Display")
     st.markdown(
         """
@@ -51,54 +346,63 @@ def display_parameters():
         st.write("")
 
     with col2:
-        st.image("fc.png")
+        st.image(load_image("fc.png"))
 
     with col3:
         st.write("")
 
-    output_placeholder = st.empty()
+    # Litres are booked to the field entered here (shared by everyone
+    # watching this tractor)
+    meter = producer.shared['meter']
 
-    while True:
-        main_flow_rate = generate_main_flow_rate()
-        overflow_flow_rate = generate_overflow_flow_rate()
-        mainflow_fuel_quantity = generate_mainflow_fuel_quantity()
-        overflow_fuel_quantity = generate_overflow_fuel_quantity()
-        total_fuel_consumption = generate_total_fuel_consumption()
+    def change_field():
+        with producer.lock:
+            meter.set_field(st.session_state['fc_field'].strip())
 
-        output_content = f"""
-        <table>
-            <tr>
-                <th>Parameter</th>
-                <th>Value</th>
-            </tr>
-            <tr>
-                <td>Main Flow Line Flow Rate (L/min) </td>
-                <td>{main_flow_rate}</td>
-            </tr>
-            <tr>
-                <td>Overflow Line Flow Rate (L/min)</td>
-                <td>{overflow_flow_rate}</td>
-            </tr>
-            <tr>
-                <td>Mainflow Line Fuel Quantity (mL)</td>
-                <td>{mainflow_fuel_quantity}</td>
-            </tr>
-            <tr>
-                <td>Overflow Line Fuel Quantity (mL)</td>
-                <td>{overflow_fuel_quantity}</td>
-            </tr>
-            <tr>
-                <td>Total Fuel Consumption (l/min)</td>
-                <td>{total_fuel_consumption}</td>
-            </tr>
-        </table>
-        """
+    st.text_input("Field", value=meter.field or "", key='fc_field', on_change=change_field,
+                  placeholder="Name of the field being worked")
+
+    # This session's total counts from its first view of the producer
+    held, baseline = st.session_state.get('fc_fuel_baseline', (None, None))
+    if held is not producer:
+        baseline = meter.net_fuel_l
+        st.session_state['fc_fuel_baseline'] = (producer, baseline)
+
+    # Recommend a setting for the current engine speed
+    def advice_html():
+        engine_speed = int(producer.latest()['engine_speed'])
+        with perf.phase('fc', 'compute'):
+            recommended = recommend(engine_speed, **advice)
+        return advice_table_html(recommended, engine_speed)
+
+    @st.fragment(run_every=1.0)
+    def live():
+        sample = producer.latest()
+        if sample is None:
+            return
+
+        with perf.phase('fc', 'render_html'):
+            st.markdown(generate_table_html(sample, fuel_totals(producer, baseline)), unsafe_allow_html=True)
+            if not np.isnan(sample['engine_speed']):
+                table_html = producer.memo(('advice', *sorted(advice.items())), advice_html)
+                st.markdown(table_html, unsafe_allow_html=True)
+            st.markdown(alerts_table_html(recent_alerts(producer), "Anomaly Alerts"), unsafe_allow_html=True)
+            if fleet_state is not None:
+                alerts = fleet_state.alerts(since=time.monotonic() - ALERT_SECONDS, limit=20)
+                st.markdown(alerts_table_html(alerts, "Fleet Anomaly Alerts"), unsafe_allow_html=True)
+
+        # Net flow over the last minutes from the decimated history
+        with perf.phase('fc', 'render_plot'):
+            with producer.lock:
+                _, _, history = producer.snapshot(copy=False)
+                recent = history['time'] > history['time'][-1] - CHART_SECONDS
+                chart = {'Time (s)': history['time'][recent], 'Net flow (L/min)': history['net_flow_rate'][recent]}
+            st.line_chart(chart, x='Time (s)', y='Net flow (L/min)')
 
-        output_placeholder.markdown(output_content, unsafe_allow_html=True)
-        time.sleep(1)  # Display for 3 seconds
+    live()
 
-        output_placeholder.empty()  # Clear the content for new data
-        #time.sleep(1)  # Add a small delay before displaying new data
-def show_fc_page():
+def show_fc_page(producer=None, fleet_state=None):
     st.markdown("<h3 style='text-align: center; color: #4d3b02;'>Real-time Fuel Consumption Parameters Display</h3>", unsafe_allow_html=True)
-    display_parameters()
\ No newline at end of file
+    advice = advisory_settings()
+    whatif_planner(advice)
+    display_parameters(producer, advice, fleet_state)
@@ -0,0 +1,174 @@
+# fieldcoverage.py
+import math
+from array import array
+
+import numpy as np
+
+# Tilled area, double-tilled area and fuel per hectare from the GPS track.
+#
+# The implement swath (a width_m wide capsule around each track segment) is
+# rasterized into a grid of cell_m square cells laid out on a local metric
+# projection around the first fix.  Only touched cells are stored, in
+# tile_cells x tile_cells tiles held in a dict: a uint8 pass count and a
+# float32 time stamp of the last visit per cell.  A cell visited again
+# within pass_gap_s belongs to the same pass (consecutive segments overlap
+# at the joints); later visits count as a new pass, so cells with two or
+# more passes make up the overlap area.
+#
+# Each new point rasterizes one segment row by row, touching only the cells
+# the swath covers, so the work per point depends on speed and sample rate,
+# not on how much of the field has been tilled.  At the default 0.25 m cells
+# a tile is 16 m square and 20 KB.
+#
+# Points with working=False (implement raised) and jumps longer than
+# max_step_m (GPS dropouts) move the tractor without tilling.  Fuel
+# (fuel_lph, integrated with the trapezoidal rule while working) divided by
+# the tilled area gives the real L/ha.
+
+EARTH_RADIUS_M = 6371008.8
+
+class FieldCoverage:
+    def __init__(self, width_m, cell_m=0.25, tile_cells=64, pass_gap_s=5.0, max_step_m=50.0):
+        self.half_width = width_m / 2
+        self.cell_m = cell_m
+        self.tile_cells = tile_cells
+        self.tile_shift = tile_cells.bit_length() - 1
+        if 1 << self.tile_shift != tile_cells:
+            raise ValueError("tile_cells must be a power of two")
+        self.pass_gap_s = pass_gap_s
+        self.max_step_m = max_step_m
+        self.tiles = {}
+        self.origin = None
+        self.previous = None
+        self.tilled_cells = 0
+        self.overlap_cells = 0
+        self.fuel_l = 0.0
+
+    # Local east/north metres of a fix relative to the first one
+    def _project(self, lat, lon):
+        lat0, lon0, scale = self.origin
+        return (
+            math.radians(lon - lon0) * scale,
+            math.radians(lat - lat0) * EARTH_RADIUS_M,
+        )
+
+    # (counts, stamps) of a tile, row-major flat arrays; plain arrays keep
+    # single-cell access cheap from Python
+    def _tile(self, key):
+        tile = self.tiles.get(key)
+        if tile is None:
+            size = self.tile_cells * self.tile_cells
+            tile = self.tiles[key] = (bytearray(size), array('f', [-math.inf]) * size)
+        return tile
+
+    def _visit_row(self, j, i_start, i_stop, t):
+        shift, mask = self.tile_shift, self.tile_cells - 1
+        row = (j & mask) << shift
+        tile_key = None
+        for i in range(i_start, i_stop):
+            if i >> shift != tile_key:
+                tile_key = i >> shift
+                counts, stamps = self._tile((tile_key, j >> shift))
+            k = row | (i & mask)
+            if t - stamps[k] > self.pass_gap_s:
+                count = counts[k]
+                if count == 0:
+                    self.tilled_cells += 1
+                elif count == 1:
+                    self.overlap_cells += 1
+                if count < 255:
+                    counts[k] = count + 1
+            stamps[k] = t
+
+    # x range of the swath capsule around (x0, y0)-(x1, y1) on the line y,
+    # or None
+    def _row_span(self, x0, y0, x1, y1, ux, uy, length, y):
+        hw = self.half_width
+        low, high = math.inf, -math.inf
+        # End caps
+        for cx, cy in ((x0, y0), (x1, y1)):
+            dy = y - cy
+            if abs(dy) <= hw:
+                dx = math.sqrt(hw * hw - dy * dy)
+                low, high = min(low, cx - dx), max(high, cx + dx)
+        # Rectangle: 0 <= along <= length and |across| <= hw, each linear in x
+        if length > 0:
+            lo, hi = -math.inf, math.inf
+            for coef, offset, bound_lo, bound_hi in (
+                (ux, (y - y0) * uy, 0.0, length),
+                (-uy, (y - y0) * ux, -hw, hw),
+            ):
+                if abs(coef) < 1e-12:
+                    if not bound_lo <= offset <= bound_hi:
+                        lo, hi = math.inf, -math.inf
+                        break
+                    continue
+                a = (bound_lo - offset) / coef
+                b = (bound_hi - offset) / coef
+                if a > b:
+                    a, b = b, a
+                lo, hi = max(lo, a), min(hi, b)
+            if lo <= hi:
+                low, high = min(low, x0 + lo), max(high, x0 + hi)
+        return (low, high) if low <= high else None
+
+    def _sweep(self, x0, y0, x1, y1, t):
+        c = self.cell_m
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        ux, uy = (dx / length, dy / length) if length > 0 else (1.0, 0.0)
+        hw = self.half_width
+        # Rows whose cell centres fall inside the swath
+        for j in range(math.ceil((min(y0, y1) - hw) / c - 0.5), math.floor((max(y0, y1) + hw) / c - 0.5) + 1):
+            span = self._row_span(x0, y0, x1, y1, ux, uy, length, (j + 0.5) * c)
+            if span is None:
+                continue
+            self._visit_row(j, math.ceil(span[0] / c - 0.5), math.floor(span[1] / c - 0.5) + 1, t)
+
+    def add(self, t, lat, lon, fuel_lph=0.0, working=True):
+        if math.isnan(lat) or math.isnan(lon):
+            return
+        if self.origin is None:
+            self.origin = (lat, lon, EARTH_RADIUS_M * math.cos(math.radians(lat)))
+            self.t0 = t
+        x, y = self._project(lat, lon)
+        t -= self.t0
+        if self.previous is not None:
+            pt, px, py, pfuel, pworking = self.previous
+            if working and pworking and math.hypot(x - px, y - py) <= self.max_step_m:
+                self._sweep(px, py, x, y, t)
+                self.fuel_l += (pfuel + fuel_lph) / 2 * (t - pt) / 3600
+        self.previous = (t, x, y, fuel_lph, working)
+
+    def add_batch(self, times, lat, lon, fuel_lph=None, working=None):
+        n = len(times)
+        fuel_lph = np.zeros(n) if fuel_lph is None else fuel_lph
+        working = np.ones(n, dtype=bool) if working is None else working
+        for row in zip(np.asarray(times).tolist(), np.asarray(lat).tolist(), np.asarray(lon).tolist(),
+                       np.asarray(fuel_lph).tolist(), np.asarray(working).tolist()):
+            self.add(*row)
+
+    @property
+    def tilled_ha(self):
+        return self.tilled_cells * self.cell_m ** 2 / 10000
+
+    @property
+    def overlap_ha(self):
+        return self.overlap_cells * self.cell_m ** 2 / 10000
+
+    @property
+    def fuel_per_ha(self):
+        return self.fuel_l / self.tilled_ha if self.tilled_cells else math.nan
+
+    # Memory held by the tiles (bytes)
+    @property
+    def nbytes(self):
+        return sum(len(counts) + stamps.itemsize * len(stamps) for counts, stamps in self.tiles.values())
+
+    def report(self):
+        return {
+            'tilled_ha': self.tilled_ha,
+            'overlap_ha': self.overlap_ha,
+            'fuel_l': self.fuel_l,
+            'fuel_per_ha': self.fuel_per_ha,
+        }
@@ -0,0 +1,117 @@
+# fuelflow.py
+import numpy as np
+
+# Fuel actually burnt, from the main and overflow (return) line flow meters.
+#
+# The engine consumes what goes down the main line minus what comes back
+# through the overflow line.  FlowIntegrator turns flow rates (L/min) into
+# cumulative litres with the trapezoidal rule over the real sample times,
+# vectorized per batch and carrying the last sample over to the next batch,
+# so 50 Hz meters cost one pass of NumPy per tick.  Intervals longer than
+# max_gap_s (dropouts, paused replays) are not integrated.
+#
+# Decimator reduces the raw samples to fixed buckets for display (means of
+# the rates, last value of the running totals); the partial bucket is kept
+# until it completes.  FuelMeter ties both together and books the net
+# litres to the field currently being worked.
+
+class FlowIntegrator:
+    def __init__(self, channels, max_gap_s=1.0):
+        self.channels = tuple(channels)
+        self.max_gap_s = max_gap_s
+        self.totals = {name: 0.0 for name in self.channels}
+        self.last = None
+
+    # Cumulative litres per channel at every sample of the batch
+    def add(self, times, rates):
+        times = np.asarray(times, dtype=np.float64)
+        if not len(times):
+            return {name: np.empty(0) for name in self.channels}
+        if self.last is None:
+            self.last = (times[0], {name: float(rates[name][0]) for name in self.channels})
+        last_time, last_rates = self.last
+        dt = np.diff(times, prepend=last_time)
+        valid = (dt > 0) & (dt <= self.max_gap_s)
+        cumulative = {}
+        for name in self.channels:
+            rate = np.asarray(rates[name], dtype=np.float64)
+            previous = np.concatenate(([last_rates[name]], rate[:-1]))
+            litres = np.where(valid, (rate + previous) / 2 * dt, 0.0) / 60
+            cumulative[name] = self.totals[name] + np.cumsum(litres)
+            self.totals[name] = float(cumulative[name][-1])
+        self.last = (times[-1], {name: float(rates[name][-1]) for name in self.channels})
+        return cumulative
+
+class Decimator:
+    # mean and last are the channels reduced by mean and by last value
+    def __init__(self, bucket_s=1.0, mean=(), last=(), time_channel='time'):
+        self.bucket_s = bucket_s
+        self.mean = tuple(mean)
+        self.last = tuple(last)
+        self.time_channel = time_channel
+        self.pending = None
+
+    # Completed buckets (stamped with their end time) as columns
+    def add(self, columns):
+        if self.pending is not None:
+            columns = {name: np.concatenate((self.pending[name], columns[name])) for name in self.pending}
+        times = columns[self.time_channel]
+        buckets = np.floor(times / self.bucket_s).astype(np.int64)
+        # Samples of the last (still open) bucket wait for the next batch
+        complete = int(np.searchsorted(buckets, buckets[-1], side='left')) if len(buckets) else 0
+        self.pending = {name: values[complete:] for name, values in columns.items()}
+        if not complete:
+            return {name: np.empty(0) for name in (self.time_channel, *self.mean, *self.last)}
+        buckets = buckets[:complete]
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        ends = np.append(starts[1:], complete) - 1
+        counts = np.diff(np.append(starts, complete))
+        out = {self.time_channel: (buckets[starts] + 1) * self.bucket_s}
+        for name in self.mean:
+            out[name] = np.add.reduceat(columns[name][:complete], starts) / counts
+        for name in self.last:
+            out[name] = columns[name][ends]
+        return out
+
+# Net consumption from the two flow meters with per-field totals.
+#
+# add() takes raw batches with main_flow_rate and overflow_flow_rate (L/min)
+# and returns the decimated display rows: mean main, overflow and net flow
+# rates and the running main, overflow and net litres.
+class FuelMeter:
+    def __init__(self, bucket_s=1.0, max_gap_s=1.0):
+        self.integrator = FlowIntegrator(('main_flow_rate', 'overflow_flow_rate', 'net_flow_rate'), max_gap_s)
+        self.decimator = Decimator(
+            bucket_s,
+            mean=('main_flow_rate', 'overflow_flow_rate', 'net_flow_rate'),
+            last=('main_fuel_l', 'overflow_fuel_l', 'net_fuel_l'),
+        )
+        self.field = None
+        self.fields = {}
+
+    # Book the litres from now on to field (None: not booked to a field)
+    def set_field(self, field):
+        self.field = field or None
+        if self.field is not None:
+            self.fields.setdefault(self.field, 0.0)
+
+    @property
+    def net_fuel_l(self):
+        return self.integrator.totals['net_flow_rate']
+
+    def add(self, batch):
+        rates = {
+            'main_flow_rate': batch['main_flow_rate'],
+            'overflow_flow_rate': batch['overflow_flow_rate'],
+            'net_flow_rate': batch['main_flow_rate'] - batch['overflow_flow_rate'],
+        }
+        before = self.net_fuel_l
+        cumulative = self.integrator.add(batch['time'], rates)
+        if self.field is not None:
+            self.fields[self.field] += self.net_fuel_l - before
+        return self.decimator.add({
+            'time': batch['time'], **rates,
+            'main_fuel_l': cumulative['main_flow_rate'],
+            'overflow_fuel_l': cumulative['overflow_flow_rate'],
+            'net_fuel_l': cumulative['net_flow_rate'],
+        })
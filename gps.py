@@ -1,10 +1,17 @@
 import streamlit as st
 import random
-import time
-from datetime import datetime, timedelta
-import folium
-from streamlit_folium import folium_static
-import matplotlib.pyplot as plt
+import numpy as np
+import streamlit.components.v1 as components
+from gpstrail import GpsTrail
+from liveplot import LivePlot, figure_png
+from telemetry import SimulatorSource
+from samples import Batch
+from producer import Producer, pump
+from windowstats import StreamStats, header_cells, stats_cells
+from tablerender import TableTemplate, icon_src
+import perf
+from fieldcoverage import FieldCoverage
+from speednslip import calculate_parameters_batch, engine_torque_and_fuel, gear_options, IMPLEMENT_WIDTH
 #from common import generate_engine_speed, generate_throttle_setting, generate_implement_depth, generate_actual_forward_speed, generate_latitude, generate_longitude
 
 # Function to generate parameters within given ranges
@@ -29,20 +36,198 @@ def generate_longitude(current_long):
 def calculate_slip():
     return round(random.uniform(12.10, 17.85), 2)
 
-# Icon URLs for the table
-icon_url = {
-    "Gear Ratio": "https://fractory.com/wp-content/uploads/2020/09/Types-of-Gears.jpg",
-    "Engine Speed": "https://encrypted-tbn3.gstatic.com/images?q=tbn:ANd9GcTKyBS49iMPrJ85c0wm2X8ZQOU3K5CC4UIFh-9llBUeX0Q5Rxg8",
-    "Throttle Setting": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcTqfyK_C2nQ7d2DbmoCG86HNJlPMjPmtkVkACmf2xovDLvVzjzW",
-    "Implement Depth": "https://encrypted-tbn1.gstatic.com/images?q=tbn:ANd9GcQXreG2Omv2h0DHS11b3KiY44Wij_WkqDJqIvjj-dPi4W-fQH1y",
-    "Actual Speed": "https://encrypted-tbn3.gstatic.com/images?q=tbn:ANd9GcTiwlixO0PSmDO-L67wHdYR0TChKAWNaRgYqa2nTrknkfv4nO7F",
-    "Slip": "https://encrypted-tbn2.gstatic.com/images?q=tbn:ANd9GcSvNzAhdKuoz6EivK0C1VqTLyUjccS8RU_t5PVG2rppTKTOftuM",
-    "Latitude": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQobjC9X-TpXb8FtwTBAYyoKVzTdCLBtdSlsz-p0vTt2vd6ll1b",
-    "Longitude": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQobjC9X-TpXb8FtwTBAYyoKVzTdCLBtdSlsz-p0vTt2vd6ll1b"
+# Telemetry source backed by the generators above, starting the GPS walk
+# at the field location
+def simulator_source(rate_hz=None, latitude=22.31278, longitude=87.33152):
+    return SimulatorSource({
+        'engine_speed': generate_engine_speed,
+        'throttle': generate_throttle_setting,
+        'implement_depth': generate_implement_depth,
+        'forward_speed': generate_actual_forward_speed,
+        'slip': calculate_slip,
+        'latitude': generate_latitude,
+        'longitude': generate_longitude,
+    }, initial={'latitude': latitude, 'longitude': longitude}, rate_hz=rate_hz)
+
+# Graph history kept per session (one sample a second => one hour)
+HISTORY_SAMPLES = 3600
+HISTORY_CHANNELS = ('time', 'engine_speed', 'throttle', 'implement_depth', 'forward_speed', 'slip')
+
+# Simplification tolerance of the field track drawn on the map (metres)
+TRAIL_TOLERANCE_M = 1.0
+
+# Plotted series: (history channel, legend label, color)
+PLOT_SERIES = (
+    ('engine_speed', "Engine Speed (rpm)", 'blue'),
+    ('throttle', "Throttle Setting (%)", 'green'),
+    ('implement_depth', "Implement Depth (cm)", 'purple'),
+    ('forward_speed', "Actual Speed (km/h)", 'orange'),
+    ('slip', "Slip (%)", 'red'),
+)
+
+# Icon files (in static/) for the table
+icon_file = {
+    "Gear Ratio": "gear_icon.jpg",
+    "Engine Speed": "engine_icon.jpg",
+    "Throttle Setting": "throttle_icon.jpg",
+    "Implement Depth": "depth_icon.jpg",
+    "Actual Speed": "speed_icon.jpg",
+    "Slip": "slip_icon.jpg",
+    "Latitude": "gps_icon.jpg",
+    "Longitude": "gps_icon.jpg",
+    "Field Coverage": "gps_icon.jpg",
 }
 
+# Table rows: (sample key, icon, label, format)
+TABLE_ROWS = (
+    ('gear', "Gear Ratio", "Gear Ratio", ""),
+    ('engine_speed', "Engine Speed", "Engine Speed (rpm)", ".0f"),
+    ('throttle', "Throttle Setting", "Throttle Setting (%)", ".0f"),
+    ('implement_depth', "Implement Depth", "Implement Depth (cm)", ""),
+    ('forward_speed', "Actual Speed", "Actual Speed (km/h)", ""),
+    ('slip', "Slip", "Slip (%)", ".2f"),
+    ('latitude', "Latitude", "Latitude (N)", ""),
+    ('longitude', "Longitude", "Longitude (E)", ""),
+)
+
+# HTML table with icons, compiled once
+TABLE = TableTemplate(
+    """
+    <table>
+        <tr>
+        <td><b>Parameter</b></td>
+        <td><b>Value</b></td>
+        {stats_header}
+        </tr>""" + "".join(f"""
+        <tr>
+            <td><img src="{{icon_{key}}}" width="50"> {label}</td>
+            <td>{{{key}:{spec}}}</td>{{stats_{key}}}
+        </tr>""" for key, _, label, spec in TABLE_ROWS) + """{coverage_rows}
+    </table>
+    """,
+    icons={f"icon_{key}": icon_file[icon] for key, icon, _, _ in TABLE_ROWS},
+)
+
+# Table rows with the area covered along the GPS track (a
+# fieldcoverage.FieldCoverage report), or nothing when coverage is None
+def coverage_rows(coverage, stats=None):
+    if coverage is None:
+        return ""
+    rows = (
+        ("Tilled Area (ha)", f"{coverage['tilled_ha']:.4f}"),
+        ("Overlap Area (ha)", f"{coverage['overlap_ha']:.4f}"),
+        ("Fuel Consumption per Tilled Area (L/ha)",
+         "-" if np.isnan(coverage['fuel_per_ha']) else f"{coverage['fuel_per_ha']:.2f}"),
+    )
+    icon = icon_src(icon_file['Field Coverage'])
+    return "".join(f"""
+        <tr>
+            <td><img src="{icon}" width="50"> {label}</td>
+            <td>{value}</td>{stats_cells(stats, label)}
+        </tr>""" for label, value in rows)
+
+# Function to generate the HTML table for the latest sample
+# stats (a windowstats.StreamStats summary) adds the rolling statistics next
+# to the instantaneous values and coverage the tilled area rows
+def generate_table_html(gear, sample, stats=None, coverage=None):
+    values = {key: sample[key] for key, _, _, _ in TABLE_ROWS[1:]}
+    values['gear'] = gear
+    values['stats_header'] = header_cells(stats, 'td')
+    for key, _, _, _ in TABLE_ROWS:
+        values[f'stats_{key}'] = stats_cells(stats, key)
+    values['coverage_rows'] = coverage_rows(coverage, stats)
+    return TABLE.render(values)[0]
+
+# Channels kept by the shared producer: the graphed history plus the
+# position, so sessions can record everything from it
+PRODUCER_CHANNELS = HISTORY_CHANNELS + ('latitude', 'longitude')
+
+# Shared producer sampling source (default: the random generators above)
+# once a second and maintaining the GPS trail
+def make_producer(source=None):
+    if source is None:
+        source = simulator_source()
+    trail = GpsTrail(recent_seconds=10, tolerance_m=TRAIL_TOLERANCE_M)
+
+    def read():
+        with perf.phase('gps', 'generate'):
+            batch = source.read()
+        if not len(batch['time']):
+            return None
+        # Update the GPS trail; points older than 10 seconds expire from
+        # the recent trail, the full track is kept simplified
+        with perf.phase('gps', 'compute'), producer.lock:
+            trail.add_batch(batch['time'], batch['latitude'], batch['longitude'], batch['forward_speed'])
+            stats.extend(batch)
+            # Tilled area along the track while the implement is in the soil
+            _, fuel_lph = engine_torque_and_fuel(batch['throttle'], batch['engine_speed'])
+            coverage.add_batch(batch['time'], batch['latitude'], batch['longitude'], fuel_lph,
+                               batch['implement_depth'] > 0)
+        return batch
+
+    # One figure per producer, updated in place for each new sample
+    plot = LivePlot(PLOT_SERIES, xlabel="Time (s)")
+    # Rolling 1/5/15 minute slip statistics for the table
+    stats = StreamStats(('slip',))
+    coverage = FieldCoverage(IMPLEMENT_WIDTH)
+    producer = Producer(read, PRODUCER_CHANNELS, HISTORY_SAMPLES, period=1.0, page='gps',
+                        shared={'plot': plot, 'trail': trail, 'stats': stats, 'coverage': coverage},
+                        resources=(source,))
+    return producer.start()
+
+# Table of the latest sample with the rolling statistics and field coverage
+def table_html(producer, gear):
+    with producer.lock:
+        return generate_table_html(gear, producer.latest(), producer.shared['stats'].summary(),
+                                   producer.shared['coverage'].report())
+
+# Producer used when the page is not given one (e.g. run on its own)
+@st.cache_resource
+def default_producer():
+    return make_producer()
+
+# Plot of the retained history as PNG bytes
+# incremental_plot=False rebuilds the figure (and closes it) instead of
+# updating the producer's one
+def plot_png(producer, incremental_plot=True):
+    if not incremental_plot:
+        _, _, series = producer.snapshot()
+        with LivePlot(PLOT_SERIES, xlabel="Time (s)") as frame:
+            return figure_png(frame.update(series['time'], series))
+    # The shared plot is drawn under the lock, so it reads the history
+    # without copying it
+    with producer.lock:
+        _, _, series = producer.snapshot(copy=False)
+        return figure_png(producer.shared['plot'].update(series['time'], series))
+
+# Satellite map centred on the latest position with the trail, as HTML.
+# tiles is a tile URL template (a tilecache.TileServer's url) to draw the
+# map from instead of the online OpenStreetMap tiles.
+def map_html(producer, tiles=None):
+    # Imported here so the producer (shared with the Advisory page's anomaly
+    # checks) doesn't load folium
+    import folium
+    sample = producer.latest()
+    if tiles is None:
+        m = folium.Map(location=[sample['latitude'], sample['longitude']], zoom_start=15)
+    else:
+        from tilecache import ATTRIBUTION
+        m = folium.Map(location=[sample['latitude'], sample['longitude']], zoom_start=15, tiles=tiles,
+                       attr=ATTRIBUTION)
+    with producer.lock:
+        producer.shared['trail'].layer().add_to(m)
+    return folium.Figure().add_child(m).render()
+
 # Main function to display tractor parameters
-def display_parameters():
+# The page polls producer (default: default_producer()) every 3 seconds
+# from a fragment, so it never blocks the script and switching pages is
+# instant.  A sessionlog.SessionRecorder passed as recorder receives every
+# sample produced while the page is open, with the derived metrics for the
+# selected gear.  tiles is passed on to map_html().
+def display_parameters(incremental_plot=True, producer=None, recorder=None, tiles=None):
+    if producer is None:
+        producer = default_producer()
+
     st.markdown(
         """
         <style>
@@ -87,152 +272,48 @@ def display_parameters():
     st.markdown("<h1>Real-time Tractor Operating Parameters</h1>", unsafe_allow_html=True)
 
     # Dropdown for gear selection
-    gear_options = {"L1": 160, "L2": 120, "L3": 80, "L4": 40, "H1": 30}
     gear = st.selectbox('Select the operating gear:', list(gear_options.keys()))
     x = gear_options[gear]
 
-    # Initializing placeholders for output and map
-    output_placeholder = st.empty()
-    graph_placeholder = st.empty()
-    map_placeholder = st.empty()
-
-    current_lat = 22.31278
-    current_long = 87.33152
-    coordinates_list = []
-
-    # Variables to store time for graphing
-    time_stamps = []
-    engine_speed_values = []
-    throttle_values = []
-    implement_depth_values = []
-    forward_speed_values = []
-    slip_values = []
-
-    start_time = datetime.now()
-
-    while True:
-        current_time = (datetime.now() - start_time).total_seconds()
-
-        # Generate the parameters
-        engine_speed = generate_engine_speed()
-        throttle_setting = generate_throttle_setting()
-        implement_depth = generate_implement_depth()
-        actual_speed = generate_actual_forward_speed()
-        slip = calculate_slip()
-        # Calculate Vt and slip
-        #Vt = engine_speed / x
-        #slip = 100 * (1 - ((actual_speed)/(Vt*3.14*1.6*(60/1000))))
-        
-
-        # Append data to the lists
-        time_stamps.append(current_time)
-        engine_speed_values.append(engine_speed)
-        throttle_values.append(throttle_setting)
-        implement_depth_values.append(implement_depth)
-        forward_speed_values.append(actual_speed)
-        slip_values.append(slip)
-
-        # Update GPS coordinates
-        current_lat = generate_latitude(current_lat)
-        current_long = generate_longitude(current_long)
-        coordinates_list.append({
-            'latitude': current_lat,
-            'longitude': current_long,
-            'timestamp': datetime.now(),
-            'speed': actual_speed
-        })
-
-        # Remove coordinates older than 10 seconds
-        coordinates_list = [
-            coord for coord in coordinates_list
-            if coord['timestamp'] > datetime.now() - timedelta(seconds=10)
-        ]
+    # Derived metrics for the selected gear, added to the recorded samples;
+    # they use the measured slip recorded with them
+    def with_derived(rows):
+        derived = calculate_parameters_batch(
+            rows['throttle'], rows['engine_speed'], rows['forward_speed'], rows['implement_depth'], x,
+            slip=rows['slip'] if 'slip' in rows else None,
+        )
+        return Batch({**derived, **rows, 'gear_ratio': np.full(len(rows['time']), x)})
+
+    @st.fragment(run_every=3.0)  # Refresh rate of 3 seconds
+    def live():
+        sample = producer.latest()
+        if sample is None:
+            return
+
+        # Persist the samples received since the last run
+        if recorder is not None:
+            held, cursor = st.session_state.get('gps_cursor', (None, None))
+            cursor = pump(producer, recorder, cursor if held is recorder else None, with_derived)
+            st.session_state['gps_cursor'] = (recorder, cursor)
 
         # Create table with icons
-        table_content = f"""
-        <table>
-            <tr>
-            <td><b>Parameter</b></td>
-            <td><b>Value</b></td>
-            </tr>
-            <tr>
-                <td><img src="{icon_url['Gear Ratio']}" width="50"> Gear Ratio</td>
-                <td>{gear}</td>
-            </tr>
-            <tr>
-                <td><img src="{icon_url['Engine Speed']}" width="50"> Engine Speed (rpm)</td>
-                <td>{engine_speed}</td>
-            </tr>
-            <tr>
-                <td><img src="{icon_url['Throttle Setting']}" width="50"> Throttle Setting (%)</td>
-                <td>{throttle_setting}</td>
-            </tr>
-            <tr>
-                <td><img src="{icon_url['Implement Depth']}" width="50"> Implement Depth (cm)</td>
-                <td>{implement_depth}</td>
-            </tr>
-            <tr>
-                <td><img src="{icon_url['Actual Speed']}" width="50"> Actual Speed (km/h)</td>
-                <td>{actual_speed}</td>
-            </tr>
-            <tr>
-                <td><img src="{icon_url['Slip']}" width="50"> Slip (%)</td>
-                <td>{slip:.2f}</td>
-            </tr>
-            <tr>
-                <td><img src="{icon_url['Latitude']}" width="50"> Latitude (N)</td>
-                <td>{current_lat}</td>
-            </tr>
-            <tr>
-                <td><img src="{icon_url['Longitude']}" width="50"> Longitude (E)</td>
-                <td>{current_long}</td>
-            </tr>
-        </table>
-        """
-        output_placeholder.markdown(table_content, unsafe_allow_html=True)
-
-        # Plot the real-time data on the right with dots and shaded areas
-        fig, ax = plt.subplots(5, 1, figsize=(10, 15), sharex=True)
-
-        ax[0].plot(time_stamps, engine_speed_values, label="Engine Speed (rpm)", color='blue', marker='o')
-        ax[0].fill_between(time_stamps, engine_speed_values, color='blue', alpha=0.2)
-
-        ax[1].plot(time_stamps, throttle_values, label="Throttle Setting (%)", color='green', marker='o')
-        ax[1].fill_between(time_stamps, throttle_values, color='green', alpha=0.2)
-
-        ax[2].plot(time_stamps, implement_depth_values, label="Implement Depth (cm)", color='purple', marker='o')
-        ax[2].fill_between(time_stamps, implement_depth_values, color='purple', alpha=0.2)
-
-        ax[3].plot(time_stamps, forward_speed_values, label="Actual Speed (km/h)", color='orange', marker='o')
-        ax[3].fill_between(time_stamps, forward_speed_values, color='orange', alpha=0.2)
-
-        ax[4].plot(time_stamps, slip_values, label="Slip (%)", color='red', marker='o')
-        ax[4].fill_between(time_stamps, slip_values, color='red', alpha=0.2)
-
-        for i, axis in enumerate(ax):
-            axis.legend(loc="upper right")
-            axis.grid(True)
-
-        ax[-1].set_xlabel("Time (s)")
+        with perf.phase('gps', 'render_html'):
+            table_content = producer.memo(('table', gear), lambda: table_html(producer, gear))
+            st.markdown(table_content, unsafe_allow_html=True)
 
-        # Display plot
-        graph_placeholder.pyplot(fig)
+        # Plot the real-time data with dots and shaded areas
+        with perf.phase('gps', 'render_plot'):
+            png = producer.memo(('plot', incremental_plot), lambda: plot_png(producer, incremental_plot))
+            st.image(png, use_column_width=True)
 
-        # Create and display satellite map below plot
-        m = folium.Map(location=[current_lat, current_long], zoom_start=15)
-        for coord in coordinates_list:
-            folium.Marker(
-                location=[coord['latitude'], coord['longitude']],
-                popup=f"Lat: {coord['latitude']}, Long: {coord['longitude']}, Speed: {coord['speed']} km/h"
-            ).add_to(m)
-        # Display map below the real-time graph
-        with map_placeholder:
-            folium_static(m, width=1000, height=500)
+        # Display satellite map below the real-time graph
+        with perf.phase('gps', 'render_map'):
+            components.html(producer.memo(('map', tiles), lambda: map_html(producer, tiles)), width=1000, height=510)
 
-        time.sleep(3)  # Refresh rate of 3 seconds
+    live()
 
-def show_gps_page():
-    display_parameters()
+def show_gps_page(producer=None, recorder=None, tiles=None):
+    display_parameters(producer=producer, recorder=recorder, tiles=tiles)
 
 # Call the GPS page to run the app
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+# gpstrail.py
+import math
+import numpy as np
+import folium
+
+from samples import ColumnQueue
+
+# Metres per degree of latitude; longitude degrees shrink with cos(latitude)
+METRES_PER_DEGREE = 111_320.0
+
+# Ramer-Douglas-Peucker simplification of an (n, 2) lat/long array.
+# Distances are measured in metres on a local equirectangular projection,
+# which is accurate to well under a percent over a field.  Returns the
+# indices of the points to keep, first and last always included.
+def simplify(points, tolerance_m):
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return np.arange(n)
+
+    scale = np.array([METRES_PER_DEGREE, METRES_PER_DEGREE * math.cos(math.radians(points[:, 0].mean()))])
+    xy = points * scale
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = xy[first], xy[last]
+        segment = end - start
+        length = math.hypot(*segment)
+        inner = xy[first + 1:last] - start
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(inner[:, 0] * segment[1] - inner[:, 1] * segment[0]) / length
+        i = int(np.argmax(distances))
+        if distances[i] > tolerance_m:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+# Time-indexed GPS trail for the map.
+#
+# Two views of the same stream are kept:
+#   recent - raw points from the last recent_seconds, as time, latitude,
+#            longitude and speed columns of a samples.ColumnQueue, so a
+#            point costs four float64 values and expiry is one search on
+#            the time column;
+#   track  - the whole field path, simplified chunk by chunk with
+#            Douglas-Peucker at tolerance_m.  If the simplified track still
+#            exceeds max_track_points, it is re-simplified at twice the
+#            tolerance, so the map HTML stays bounded for a full shift.
+class GpsTrail:
+    def __init__(self, recent_seconds=10, tolerance_m=1.0, chunk_points=256, max_track_points=2000):
+        self.recent_seconds = recent_seconds
+        self.tolerance_m = tolerance_m
+        self.chunk_points = chunk_points
+        self.max_track_points = max_track_points
+        self.recent = ColumnQueue(('time', 'latitude', 'longitude', 'speed'))
+        self._track = []                                       # simplified (latitude, longitude)
+        self._pending = ColumnQueue(('latitude', 'longitude'))  # raw points not yet simplified
+        self.points_added = 0
+
+    def __len__(self):
+        return len(self.recent)
+
+    def add(self, timestamp, latitude, longitude, speed):
+        self.add_batch((timestamp,), (latitude,), (longitude,), (speed,))
+
+    def add_batch(self, timestamps, latitudes, longitudes, speeds):
+        points = np.array((timestamps, latitudes, longitudes, speeds), dtype=np.float64)
+        n = points.shape[1]
+        if not n:
+            return
+        self.recent.extend(points)
+        self.points_added += n
+        # Pending points are simplified a chunk at a time
+        done = 0
+        while done < n:
+            take = min(n - done, max(self.chunk_points - len(self._pending), 1))
+            self._pending.extend(points[1:3, done:done + take])
+            done += take
+            if len(self._pending) >= self.chunk_points:
+                self._commit()
+        self.prune(points[0, -1])
+
+    # Drop recent points older than recent_seconds before now
+    def prune(self, now):
+        times = self.recent.column('time')
+        self.recent.popleft(int(np.searchsorted(times, now - self.recent_seconds, side='right')))
+
+    def _commit(self):
+        pending = self._pending.block().T
+        kept = pending[simplify(pending, self.tolerance_m)]
+        # The last point stays pending so consecutive chunks join up
+        if self._track:
+            kept = kept[1:]
+        self._track.extend(map(tuple, kept.tolist()))
+        self._pending.popleft(len(self._pending) - 1)
+
+        while len(self._track) > self.max_track_points:
+            self.tolerance_m *= 2
+            track = np.asarray(self._track)
+            self._track = list(map(tuple, track[simplify(track, self.tolerance_m)].tolist()))
+
+    # Whole simplified path as [(latitude, longitude), ...]
+    def track(self):
+        pending = list(map(tuple, self._pending.block().T.tolist()))
+        if not self._track:
+            return pending
+        return self._track + pending[1:]
+
+    # Map layer: the field track, the recent trail and the current position
+    def layer(self, name="GPS trail"):
+        group = folium.FeatureGroup(name=name)
+        track = self.track()
+        if len(track) > 1:
+            folium.PolyLine(track, color='blue', weight=3, opacity=0.6).add_to(group)
+        recent = self.recent.block()[1:3].T.tolist()
+        if len(recent) > 1:
+            folium.PolyLine(recent, color='red', weight=5).add_to(group)
+        if len(self.recent):
+            _, lat, lon, speed = self.recent.block()[:, -1].tolist()
+            folium.Marker(
+                location=[lat, lon],
+                popup=f"Lat: {lat}, Long: {lon}, Speed: {speed} km/h"
+            ).add_to(group)
+        return group
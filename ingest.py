@@ -0,0 +1,428 @@
+# ingest.py
+import argparse
+import asyncio
+import threading
+import time
+import numpy as np
+
+from anomaly import AnomalyDetector, UNCHECKED_CHANNELS
+from samples import Batch, ColumnQueue, record_type
+from speednslip import calculate_parameters_batch, gear_ratios
+from telemetry import TelemetrySource
+
+# Fleet telemetry ingestion.
+#
+# Tractors send fixed-size little-endian binary frames (FRAME_DTYPE) over
+# UDP (any number of whole frames per datagram) or TCP (a plain stream of
+# frames).  Received bytes go onto a bounded queue; one worker drains
+# everything queued, decodes it in a single np.frombuffer call, runs the
+# speednslip equations on the whole batch and folds the result into
+# FleetState, which the pages read by tractor ID.
+#
+# Backpressure: when the queue is full, UDP datagrams are dropped and counted
+# and TCP connections stop being read (the sender then blocks on its socket
+# buffer) until the worker catches up.
+
+FRAME_DTYPE = np.dtype([
+    ('tractor_id', '<u4'),
+    ('time', '<f8'),
+    ('throttle', '<f4'),
+    ('engine_speed', '<f4'),
+    ('forward_speed', '<f4'),
+    ('implement_depth', '<f4'),
+    ('gear_ratio', '<u2'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+STATE_CHANNELS = (
+    'time', 'throttle', 'engine_speed', 'forward_speed', 'implement_depth', 'gear_ratio',
+    'latitude', 'longitude', 'slip',
+    'engine_torque', 'fuel_consumption', 'engine_power', 'specific_fuel_consumption',
+    'fuel_consumption_area', 'implement_draft', 'drawbar_power', 'tractive_efficiency',
+)
+
+# State channels checked for anomalies (not the clock, gear or position,
+# nor anomaly.UNCHECKED_CHANNELS)
+ANOMALY_CHANNELS = tuple(name for name in STATE_CHANNELS
+                         if name not in ('time', 'gear_ratio', 'latitude', 'longitude') + UNCHECKED_CHANNELS)
+_ANOMALY_COLUMNS = [STATE_CHANNELS.index(name) for name in ANOMALY_CHANNELS]
+
+# Latest state of one tractor: its state channels, frame count and the
+# monotonic time of its last update
+TractorState = record_type(STATE_CHANNELS + ('frames', 'updated'), 'TractorState')
+
+def encode_frames(columns):
+    frames = np.zeros(len(columns['tractor_id']), dtype=FRAME_DTYPE)
+    for name in FRAME_DTYPE.names:
+        frames[name] = columns[name]
+    return frames.tobytes()
+
+def decode_frames(data):
+    return np.frombuffer(data, dtype=FRAME_DTYPE)
+
+# Latest derived state of every tractor, one row per tractor in a
+# preallocated array that grows by doubling.  Updates come from the ingest
+# worker thread and reads from the pages, hence the lock.
+#
+# Each update also runs the new rows of every tractor through one
+# AnomalyDetector (one stream per slot) over ANOMALY_CHANNELS; only the
+# newest frame of a tractor in each batch is scored, like it is stored.
+#
+# Tractors being watched (watch(), called by FleetSource) also keep their
+# last retain frames in a ColumnQueue, so a reader polling slower than the
+# tractor sends gets every frame through since() and not only the newest.
+class FleetState:
+    def __init__(self, capacity=1024, retain=3000):
+        self._lock = threading.Lock()
+        self.retain = retain
+        self._history = {}   # watched tractor ID -> ColumnQueue of its frames
+        self._slots = {}
+        self._ids = np.zeros(capacity, dtype=np.uint32)
+        self._values = np.full((capacity, len(STATE_CHANNELS)), np.nan)
+        self._frames = np.zeros(capacity, dtype=np.int64)
+        self._updated = np.zeros(capacity)  # monotonic clock of the last update
+        self.anomalies = AnomalyDetector(ANOMALY_CHANNELS, streams=capacity)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def tractor_ids(self):
+        with self._lock:
+            return sorted(self._slots)
+
+    def _slot_indices(self, tractor_ids):
+        slots = np.empty(len(tractor_ids), dtype=np.intp)
+        for k, tractor_id in enumerate(tractor_ids.tolist()):
+            slot = self._slots.get(tractor_id)
+            if slot is None:
+                slot = len(self._slots)
+                if slot == len(self._ids):
+                    self._grow()
+                self._slots[tractor_id] = slot
+                self._ids[slot] = tractor_id
+            slots[k] = slot
+        return slots
+
+    def _grow(self):
+        capacity = 2 * len(self._ids)
+        self._ids = np.resize(self._ids, capacity)
+        values = np.full((capacity, len(STATE_CHANNELS)), np.nan)
+        values[:len(self._values)] = self._values
+        self._values = values
+        self._frames = np.concatenate((self._frames, np.zeros(capacity - len(self._frames), dtype=np.int64)))
+        self._updated = np.concatenate((self._updated, np.zeros(capacity - len(self._updated))))
+
+    # Fold a decoded batch (frames and its calculate_parameters_batch results)
+    # into the state; the newest frame of each tractor wins
+    def update(self, frames, results):
+        ids = frames['tractor_id']
+        # Index of the last frame of every tractor present in the batch
+        unique_ids, reversed_first, counts = np.unique(ids[::-1], return_index=True, return_counts=True)
+        last = len(ids) - 1 - reversed_first
+        rows = np.empty((len(last), len(STATE_CHANNELS)))
+        for c, name in enumerate(STATE_CHANNELS):
+            column = results[name] if name in results else frames[name]
+            rows[:, c] = column[last]
+
+        now = time.monotonic()
+        with self._lock:
+            slots = self._slot_indices(unique_ids)
+            self._values[slots] = rows
+            self._frames[slots] += counts
+            self._updated[slots] = now
+            self.anomalies.update(rows[:, _ANOMALY_COLUMNS], now, slots)
+            if self._history:
+                self._append_history(ids, frames, results)
+
+    # Every frame of the watched tractors in the batch, in arrival order
+    def _append_history(self, ids, frames, results):
+        for tractor_id, queue in self._history.items():
+            mask = ids == tractor_id
+            if not mask.any():
+                continue
+            queue.extend(np.array([(results[name] if name in results else frames[name])[mask]
+                                   for name in STATE_CHANNELS], dtype=np.float64))
+            if len(queue) > self.retain:
+                queue.popleft(len(queue) - self.retain)
+
+    # Keep the frames of tractor_id from now on, for since()
+    def watch(self, tractor_id):
+        with self._lock:
+            if tractor_id not in self._history:
+                self._history[tractor_id] = ColumnQueue(STATE_CHANNELS, capacity=256)
+
+    # Frames of tractor_id after its frame number frames (as far as they are
+    # retained), as a (STATE_CHANNELS x n) block, and its frame count.  A
+    # tractor that is not watched, or sent its frames before it was, yields
+    # its latest state.
+    def since(self, tractor_id, frames):
+        with self._lock:
+            slot = self._slots.get(tractor_id)
+            if slot is None:
+                return np.empty((len(STATE_CHANNELS), 0)), frames
+            total = int(self._frames[slot])
+            queue = self._history.get(tractor_id)
+            k = min(total - frames, len(queue) if queue is not None else 0)
+            if k > 0:
+                block = queue.block()[:, -k:].copy()
+            elif total > frames:
+                block = self._values[slot][:, None].copy()
+            else:
+                block = np.empty((len(STATE_CHANNELS), 0))
+        return block, total
+
+    # Anomaly alerts of all tractors that fired at or after since (on the
+    # monotonic clock, like the update times), newest first; see
+    # AnomalyDetector.alerts
+    def alerts(self, since=-np.inf, limit=None):
+        with self._lock:
+            alerts = self.anomalies.alerts(since, limit=limit)
+            for alert in alerts:
+                alert['tractor_id'] = int(self._ids[alert.pop('stream')])
+        return alerts
+
+    # Latest state of one tractor as a TractorState, or None if it has not
+    # reported
+    def get(self, tractor_id):
+        with self._lock:
+            slot = self._slots.get(tractor_id)
+            if slot is None:
+                return None
+            row = self._values[slot].tolist()
+            frames = int(self._frames[slot])
+            updated = float(self._updated[slot])
+        return TractorState(*row, frames, updated)
+
+class IngestStats:
+    def __init__(self):
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.malformed_bytes = 0
+        self.batches = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        server = self.server
+        usable = len(data) - len(data) % FRAME_SIZE
+        server.stats.malformed_bytes += len(data) - usable
+        if not usable:
+            return
+        frames = usable // FRAME_SIZE
+        server.stats.frames_received += frames
+        try:
+            server.queue.put_nowait(data[:usable])
+        except asyncio.QueueFull:
+            server.stats.frames_dropped += frames
+
+class IngestServer:
+    def __init__(self, host='127.0.0.1', udp_port=9870, tcp_port=9871, queue_size=4096, state=None):
+        self.host = host
+        self.udp_port = udp_port
+        self.tcp_port = tcp_port
+        self.queue_size = queue_size
+        self.state = state if state is not None else FleetState()
+        self.stats = IngestStats()
+        self.queue = None
+        self._transport = None
+        self._tcp_server = None
+        self._worker = None
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        loop = asyncio.get_running_loop()
+        if self.udp_port is not None:
+            self._transport, _ = await loop.create_datagram_endpoint(
+                lambda: _UdpProtocol(self), local_addr=(self.host, self.udp_port)
+            )
+            self.udp_port = self._transport.get_extra_info('sockname')[1]
+        if self.tcp_port is not None:
+            self._tcp_server = await asyncio.start_server(self._handle_tcp, self.host, self.tcp_port)
+            self.tcp_port = self._tcp_server.sockets[0].getsockname()[1]
+        self._worker = asyncio.create_task(self._process())
+
+    async def close(self):
+        if self._transport is not None:
+            self._transport.close()
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            await self._tcp_server.wait_closed()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def _handle_tcp(self, reader, writer):
+        pending = b''
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                data = pending + chunk
+                usable = len(data) - len(data) % FRAME_SIZE
+                pending = data[usable:]
+                if usable:
+                    self.stats.frames_received += usable // FRAME_SIZE
+                    # Blocks while the queue is full, which stops reading
+                    # from this connection
+                    await self.queue.put(data[:usable])
+        finally:
+            self.stats.malformed_bytes += len(pending)
+            writer.close()
+
+    async def _process(self):
+        queue = self.queue
+        while True:
+            chunks = [await queue.get()]
+            while not queue.empty():
+                chunks.append(queue.get_nowait())
+            frames = decode_frames(b''.join(chunks))
+            results = calculate_parameters_batch(
+                frames['throttle'], frames['engine_speed'], frames['forward_speed'],
+                frames['implement_depth'], frames['gear_ratio'],
+            )
+            self.state.update(frames, results)
+            self.stats.frames_processed += len(frames)
+            self.stats.batches += 1
+            # Let the transports run between batches
+            await asyncio.sleep(0)
+
+# Runs an IngestServer on its own event loop in a daemon thread so the
+# Streamlit script thread can read server.state while frames arrive.  An
+# error starting the server (e.g. a port already in use) is raised here.
+def start_in_thread(**kwargs):
+    server = IngestServer(**kwargs)
+    started = threading.Event()
+    failure = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(server.start())
+        except BaseException as error:
+            failure.append(error)
+            loop.run_until_complete(server.close())
+            loop.close()
+            started.set()
+            return
+        server.loop = loop
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name='ingest-server', daemon=True).start()
+    started.wait()
+    if failure:
+        raise failure[0]
+    return server
+
+# Telemetry source reading one tractor from a FleetState; each read returns
+# the tractor's frames received since the previous read
+class FleetSource(TelemetrySource):
+    channels = STATE_CHANNELS
+
+    def __init__(self, state, tractor_id):
+        self.state = state
+        self.tractor_id = tractor_id
+        self._last_frames = 0
+        state.watch(tractor_id)
+
+    def read(self):
+        block, self._last_frames = self.state.since(self.tractor_id, self._last_frames)
+        return Batch.from_block(self.channels, block)
+
+# Local stand-in for the tractors' IoT devices: every tick sends one frame
+# per tractor with values in the ranges the page simulators use
+async def simulate_fleet(host='127.0.0.1', port=9870, tractors=500, rate_hz=10, duration=10.0,
+                         protocol='udp', seed=0):
+    rng = np.random.default_rng(seed)
+    loop = asyncio.get_running_loop()
+    ids = np.arange(1, tractors + 1, dtype=np.uint32)
+    latitude = 22.31278 + rng.uniform(-0.01, 0.01, tractors)
+    longitude = 87.33152 + rng.uniform(-0.01, 0.01, tractors)
+    gears = rng.choice(gear_ratios, tractors)
+    # Whole frames per datagram, under a typical 1500 byte MTU
+    per_datagram = max(1, 1400 // FRAME_SIZE)
+
+    if protocol == 'udp':
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+    else:
+        _, writer = await asyncio.open_connection(host, port)
+
+    start = loop.time()
+    ticks = int(duration * rate_hz)
+    sent = 0
+    for tick in range(ticks):
+        latitude += rng.uniform(-0.0001, 0.0001, tractors)
+        longitude += rng.uniform(-0.0001, 0.0001, tractors)
+        data = encode_frames({
+            'tractor_id': ids,
+            'time': np.full(tractors, tick / rate_hz),
+            'throttle': rng.integers(45, 86, tractors),
+            'engine_speed': rng.integers(1200, 1801, tractors),
+            'forward_speed': rng.uniform(0.8, 4.5, tractors).round(2),
+            'implement_depth': rng.uniform(5, 45, tractors).round(2),
+            'gear_ratio': gears,
+            'latitude': latitude,
+            'longitude': longitude,
+        })
+        if protocol == 'udp':
+            step = per_datagram * FRAME_SIZE
+            for offset in range(0, len(data), step):
+                transport.sendto(data[offset:offset + step])
+        else:
+            writer.write(data)
+            await writer.drain()
+        sent += tractors
+        await asyncio.sleep(max(0.0, start + (tick + 1) / rate_hz - loop.time()))
+
+    if protocol == 'udp':
+        transport.close()
+    else:
+        writer.close()
+        await writer.wait_closed()
+    return sent
+
+async def _serve(args):
+    server = IngestServer(args.host, args.udp_port, args.tcp_port)
+    await server.start()
+    print(f"listening on udp {server.udp_port}, tcp {server.tcp_port}")
+    try:
+        while True:
+            await asyncio.sleep(5)
+            print(server.stats.as_dict(), f"tractors={len(server.state)}")
+    finally:
+        await server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fleet telemetry ingestion server and simulator client")
+    parser.add_argument('mode', choices=('serve', 'simulate'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--udp-port', type=int, default=9870)
+    parser.add_argument('--tcp-port', type=int, default=9871)
+    parser.add_argument('--protocol', choices=('udp', 'tcp'), default='udp')
+    parser.add_argument('--tractors', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=10)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    if args.mode == 'serve':
+        asyncio.run(_serve(args))
+    else:
+        port = args.udp_port if args.protocol == 'udp' else args.tcp_port
+        sent = asyncio.run(simulate_fleet(args.host, port, args.tractors, args.rate, args.duration, args.protocol))
+        print(f"sent {sent} frames")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# liveplot.py
+import io
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+# Stacked real-time line plots that are built once and updated in place.
+#
+# The pages used to call plt.subplots on every tick, replot the whole
+# history and never close the figure.  A LivePlot owns one figure for the
+# lifetime of a page session: update() swaps the line data and the shaded
+# area under it, then rescales the axes.  Call close() (or use it as a
+# context manager) when the session ends so pyplot releases the figure.
+#
+# series is a sequence of (key, label, color) tuples, one axis per entry.
+# Histories longer than max_points are reduced to a min/max envelope before
+# drawing so the render cost stays flat however long the history grows.
+class LivePlot:
+    def __init__(self, series, xlabel="Time", figsize=(10, 15), max_markers=200, max_points=2000):
+        self.series = tuple(series)
+        self.max_markers = max_markers
+        self.max_points = max_points
+        self.fig, axes = plt.subplots(len(self.series), 1, figsize=figsize, sharex=True)
+        self.axes = np.atleast_1d(axes)
+        self.lines = []
+        self.fills = []
+
+        for axis, (key, label, color) in zip(self.axes, self.series):
+            line, = axis.plot([], [], label=label, color=color, marker='o')
+            fill = axis.fill_between([0.0], [0.0], color=color, alpha=0.2)
+            self.lines.append(line)
+            self.fills.append(fill)
+            axis.legend(loc="upper right")
+            axis.grid(True)
+
+        self.axes[-1].set_xlabel(xlabel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Replace the plotted data; columns maps each series key to a y array
+    def update(self, x, columns):
+        x = np.asarray(x, dtype=np.float64)
+        n = len(x)
+        buckets = None
+        if self.max_points and n > self.max_points:
+            buckets = self.max_points // 2
+            x, n = _envelope_x(x, buckets), 2 * buckets
+        # Thin the markers on long histories, drawing thousands of dots is
+        # what dominates the render time
+        markevery = max(1, n // self.max_markers) if self.max_markers else 1
+
+        for axis, line, fill, (key, _, _) in zip(self.axes, self.lines, self.fills, self.series):
+            y = np.asarray(columns[key], dtype=np.float64)
+            if buckets is not None:
+                y = _envelope_y(y, buckets)
+            line.set_data(x, y)
+            line.set_markevery(markevery)
+            fill.set_verts([_fill_vertices(x, y)] if n else [])
+
+            axis.relim()
+            if n:
+                # Keep the zero baseline of the shaded area in view, as
+                # fill_between does
+                axis.update_datalim([(x[0], 0.0)])
+            axis.autoscale_view()
+
+        return self.fig
+
+    def close(self):
+        if self.fig is not None:
+            plt.close(self.fig)
+            self.fig = None
+
+# Polygon between y and zero, same outline fill_between(x, y) produces
+def _fill_vertices(x, y):
+    n = len(x)
+    verts = np.empty((2 * n + 2, 2))
+    verts[0] = (x[0], 0.0)
+    verts[1:n + 1, 0] = x
+    verts[1:n + 1, 1] = y
+    verts[n + 1] = (x[-1], 0.0)
+    verts[n + 2:, 0] = x[::-1]
+    verts[n + 2:, 1] = 0.0
+    return verts
+
+# Min/max decimation: every bucket contributes its minimum and maximum, so
+# spikes survive while the number of drawn points stays at 2 * buckets
+def _bucket_edges(n, buckets):
+    return np.linspace(0, n, buckets + 1).astype(np.intp)
+
+def _envelope_x(x, buckets):
+    edges = _bucket_edges(len(x), buckets)
+    return np.repeat(x[edges[:-1]], 2)
+
+def _envelope_y(y, buckets):
+    edges = _bucket_edges(len(y), buckets)[:-1]
+    out = np.empty(2 * buckets)
+    out[0::2] = np.minimum.reduceat(y, edges)
+    out[1::2] = np.maximum.reduceat(y, edges)
+    return out
+
+# PNG bytes of a figure, so one rendering can be shown to any number of
+# sessions with st.image.  st.pyplot renders at 200 dpi; the 10 x 15 inch
+# dashboard figure is already 1000 px wide at 100 dpi, a quarter of the
+# pixels to rasterize and encode.
+def figure_png(fig, dpi=100):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
@@ -0,0 +1,220 @@
+# metricgraph.py
+import numpy as np
+
+from samples import Batch, record_type
+from speednslip import (calculate_slip, torque_and_fuel_zr, _round2, RESULT_FIELDS, IMPLEMENT_WIDTH,
+                        SOIL_FACTOR)
+
+# Incremental recomputation of derived metrics.
+#
+# A MetricGraph holds named inputs and nodes; each node declares the names
+# (inputs or other nodes) it is computed from.  update() takes new input
+# values, compares each with the cached one and recomputes, in dependency
+# order, only the nodes downstream of an input that actually changed; every
+# other node keeps its cached value and is counted as skipped.  Only the
+# nodes needed for the graph's outputs are ever evaluated.
+#
+# Values are Python floats or float64 arrays, so the same graph serves one
+# sample at a time and whole batches.  Arrays are compared element by
+# element (NaN equal to NaN), which costs one pass over the input against
+# the several passes the nodes behind it would take.  Array inputs are
+# copied when stored, so callers may reuse their buffers.
+#
+# performance_graph() is the speednslip model split into nodes: throttle
+# and engine speed feed z, r, torque and fuel, power and the per-power
+# metrics; forward speed and depth feed draft and drawbar power.  A new GPS
+# speed alone therefore leaves z, r, torque, fuel and power untouched, and
+# comparing gears on the same operating points recomputes only slip and
+# tractive efficiency.
+
+class MetricGraph:
+    # inputs maps input name -> default (None: must be given to the first
+    # update); nodes maps node name -> (function, argument names); outputs
+    # (nodes or inputs) defaults to every node
+    def __init__(self, inputs, nodes, outputs=None):
+        self.defaults = dict(inputs)
+        self.nodes = dict(nodes)
+        for name, (_, arguments) in self.nodes.items():
+            unknown = [a for a in arguments if a not in self.defaults and a not in self.nodes]
+            if unknown:
+                raise ValueError(f"node {name!r} depends on unknown names {unknown}")
+        self.outputs = tuple(outputs) if outputs is not None else tuple(self.nodes)
+        self.order = self._order(self.outputs)
+        self._values = {}
+        self._plans = {}         # changed inputs -> nodes to recompute, in order
+        self.evaluated = 0       # nodes computed by the last update
+        self.skipped = 0         # nodes reused by the last update
+        self.total_evaluated = 0
+        self.total_skipped = 0
+
+    # Nodes needed for names, each after the nodes it depends on
+    def _order(self, names):
+        order, state = [], {}
+
+        def visit(name, path):
+            if name in self.defaults or state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f"dependency cycle through {' -> '.join(path + (name,))}")
+            state[name] = 'visiting'
+            for argument in self.nodes[name][1]:
+                visit(argument, path + (name,))
+            state[name] = 'done'
+            order.append(name)
+
+        for name in names:
+            if name not in self.defaults and name not in self.nodes:
+                raise ValueError(f"unknown output {name!r}")
+            visit(name, ())
+        return tuple(order)
+
+    # Nodes of the graph's order downstream of the changed names
+    def _plan(self, changed):
+        plan = self._plans.get(changed)
+        if plan is None:
+            dirty = set(changed)
+            plan = []
+            for name in self.order:
+                if not dirty.isdisjoint(self.nodes[name][1]):
+                    dirty.add(name)
+                    plan.append(name)
+            plan = self._plans[changed] = tuple(plan)
+        return plan
+
+    # Set inputs and recompute what depends on the changed ones.  Returns
+    # the number of nodes skipped.
+    def update(self, **inputs):
+        values = self._values
+        changed = []
+        for name, value in inputs.items():
+            if name not in self.defaults:
+                raise ValueError(f"unknown input {name!r}")
+            value = _value(value)
+            if not _same(values.get(name), value):
+                values[name] = value if isinstance(value, float) else value.copy()
+                changed.append(name)
+        if len(values) < len(self.defaults):
+            for name, default in self.defaults.items():
+                if name not in values:
+                    if default is None:
+                        raise ValueError(f"input {name!r} has no value")
+                    values[name] = np.array(default, dtype=np.float64) if np.ndim(default) else float(default)
+                    changed.append(name)
+
+        plan = self._plan(frozenset(changed))
+        if any(isinstance(values[name], np.ndarray) for name in self.defaults):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._evaluate(plan)
+        else:
+            self._evaluate(plan)
+        self.evaluated = len(plan)
+        self.skipped = len(self.order) - len(plan)
+        self.total_evaluated += self.evaluated
+        self.total_skipped += self.skipped
+        return self.skipped
+
+    def _evaluate(self, plan):
+        values = self._values
+        for name in plan:
+            function, arguments = self.nodes[name]
+            values[name] = function(*[values[argument] for argument in arguments])
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    # The given outputs (default: all) broadcast together, as a Batch for
+    # array inputs and as a record of floats for a single sample
+    def results(self, names=None):
+        names = tuple(names) if names is not None else self.outputs
+        values = [self._values[name] for name in names]
+        if all(isinstance(value, float) for value in values):
+            return record_type(names, 'Metrics')(*map(float, values))
+        return Batch(zip(names, np.broadcast_arrays(*values)))
+
+def _value(value):
+    if np.ndim(value) == 0:
+        return float(value)
+    return np.asarray(value, dtype=np.float64)
+
+# 0-d arrays (from models that always return arrays) as floats
+def _scalar(value):
+    return float(value) if np.ndim(value) == 0 else value
+
+def _same(old, new):
+    if old is None or type(old) is not type(new):
+        return False
+    if isinstance(new, float):
+        return old == new or (old != old and new != new)
+    if old.shape != new.shape:
+        return False
+    differ = old != new
+    if not differ.any():
+        return True
+    # Equal only if every difference is NaN against NaN; the first one
+    # usually settles it
+    first = differ.argmax()
+    if not (np.isnan(old.flat[first]) and np.isnan(new.flat[first])):
+        return False
+    return bool(np.isnan(old[differ]).all() and np.isnan(new[differ]).all())
+
+# numerator / denominator where guard holds, 0 elsewhere, for the zero
+# guards of the performance model
+def _guarded(guard, numerator, denominator):
+    if np.ndim(guard) == 0:
+        return numerator / denominator if guard else 0.0
+    return np.where(guard, numerator / denominator, 0.0)
+
+# Slip (%) from the gear ratio, rounded as the scalar and batch paths do
+def _slip(engine_speed, forward_speed, gear_ratio):
+    if isinstance(engine_speed, float) and isinstance(forward_speed, float) and isinstance(gear_ratio, float):
+        return calculate_slip(engine_speed, forward_speed, gear_ratio)
+    return _round2(np.asarray(100 * (1 - forward_speed / (engine_speed / gear_ratio)), dtype=np.float64))
+
+# The speednslip performance model as a graph, with the equations of
+# calculate_parameters_batch.  outputs defaults to the fields it returns.
+# A surrogate.Surrogate replaces the torque, fuel and draft nodes, as it
+# does in calculate_parameters_batch; those predictions are the expensive
+# nodes then, and the ones worth skipping.  measured_slip=True makes slip
+# an input, like calculate_parameters_batch(slip=...), instead of a node
+# computed from the gear ratio.
+def performance_graph(outputs=RESULT_FIELDS, width=IMPLEMENT_WIDTH, soil_factor=SOIL_FACTOR, surrogate=None,
+                      measured_slip=False):
+    inputs = {
+        'throttle': None, 'engine_speed': None, 'forward_speed': None, 'implement_depth': None,
+        'gear_ratio': None, 'width': width, 'soil_factor': soil_factor,
+    }
+    nodes = {
+        'z': (lambda throttle: 24.49 * throttle + 42.483, ('throttle',)),
+        'r': (lambda z, engine_speed: z - engine_speed, ('z', 'engine_speed')),
+        'torque_and_fuel': (torque_and_fuel_zr, ('z', 'r')),
+        'engine_torque': (lambda tf: tf[0], ('torque_and_fuel',)),
+        'fuel_consumption': (lambda tf: tf[1], ('torque_and_fuel',)),
+        'engine_power': (lambda engine_speed, ent: (2 * 3.14 * engine_speed * ent) / (60 * 746),
+                         ('engine_speed', 'engine_torque')),
+        'specific_fuel_consumption': (lambda fcp, enp: _guarded(enp != 0, fcp * 840, enp),
+                                      ('fuel_consumption', 'engine_power')),
+        'fuel_consumption_area': (
+            lambda fcp, forward_speed, width: _guarded(forward_speed != 0, fcp * 10, width * forward_speed),
+            ('fuel_consumption', 'forward_speed', 'width')),
+        'implement_draft': (
+            lambda forward_speed, depth, width, soil_factor:
+                soil_factor * (652 + 5.1 * forward_speed ** 2) * width * depth / 1000,
+            ('forward_speed', 'implement_depth', 'width', 'soil_factor')),
+        'drawbar_power': (lambda draft, forward_speed: 0.3723 * (draft * forward_speed),
+                          ('implement_draft', 'forward_speed')),
+        'slip': (_slip, ('engine_speed', 'forward_speed', 'gear_ratio')),
+        'tractive_efficiency': (
+            lambda dbp, slip, enp: _guarded(enp != 0, dbp * (100 - slip), 0.9 * enp),
+            ('drawbar_power', 'slip', 'engine_power')),
+    }
+    if surrogate is not None:
+        nodes['torque_and_fuel'] = (
+            lambda throttle, engine_speed: tuple(map(_scalar, surrogate.lookup_batch(throttle, engine_speed))),
+            ('throttle', 'engine_speed'))
+        nodes['implement_draft'] = (
+            lambda forward_speed, depth: _scalar(surrogate.draft_batch(forward_speed, depth)),
+            ('forward_speed', 'implement_depth'))
+    if measured_slip:
+        del nodes['slip']
+        inputs['slip'] = None
+    return MetricGraph(inputs, nodes, outputs)
@@ -0,0 +1,166 @@
+# perf.py
+import json
+import threading
+import time
+from bisect import bisect_left
+
+# Hot-path phase timers for the dashboard loops.
+#
+#     with perf.phase('gps', 'render_map'):
+#         ...
+#
+# Every (page, phase) pair owns a fixed-size latency histogram with
+# log-spaced buckets (8 per decade, 1 us to 100 s), so recording a sample is
+# two perf_counter() calls, a bisect and a few additions, and memory does not
+# grow with uptime.  snapshot() estimates percentiles from the buckets;
+# dump()/to_json() give a machine-readable copy and panel_html() the
+# optional sidebar table.  count() keeps plain event counters such as missed
+# deadlines next to the timings.
+
+BUCKETS_PER_DECADE = 8
+BUCKET_BOUNDS = [10 ** (k / BUCKETS_PER_DECADE - 6) for k in range(8 * BUCKETS_PER_DECADE + 1)]  # seconds
+
+# Phase recorded while a producer thread's TickScheduler waits for the next
+# deadline; its share of the period shows how idle the producer is
+IDLE = 'idle'
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max', 'last')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # Upper bound of the bucket holding quantile q
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': 1000 * self.total / self.count if self.count else 0.0,
+            'p50_ms': 1000 * min(self.quantile(0.5), self.max),
+            'p90_ms': 1000 * min(self.quantile(0.9), self.max),
+            'p99_ms': 1000 * min(self.quantile(0.99), self.max),
+            'max_ms': 1000 * self.max,
+            'last_ms': 1000 * self.last,
+            'total_s': self.total,
+        }
+
+# Context manager returned by phase(); a plain class is about twice as cheap
+# as a @contextmanager generator
+class _PhaseTimer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.record(time.perf_counter() - self.start)
+
+class PhaseRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    # Event counters (missed deadlines, skipped frames, ...) per page
+    def count(self, page, name, n=1):
+        with self._lock:
+            self._counters[(page, name)] = self._counters.get((page, name), 0) + n
+
+    def counters(self):
+        with self._lock:
+            items = sorted(self._counters.items())
+        out = {}
+        for (page, name), value in items:
+            out.setdefault(page, {})[name] = value
+        return out
+
+    def histogram(self, page, phase):
+        key = (page, phase)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def phase(self, page, phase):
+        return _PhaseTimer(self.histogram(page, phase))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # {page: {phase: summary}}, plus each phase's share of the page's time
+    def snapshot(self):
+        with self._lock:
+            items = list(self._histograms.items())
+        pages = {}
+        for (page, phase), histogram in sorted(items):
+            pages.setdefault(page, {})[phase] = histogram.summary()
+        for phases in pages.values():
+            total = sum(summary['total_s'] for summary in phases.values()) or 1.0
+            for summary in phases.values():
+                summary['share'] = summary['total_s'] / total
+        return pages
+
+    def to_json(self):
+        return json.dumps({'timestamp': time.time(), 'pages': self.snapshot(), 'counters': self.counters()}, indent=2)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+REGISTRY = PhaseRegistry()
+phase = REGISTRY.phase
+count = REGISTRY.count
+counters = REGISTRY.counters
+snapshot = REGISTRY.snapshot
+to_json = REGISTRY.to_json
+dump = REGISTRY.dump
+reset = REGISTRY.reset
+
+def panel_html(pages=None, events=None):
+    pages = snapshot() if pages is None else pages
+    events = counters() if events is None else events
+    rows = []
+    for page, phases in pages.items():
+        for name, summary in phases.items():
+            rows.append(
+                f"<tr><td>{page}</td><td>{name}</td><td>{summary['p50_ms']:.1f}</td>"
+                f"<td>{summary['p99_ms']:.1f}</td><td>{summary['max_ms']:.1f}</td>"
+                f"<td>{100 * summary['share']:.0f}%</td></tr>"
+            )
+    for page, names in events.items():
+        for name, value in names.items():
+            rows.append(f"<tr><td>{page}</td><td>{name}</td><td colspan='4'>{value}</td></tr>")
+    return (
+        "<table style='font-size: 12px; width: 100%;'>"
+        "<tr><th>Page</th><th>Phase</th><th>p50 ms</th><th>p99 ms</th><th>max ms</th><th>Share</th></tr>"
+        + "".join(rows) + "</table>"
+    )
@@ -0,0 +1,128 @@
+# producer.py
+import threading
+
+from ringbuffer import RingBuffer
+from samples import Batch
+from scheduler import TickScheduler
+from telemetry import latest
+
+# Process-wide sampling thread shared by every viewer of a page.
+#
+# Instead of each browser session running its own generator loop, one
+# Producer per page (and per tractor) samples on a TickScheduler and keeps
+# the computed columns in a RingBuffer.  Sessions poll it from periodic
+# st.fragment consumers: snapshot() returns the latest sample and the
+# retained history, since() the rows appended after a caller-held sequence
+# number (for per-session recording), both as a samples.Batch.  since()
+# copies its rows, and so does snapshot() by default; snapshot(copy=False)
+# hands out read-only views of the ring buffer for renderers that use them
+# under the lock (the incremental plots), so they read the history without
+# copying it.  memo() builds
+# derived output (table HTML, plot PNG, map HTML) once per new sample
+# however many sessions ask for it.  CPU cost therefore follows the number
+# of producers, not the number of viewers.
+#
+# read is called once per tick and returns a Batch (or dict) of equally long
+# columns covering at least channels; None or an empty batch is skipped.  The
+# latest sample is kept as a slotted record.  shared holds page-owned
+# objects used by read() and the memo builders (a LivePlot, a GpsTrail);
+# mutate them under lock.  Anything in shared or resources with
+# a close() method is closed with the producer.  Pages build their producers
+# with make_producer() and share them through st.cache_resource.
+class Producer:
+    def __init__(self, read, channels, capacity, period=1.0, page=None, shared=None, resources=()):
+        self.read = read
+        self.channels = tuple(channels)
+        self.page = page
+        self.shared = dict(shared or {})
+        self.resources = tuple(resources)
+        self.lock = threading.RLock()
+        self.history = RingBuffer(self.channels, capacity)
+        self.scheduler = TickScheduler(period, page=page, sleep=self._sleep)
+        self._seq = 0
+        self._latest = None
+        self._memo = {}
+        self._memo_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"producer-{page}", daemon=True)
+
+    def _sleep(self, seconds):
+        self._stop.wait(seconds)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        for tick in self.scheduler.ticks():
+            if self._stop.is_set():
+                break
+            self.poll()
+
+    # One read and its bookkeeping; returns the number of new samples
+    def poll(self):
+        batch = self.read()
+        n = len(batch[self.channels[0]]) if batch else 0
+        if n:
+            with self.lock:
+                self.history.extend({name: batch[name] for name in self.channels})
+                self._latest = latest(batch)
+                self._seq += n
+        return n
+
+    @property
+    def seq(self):
+        with self.lock:
+            return self._seq
+
+    # Latest sample (all columns returned by read) as Python scalars, or None
+    def latest(self):
+        with self.lock:
+            return self._latest
+
+    # (seq, latest sample, retained history).  With copy=False the history
+    # is a view of the ring buffer, which the producer thread overwrites as
+    # it wraps: only use it while holding self.lock.
+    def snapshot(self, copy=True):
+        with self.lock:
+            block = self.history.block()
+            return self._seq, self._latest, Batch.from_block(self.channels, block.copy() if copy else block)
+
+    # Output of build() for the current sample, rebuilt only when a new
+    # sample has arrived since it was last built for key
+    def memo(self, key, build):
+        with self._memo_lock:
+            seq = self.seq
+            cached = self._memo.get(key)
+            if cached is None or cached[0] != seq:
+                cached = (seq, build())
+                self._memo[key] = cached
+            return cached[1]
+
+    # Rows appended after sequence number seq (as far as they are still
+    # retained) and the new sequence number
+    def since(self, seq):
+        with self.lock:
+            k = min(self._seq - seq, len(self.history))
+            if k <= 0:
+                return Batch.empty(self.channels, 0), self._seq
+            return Batch.from_block(self.channels, self.history.block()[:, -k:].copy()), self._seq
+
+    def close(self):
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        for resource in (*self.resources, *self.shared.values()):
+            if hasattr(resource, 'close'):
+                resource.close()
+
+# Append the rows a session has not recorded yet to its recorder.  cursor is
+# the value returned by the previous call (None starts recording from the
+# current sample); transform can add derived channels before appending.
+def pump(producer, recorder, cursor, transform=None):
+    if cursor is None:
+        return producer.seq
+    rows, cursor = producer.since(cursor)
+    if len(rows[producer.channels[0]]):
+        recorder.append(transform(rows) if transform is not None else rows)
+    return cursor
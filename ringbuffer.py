@@ -0,0 +1,110 @@
+# ringbuffer.py
+import numpy as np
+
+# Fixed-capacity multi-channel history for the live dashboards.
+#
+# Every channel is one row of a preallocated array twice the capacity long.
+# Each sample is written at position i and i + capacity, so the most recent
+# samples are always one contiguous slice and view() can hand out NumPy views
+# without copying.  Memory is fixed at 2 * capacity * channels values no
+# matter how long a page stays open.
+#
+# The window can be bounded in samples (capacity) and, optionally, in
+# seconds: with window_seconds set, views only cover samples whose
+# time_channel value lies within that many seconds of the newest sample.
+class RingBuffer:
+    def __init__(self, channels, capacity, window_seconds=None, time_channel='time', dtype=np.float64):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if window_seconds is not None and time_channel not in channels:
+            raise ValueError(f"window_seconds needs a '{time_channel}' channel")
+
+        self.channels = tuple(channels)
+        self.capacity = int(capacity)
+        self.window_seconds = window_seconds
+        self.time_channel = time_channel
+        self._index = {name: i for i, name in enumerate(self.channels)}
+        self._data = np.zeros((len(self.channels), 2 * self.capacity), dtype=dtype)
+        self._head = 0  # next write position in [0, capacity)
+        self._size = 0
+
+    # Capacity needed to hold window_seconds of data at sample_rate Hz
+    @staticmethod
+    def capacity_for(window_seconds, sample_rate):
+        return max(1, int(np.ceil(window_seconds * sample_rate)))
+
+    def __len__(self):
+        return self._window_start_size()[1]
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+    # Append one sample given as a dict and/or channel=value keyword arguments
+    def append(self, values=None, **kwargs):
+        if values is None:
+            values = kwargs
+        elif kwargs:
+            values = {**values, **kwargs}
+        head = self._head
+        row = self._data
+        for name, value in values.items():
+            i = self._index[name]
+            row[i, head] = value
+            row[i, head + self.capacity] = value
+        self._head = (head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    # Append a batch of samples given as equal-length columns
+    def extend(self, columns):
+        n = len(next(iter(columns.values())))
+        if n == 0:
+            return
+        columns = {name: np.asarray(values)[-self.capacity:] for name, values in columns.items()}
+        m = min(n, self.capacity)
+        positions = (self._head + (n - m) + np.arange(m)) % self.capacity
+        for name, values in columns.items():
+            i = self._index[name]
+            self._data[i, positions] = values
+            self._data[i, positions + self.capacity] = values
+        self._head = (self._head + n) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    def _window_start_size(self):
+        size = self._size
+        start = self._head - size + self.capacity
+        if self.window_seconds is not None and size:
+            times = self._data[self._index[self.time_channel], start:start + size]
+            first = np.searchsorted(times, times[-1] - self.window_seconds, side='left')
+            start += first
+            size -= first
+        return start, size
+
+    # Read-only view of a channel, oldest sample first
+    def view(self, name):
+        start, size = self._window_start_size()
+        out = self._data[self._index[name], start:start + size]
+        out.flags.writeable = False
+        return out
+
+    # Views of every channel sharing one window
+    def views(self):
+        start, size = self._window_start_size()
+        out = {}
+        for name, i in self._index.items():
+            view = self._data[i, start:start + size]
+            view.flags.writeable = False
+            out[name] = view
+        return out
+
+    # Read-only (channels x samples) view of the window, one row per channel
+    def block(self):
+        start, size = self._window_start_size()
+        out = self._data[:, start:start + size]
+        out.flags.writeable = False
+        return out
+
+    def latest(self, name):
+        if not self._size:
+            raise IndexError("ring buffer is empty")
+        return self._data[self._index[name], self._head - 1 + self.capacity]
@@ -0,0 +1,196 @@
+# samples.py
+from collections.abc import Mapping
+
+import numpy as np
+
+# Compact sample types shared by the telemetry sources, the compute step and
+# the renderers.
+#
+# A single sample (the latest reading of a producer, the result of one
+# operating point) is a record: an instance of a class with __slots__
+# generated once per set of fields, so it costs one small object holding
+# its values instead of a dict with its own hash table.  Records read as
+# attributes or, like the dicts they replace, as sample['name'].
+#
+# Bulk data is a Batch: struct-of-arrays columns behind a read-only mapping
+# interface (batch['time'], items(), {**batch}), so code written for a dict
+# of columns takes one unchanged.  Batch.empty() allocates all columns as
+# rows of one 2-D block that generators fill in place, and the producers
+# hand out their history as one copied block rather than a dict of arrays.
+
+class Record:
+    __slots__ = ()
+    fields = ()
+
+    @classmethod
+    def from_mapping(cls, values):
+        return cls(*(values[name] for name in cls.fields))
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def keys(self):
+        return self.fields
+
+    def values(self):
+        return [getattr(self, name) for name in self.fields]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.fields]
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.fields}
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return self.fields == other.fields and self.values() == other.values()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.items())})"
+
+_record_types = {}
+
+# __init__ taking the fields positionally.  It is generated, as
+# dataclasses do, because a setattr() loop costs several times the plain
+# assignments on the compute path.
+def _make_init(fields):
+    body = "".join(f"\n    self.{name} = {name}" for name in fields) or "\n    pass"
+    namespace = {}
+    exec(f"def __init__(self, {', '.join(fields)}):{body}", namespace)
+    return namespace['__init__']
+
+# Record class with one slot per field, created once per (name, fields)
+def record_type(fields, name='Sample'):
+    fields = tuple(fields)
+    cls = _record_types.get((name, fields))
+    if cls is None:
+        if not all(field.isidentifier() for field in fields):
+            raise ValueError(f"record fields must be identifiers: {fields}")
+        cls = type(name, (Record,), {'__slots__': fields, 'fields': fields, '__init__': _make_init(fields)})
+        _record_types[(name, fields)] = cls
+    return cls
+
+# Channel -> column position, shared by every batch with the same channels
+_indexes = {}
+
+def _index(channels):
+    index = _indexes.get(channels)
+    if index is None:
+        index = _indexes[channels] = {name: i for i, name in enumerate(channels)}
+    return index
+
+# Equal-length columns, one per channel, from a mapping or (channel, values)
+# pairs.  len() is the number of channels (as for a dict of columns); size
+# is the number of rows.  Assigning to a channel replaces its column or adds
+# one.
+class Batch(Mapping):
+    __slots__ = ('channels', 'columns', '_index')
+
+    def __init__(self, columns=None, **named):
+        columns = dict(columns or (), **named)
+        self.channels = tuple(columns)
+        self.columns = [np.asarray(values) for values in columns.values()]
+        self._index = _index(self.channels)
+
+    # Batch whose columns are the rows of block (channels x samples)
+    @classmethod
+    def from_block(cls, channels, block):
+        batch = cls.__new__(cls)
+        batch.channels = tuple(channels)
+        batch.columns = list(block)
+        batch._index = _index(batch.channels)
+        return batch
+
+    # Uninitialised n-row batch backed by one block
+    @classmethod
+    def empty(cls, channels, n, dtype=np.float64):
+        return cls.from_block(channels, np.empty((len(channels), n), dtype=dtype))
+
+    def __getitem__(self, name):
+        return self.columns[self._index[name]]
+
+    def __setitem__(self, name, values):
+        i = self._index.get(name)
+        if i is None:
+            self.channels += (name,)
+            self.columns.append(np.asarray(values))
+            self._index = _index(self.channels)
+        else:
+            self.columns[i] = np.asarray(values)
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    @property
+    def size(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    # Sample i as a record of Python scalars
+    def record(self, i=-1, name='Sample'):
+        return record_type(self.channels, name)(*(values[i].item() for values in self.columns))
+
+    # Batch of the given channels (views of the same columns)
+    def select(self, channels):
+        return Batch({name: self[name] for name in channels})
+
+    def __repr__(self):
+        return f"Batch({self.size} rows: {', '.join(self.channels)})"
+
+# Growable struct-of-arrays queue: samples are appended at the back as
+# (channels x n) blocks and dropped from the front, in one block that is
+# compacted, or doubled when at least half full, when the back reaches its
+# end.  Both ends are amortized O(1) per sample.
+class ColumnQueue:
+    def __init__(self, channels, capacity=64, dtype=np.float64):
+        self.channels = tuple(channels)
+        self._index = _index(self.channels)
+        self._data = np.empty((len(self.channels), max(1, capacity)), dtype=dtype)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def extend(self, block):
+        n = block.shape[1]
+        if self._end + n > self._data.shape[1]:
+            size = len(self)
+            capacity = self._data.shape[1]
+            if 2 * (size + n) > capacity:
+                data = np.empty((len(self.channels), max(2 * capacity, size + n)), dtype=self._data.dtype)
+            else:
+                data = self._data
+            data[:, :size] = self.block()
+            self._data, self._start, self._end = data, 0, size
+        self._data[:, self._end:self._end + n] = block
+        self._end += n
+
+    # Drop the n oldest samples
+    def popleft(self, n):
+        self._start = min(self._start + n, self._end)
+
+    # (channels x samples) view, oldest first
+    def block(self):
+        return self._data[:, self._start:self._end]
+
+    def column(self, name):
+        return self._data[self._index[name], self._start:self._end]
+
+    def record(self, i=-1, name='Sample'):
+        return record_type(self.channels, name)(*self.block()[:, i].tolist())
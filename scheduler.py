@@ -0,0 +1,82 @@
+# scheduler.py
+import time
+from collections import namedtuple
+
+import perf
+
+# index: tick number since start; deadline/now: clock times; lag: now - deadline;
+# elapsed: now - start
+Tick = namedtuple('Tick', 'index deadline now lag elapsed')
+
+# Fixed-rate tick source for the producer threads.
+#
+# Sample deadlines sit on an absolute grid (start + k * sample_period), so a
+# slow read does not push later ticks back the way "work, then
+# time.sleep(N)" does.  If the loop falls more than max_backlog periods
+# behind, the grid is re-anchored at the current time (sources hand out
+# everything since their last read, so no data is lost).
+#
+# Deadlines missed by more than late_tolerance and re-anchors are counted
+# in stats() and, when page is set, in perf counters; sleeping is timed as
+# the page's idle phase.
+class TickScheduler:
+    def __init__(self, sample_period, page=None, late_tolerance=None, max_backlog=10,
+                 clock=time.monotonic, sleep=time.sleep):
+        if sample_period <= 0:
+            raise ValueError("sample_period must be positive")
+        self.sample_period = sample_period
+        self.page = page
+        self.late_tolerance = sample_period / 2 if late_tolerance is None else late_tolerance
+        self.max_backlog = max_backlog
+        self.clock = clock
+        self.sleep = sleep
+        self.ticks_run = 0
+        self.missed_deadlines = 0
+        self.resyncs = 0
+        self.max_lag = 0.0
+
+    def _count(self, name, n=1):
+        if self.page is not None:
+            perf.count(self.page, name, n)
+
+    def _wait(self, seconds):
+        if self.page is None:
+            self.sleep(seconds)
+        else:
+            with perf.phase(self.page, perf.IDLE):
+                self.sleep(seconds)
+
+    def ticks(self):
+        start = self.clock()
+        k = 0
+        while True:
+            deadline = start + k * self.sample_period
+            now = self.clock()
+            if now < deadline:
+                self._wait(deadline - now)
+                now = self.clock()
+
+            lag = now - deadline
+            if lag > self.max_backlog * self.sample_period:
+                # Too far behind to catch up tick by tick: re-anchor the grid
+                k += int(lag // self.sample_period)
+                deadline = start + k * self.sample_period
+                lag = now - deadline
+                self.resyncs += 1
+                self._count('resyncs')
+            if lag > self.late_tolerance:
+                self.missed_deadlines += 1
+                self._count('missed_deadlines')
+            self.max_lag = max(self.max_lag, lag)
+
+            self.ticks_run += 1
+            yield Tick(k, deadline, now, lag, now - start)
+            k += 1
+
+    def stats(self):
+        return {
+            'ticks': self.ticks_run,
+            'missed_deadlines': self.missed_deadlines,
+            'resyncs': self.resyncs,
+            'max_lag_ms': 1000 * self.max_lag,
+        }
@@ -0,0 +1,171 @@
+# sessionlog.py
+import atexit
+import json
+import os
+import time
+import weakref
+import numpy as np
+
+# On-disk session log: one append-only file of fixed-width float64 values per
+# channel plus a schema.json naming the channels, their units and the schema
+# version.  Logs written before units were recorded (version 1) hold
+# implement draft in N; from version 2 on, it is in kN like the rest of the
+# model.  metadata (a JSON object, e.g. the prediction engine that produced
+# the model results) is stored with the schema.
+#
+# SessionRecorder buffers incoming batches and writes them as one chunk per
+# column every flush_rows samples or flush_interval seconds, whichever comes
+# first; files are fsynced at most every fsync_interval seconds (and on
+# close).  Recorders still open when they are garbage collected (e.g. with
+# the browser session holding them) or when the process exits are closed.
+# SessionLog memory-maps the column files, so a time-range query over a
+# whole shift is a binary search on the time column and slices of the
+# mapped arrays, with no text parsing.
+
+SESSION_CHANNELS = (
+    'time', 'gear_ratio', 'engine_speed', 'throttle', 'implement_depth', 'forward_speed', 'slip',
+    'latitude', 'longitude',
+    'engine_torque', 'fuel_consumption', 'engine_power', 'specific_fuel_consumption',
+    'fuel_consumption_area', 'implement_draft', 'drawbar_power', 'tractive_efficiency',
+)
+
+# Units of the recorded channels
+UNITS = {
+    'time': 's', 'gear_ratio': '1', 'engine_speed': 'rpm', 'throttle': '%', 'implement_depth': 'cm',
+    'forward_speed': 'km/h', 'slip': '%', 'latitude': 'deg', 'longitude': 'deg',
+    'engine_torque': 'N m', 'fuel_consumption': 'L/h', 'engine_power': 'hp',
+    'specific_fuel_consumption': 'kg/hp-h', 'fuel_consumption_area': 'L/ha', 'implement_draft': 'kN',
+    'drawbar_power': 'hp', 'tractive_efficiency': '%',
+}
+
+SCHEMA_FILE = 'schema.json'
+SCHEMA_VERSION = 2
+DTYPE = np.dtype('<f8')
+
+def _column_path(directory, name):
+    return os.path.join(directory, f'{name}.f64')
+
+# Recorders not closed yet, closed at exit
+_open_recorders = weakref.WeakSet()
+
+@atexit.register
+def _close_open_recorders():
+    for recorder in list(_open_recorders):
+        recorder.close()
+
+class SessionRecorder:
+    _files = {}   # until opened, so close() works on a half-built recorder
+
+    def __init__(self, directory, channels=SESSION_CHANNELS, flush_rows=1024, flush_interval=5.0,
+                 fsync_interval=5.0, metadata=None):
+        if 'time' not in channels:
+            raise ValueError("a session log needs a 'time' channel")
+        self.directory = directory
+        self.channels = tuple(channels)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.metadata = dict(metadata or {})
+        self.rows_written = 0
+
+        os.makedirs(directory, exist_ok=True)
+        schema_path = os.path.join(directory, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            with open(schema_path) as f:
+                schema = json.load(f)
+            if tuple(schema['channels']) != self.channels:
+                raise ValueError(f"{directory} holds a session with different channels")
+            if schema.get('version', 1) != SCHEMA_VERSION:
+                raise ValueError(f"{directory} holds a session of schema version {schema.get('version', 1)}")
+            if schema.get('metadata', {}) != self.metadata:
+                raise ValueError(f"{directory} holds a session with different metadata")
+        else:
+            with open(schema_path, 'w') as f:
+                json.dump({'version': SCHEMA_VERSION, 'channels': list(self.channels), 'dtype': DTYPE.str,
+                           'units': {name: UNITS[name] for name in self.channels if name in UNITS},
+                           'metadata': self.metadata}, f)
+
+        self._files = {name: open(_column_path(directory, name), 'ab') for name in self.channels}
+        self._pending = []
+        self._pending_rows = 0
+        self._last_flush = self._last_fsync = time.monotonic()
+        _open_recorders.add(self)
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Queue a batch of equal-length columns; channels missing from the batch
+    # are recorded as NaN
+    def append(self, batch):
+        n = len(batch['time'])
+        if not n:
+            return
+        self._pending.append({name: batch[name] for name in self.channels if name in batch})
+        self._pending_rows += n
+        if self._pending_rows >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, fsync=False):
+        if self._pending:
+            n = self._pending_rows
+            for name, f in self._files.items():
+                parts = [np.asarray(chunk[name], dtype=DTYPE) if name in chunk
+                         else np.full(len(chunk['time']), np.nan, dtype=DTYPE)
+                         for chunk in self._pending]
+                f.write(np.concatenate(parts).tobytes())
+                f.flush()
+            self.rows_written += n
+            self._pending = []
+            self._pending_rows = 0
+        self._last_flush = time.monotonic()
+
+        if fsync or time.monotonic() - self._last_fsync >= self.fsync_interval:
+            for f in self._files.values():
+                os.fsync(f.fileno())
+            self._last_fsync = time.monotonic()
+
+    def close(self):
+        if self._files:
+            self.flush(fsync=True)
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+            _open_recorders.discard(self)
+
+class SessionLog:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, SCHEMA_FILE)) as f:
+            schema = json.load(f)
+        self.channels = tuple(schema['channels'])
+        self.version = schema.get('version', 1)
+        self.units = schema.get('units', {})
+        self.metadata = schema.get('metadata', {})
+        dtype = np.dtype(schema.get('dtype', DTYPE.str))
+
+        # A crash between column writes can leave columns of unequal length;
+        # only rows present in every column are exposed
+        sizes = [os.path.getsize(_column_path(directory, name)) // dtype.itemsize for name in self.channels]
+        self.rows = min(sizes) if sizes else 0
+        self.columns = {}
+        for name in self.channels:
+            if self.rows:
+                self.columns[name] = np.memmap(_column_path(directory, name), dtype=dtype, mode='r', shape=(self.rows,))
+            else:
+                self.columns[name] = np.empty(0, dtype=dtype)
+
+    def __len__(self):
+        return self.rows
+
+    # Memory-mapped views of all (or the given) channels with start <= time < end
+    def query(self, start=None, end=None, channels=None):
+        times = self.columns['time']
+        first = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        last = self.rows if end is None else int(np.searchsorted(times, end, side='left'))
+        return {name: self.columns[name][first:last] for name in (channels or self.channels)}
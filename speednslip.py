@@ -1,240 +1,407 @@
-import time
-import matplotlib.pyplot as plt
-import streamlit as st
-import random
-import time
-
-def generate_throttle_values():
-    return random.randint(45, 85)
-
-def generate_engine_speed_values():
-    return random.randint(1200, 1400)
-
-def generate_implement_depth_values():
-    return round(random.uniform(5, 25), 2)
-
-def generate_forward_speed_values():
-    return round(random.uniform(1.8, 4.5), 2)
-
-# Function to calculate slip percentage
-def calculate_slip(engine_speed, forward_speed, gear_ratio):
-    Vt = engine_speed / gear_ratio  # Calculate theoretical speed
-    slip = 100 * (1 - (forward_speed / Vt))  # Calculate slip percentage
-    return round(slip, 2)
-
-# Gear ratios (as per the provided list)
-gear_ratios = [160, 120, 80, 40, 30]
-# Icon URLs for the table
-icon_url = {
-    "Engine Torque": "https://encrypted-tbn1.gstatic.com/images?q=tbn:ANd9GcQhkTm5C6-djVM3yJ6DZ--Yc3axxHSxT8RHVYB4Dthor-vWVhc4",
-    "Fuel Consumption": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcRqc4p4DyeU5I0AzNnl7w1rYwsQrq3vV4ylviuU9JSy7g63vv0L",
-    "Engine Power": "https://encrypted-tbn1.gstatic.com/images?q=tbn:ANd9GcT0tSZjxD2nNXkGho7aCY3RdK-2SKylAUgV_XXxGGvnb3nIqhmq",
-    "Specific Fuel Consumption": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQXJIQWbLE_0DwM4BmilBbQIFC08CrGHqnKgMZM4Gv6YjuF0DdK",
-    "Fuel Consumption per Tilled Area": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQSUYRAAJNfkU0TtLoT7qmjouHO46frWiqYOppmIGytCzbORik9",
-    "Implement Draft": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQfbucYctsmUEAm34Ja4Xxgb1nVtv5comnkGPqqvwJVJAl7L0RY",
-    "Drawbar Power": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcSkoQm9oof_qXb12jIbTZI3U5iI5MRV21ONG9GoW0LI65XZ1svq",
-    "Tractive Efficiency": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQ8mr5HjL2hNmNZzCD63O5KszeL0khnYGNUd09ang3WgtXCUCZm",
-}
-
-# Function to generate the HTML table with icons and larger font size
-def generate_table_html(params):
-    table_content = """
-    <table style="font-size: 18px; width: 100%; text-align: left;">
-        <tr><th>Parameter</th><th>Value</th></tr>
-    """
-    table_content += f"""
-    <tr>
-        <td><img src="{icon_url['Engine Torque']}" alt="icon" style="width: 40px; height: 40px;"> Engine Torque (Nm)</td>
-        <td>{params['engine_torque']:.2f}</td>
-    </tr>
-    <tr>
-        <td><img src="{icon_url['Fuel Consumption']}" alt="icon" style="width: 40px; height: 40px;"> Fuel Consumption (L/h)</td>
-        <td>{params['fuel_consumption']:.2f}</td>
-    </tr>
-    <tr>
-        <td><img src="{icon_url['Engine Power']}" alt="icon" style="width: 40px; height: 40px;"> Engine Power (hp)</td>
-        <td>{params['engine_power']:.2f}</td>
-    </tr>
-    <tr>
-        <td><img src="{icon_url['Specific Fuel Consumption']}" alt="icon" style="width: 40px; height: 40px;"> Specific Fuel Consumption (kg/hp-hr)</td>
-        <td>{params['specific_fuel_consumption']:.2f}</td>
-    </tr>
-    <tr>
-        <td><img src="{icon_url['Fuel Consumption per Tilled Area']}" alt="icon" style="width: 40px; height: 40px;"> Fuel Consumption per Tilled Area (L/ha)</td>
-        <td>{params['fuel_consumption_area']:.2f}</td>
-    </tr>
-    <tr>
-        <td><img src="{icon_url['Implement Draft']}" alt="icon" style="width: 40px; height: 40px;"> Implement Draft (kN)</td>
-        <td>{params['implement_draft']:.2f}</td>
-    </tr>
-    <tr>
-        <td><img src="{icon_url['Drawbar Power']}" alt="icon" style="width: 40px; height: 40px;"> Drawbar Power (hp)</td>
-        <td>{params['drawbar_power']:.2f}</td>
-    </tr>
-    <tr>
-        <td><img src="{icon_url['Tractive Efficiency']}" alt="icon" style="width: 40px; height: 40px;"> Tractive Efficiency (%)</td>
-        <td>{params['tractive_efficiency']:.2f}</td>
-    </tr>
-    """
-    table_content += "</table>"
-    return table_content
-
-# Dummy function to simulate parameter calculation
-def calculate_parameters():
-    throttle = generate_throttle_values()
-    engine_speed = generate_engine_speed_values()
-    forward_speed = generate_forward_speed_values()
-    implement_depth = generate_implement_depth_values()
-    gear_ratio = random.choice(gear_ratios)
-
-    slip = calculate_slip(engine_speed, forward_speed, gear_ratio)
-
-    # Calculate engine torque (Nm)
-    z = 24.49 * throttle + 42.483
-    r = z - engine_speed
-
-    ent = (
-        (r ** 3 * z ** 2) * (8.5558 * pow(10, -13)) +
-        (r ** 2 * z ** 2) * (-5.086 * pow(10, -9)) +
-        (r * z ** 2) * (3.1619 * pow(10, -7)) +
-        (r ** 3 * z) * (-1.909 * pow(10, -8)) +
-        (r ** 2 * z) * (1.5683 * pow(10, -5)) +
-        (r * z) * (-0.000435357) + 5.93541932
-    )
-
-    # Fuel consumption (L/h)
-    fcp = (
-        (z ** 3 * r ** 2) * (-2.2978 * pow(10, -25)) +
-        (z ** 2 * r ** 2) * (-3.0631 * pow(10, -11)) +
-        (z ** 3 * r) * (-5.2523 * pow(10, -23)) +
-        (z ** 2 * r) * (1.60046 * pow(10, -8)) +
-        (z ** 3) * (-5.60937 * pow(10, -21)) + 1.342006549
-    )
-
-    # Engine power (hp)
-    enp = (2 * 3.14 * engine_speed * ent) / (60 * 746)
-
-    # Specific fuel consumption (kg/hp-hr)
-    sfc = (fcp * 840) / enp if enp != 0 else 0
-
-    # Fuel consumption per tilled area (L/ha)
-    FC = (fcp * 10) / (0.6 * forward_speed) if forward_speed != 0 else 0
-
-    # Implement draft (kN)
-    draft = 0.78 * (652 + 5.1 * forward_speed ** 2) * 0.6 * implement_depth
-
-    # Drawbar power (hp)
-    dbp = 0.3723 * (draft * forward_speed)
-
-    # Tractive efficiency (%)
-    te = dbp * (100 - slip) / (0.9 * enp) if enp != 0 else 0
-
-    return {
-        'engine_torque': ent,
-        'fuel_consumption': fcp,
-        'engine_power': enp,
-        'specific_fuel_consumption': sfc,
-        'fuel_consumption_area': FC,
-        'implement_draft': draft,
-        'drawbar_power': dbp,
-        'tractive_efficiency': te,
-        'throttle': throttle,
-        'engine_speed': engine_speed,
-        'forward_speed': forward_speed,
-        'implement_depth': implement_depth,
-        'slip': slip
-    }
- 
-# Main function to display tractor parameters
-def display_parameters():
-    st.markdown("<h1>Real-time Tractor Performance Prediction</h1>", unsafe_allow_html=True)
-
-    # Initialize placeholders for output and graph
-    output_placeholder = st.empty()
-    graph_placeholder = st.empty()
-
-    # Initialize lists to store data for plotting
-    throttle_values = []
-    engine_speed_values = []
-    forward_speed_values = []
-    implement_depth_values = []
-    slip_values = []
-    engine_torque_values = []
-    fuel_consumption_values = []
-    engine_power_values = []
-    specific_fuel_consumption_values = []
-    fuel_consumption_area_values = []
-    implement_draft_values = []
-    drawbar_power_values = []
-    tractive_efficiency_values = []
-    time_stamps = []
-
-    # Infinite loop for continuous data generation
-    while True:
-        time_stamp = len(time_stamps)  # Using the list length as a time index
-
-        # Calculate new parameters
-        params = calculate_parameters()
-
-        # Append new values to lists
-        throttle_values.append(params['throttle'])
-        engine_speed_values.append(params['engine_speed'])
-        forward_speed_values.append(params['forward_speed'])
-        implement_depth_values.append(params['implement_depth'])
-        slip_values.append(params['slip'])
-        engine_torque_values.append(params['engine_torque'])
-        fuel_consumption_values.append(params['fuel_consumption'])
-        engine_power_values.append(params['engine_power'])
-        specific_fuel_consumption_values.append(params['specific_fuel_consumption'])
-        fuel_consumption_area_values.append(params['fuel_consumption_area'])
-        implement_draft_values.append(params['implement_draft'])
-        drawbar_power_values.append(params['drawbar_power'])
-        tractive_efficiency_values.append(params['tractive_efficiency'])
-        time_stamps.append(time_stamp)
-
-        # Generate the table with icons and larger font
-        table_html = generate_table_html(params)
-        output_placeholder.markdown(table_html, unsafe_allow_html=True)
-
-        # Plot the real-time data on the right with dots and shaded areas
-        fig, ax = plt.subplots(8, 1, figsize=(10, 15), sharex=True)
-
-        ax[0].plot(time_stamps, engine_torque_values, label="Engine Torque (Nm)", color='green', marker='o')
-        ax[0].fill_between(time_stamps, engine_torque_values, color='green', alpha=0.2)
-
-        ax[1].plot(time_stamps, fuel_consumption_values, label="Fuel consumption (L/h)", color='blue', marker='o')
-        ax[1].fill_between(time_stamps, fuel_consumption_values, color='blue', alpha=0.2)
-
-        ax[2].plot(time_stamps, engine_power_values, label="Engine power (hp)", color='orange', marker='o')
-        ax[2].fill_between(time_stamps, engine_power_values, color='orange', alpha=0.2)
-
-        ax[3].plot(time_stamps, specific_fuel_consumption_values, label="Specific fuel consumption (kg/hp-hr)", color='purple', marker='o')
-        ax[3].fill_between(time_stamps, specific_fuel_consumption_values, color='purple', alpha=0.2)
-
-        ax[4].plot(time_stamps, fuel_consumption_area_values, label="Fuel consumption per tilled area (L/ha)", color='red', marker='o')
-        ax[4].fill_between(time_stamps, fuel_consumption_area_values, color='red', alpha=0.2)
-
-        ax[5].plot(time_stamps, implement_draft_values, label="Implement draft (kN)", color='pink', marker='o')
-        ax[5].fill_between(time_stamps, implement_draft_values, color='pink', alpha=0.2)
-
-        ax[6].plot(time_stamps, drawbar_power_values, label="Drawbar power (hp)", color='orange', marker='o')
-        ax[6].fill_between(time_stamps, drawbar_power_values, color='orange', alpha=0.2)
-
-        ax[7].plot(time_stamps, tractive_efficiency_values, label="Tractive efficiency (%)", color='blue', marker='o')
-        ax[7].fill_between(time_stamps, tractive_efficiency_values, color='blue', alpha=0.2)
-
-        for axis in ax:
-            axis.legend(loc="upper right")
-            axis.grid(True)
-
-        ax[-1].set_xlabel("Time")
-
-        # Display plot
-        graph_placeholder.pyplot(fig)
-
-        # Pause for a short time to simulate real-time behavior
-        time.sleep(1)
-
-# Run the real-time display function
-if __name__ == "__main__":
-    display_parameters()
+import streamlit as st
+import numpy as np
+import random
+from telemetry import SimulatorSource
+from samples import Batch, record_type
+from producer import Producer, pump
+from windowstats import StreamStats, header_cells, stats_cells
+from tablerender import TableTemplate
+import perf
+
+def generate_throttle_values():
+    return random.randint(45, 85)
+
+def generate_engine_speed_values():
+    return random.randint(1200, 1400)
+
+def generate_implement_depth_values():
+    return round(random.uniform(5, 25), 2)
+
+def generate_forward_speed_values():
+    return round(random.uniform(1.8, 4.5), 2)
+
+# Function to calculate slip percentage
+def calculate_slip(engine_speed, forward_speed, gear_ratio):
+    Vt = engine_speed / gear_ratio  # Calculate theoretical speed
+    slip = 100 * (1 - (forward_speed / Vt))  # Calculate slip percentage
+    return round(slip, 2)
+
+# Plot history kept per session (one sample per second => one hour)
+HISTORY_SAMPLES = 3600
+HISTORY_CHANNELS = (
+    'time', 'throttle', 'engine_speed', 'forward_speed', 'implement_depth', 'slip',
+    'engine_torque', 'fuel_consumption', 'engine_power', 'specific_fuel_consumption',
+    'fuel_consumption_area', 'implement_draft', 'drawbar_power', 'tractive_efficiency',
+)
+
+# Plotted series: (history channel, legend label, color)
+PLOT_SERIES = (
+    ('engine_torque', "Engine Torque (Nm)", 'green'),
+    ('fuel_consumption', "Fuel consumption (L/h)", 'blue'),
+    ('engine_power', "Engine power (hp)", 'orange'),
+    ('specific_fuel_consumption', "Specific fuel consumption (kg/hp-hr)", 'purple'),
+    ('fuel_consumption_area', "Fuel consumption per tilled area (L/ha)", 'red'),
+    ('implement_draft', "Implement draft (kN)", 'pink'),
+    ('drawbar_power', "Drawbar power (hp)", 'orange'),
+    ('tractive_efficiency', "Tractive efficiency (%)", 'blue'),
+)
+
+# Gear ratios (as per the provided list)
+gear_ratios = [160, 120, 80, 40, 30]
+gear_options = {"L1": 160, "L2": 120, "L3": 80, "L4": 40, "H1": 30}
+
+# Implement and soil defaults used by the draft and per-area equations
+IMPLEMENT_WIDTH = 0.6  # m
+SOIL_FACTOR = 0.78     # dimensionless soil texture factor of the draft equation
+# Icon files (in static/) for the table
+icon_file = {
+    "Engine Torque": "etorque.png",
+    "Fuel Consumption": "fcp.png",
+    "Engine Power": "epower.png",
+    "Specific Fuel Consumption": "sfc.png",
+    "Fuel Consumption per Tilled Area": "fca.png",
+    "Implement Draft": "draft.png",
+    "Drawbar Power": "dpower.png",
+    "Tractive Efficiency": "te.png",
+}
+
+# Table rows: (result key, icon, label)
+TABLE_ROWS = (
+    ('engine_torque', "Engine Torque", "Engine Torque (Nm)"),
+    ('fuel_consumption', "Fuel Consumption", "Fuel Consumption (L/h)"),
+    ('engine_power', "Engine Power", "Engine Power (hp)"),
+    ('specific_fuel_consumption', "Specific Fuel Consumption", "Specific Fuel Consumption (kg/hp-hr)"),
+    ('fuel_consumption_area', "Fuel Consumption per Tilled Area", "Fuel Consumption per Tilled Area (L/ha)"),
+    ('implement_draft', "Implement Draft", "Implement Draft (kN)"),
+    ('drawbar_power', "Drawbar Power", "Drawbar Power (hp)"),
+    ('tractive_efficiency', "Tractive Efficiency", "Tractive Efficiency (%)"),
+)
+
+# HTML table with icons and larger font size, compiled once
+TABLE = TableTemplate(
+    """
+    <table style="font-size: 18px; width: 100%; text-align: left;">
+        <tr><th>Parameter</th><th>Value</th>{stats_header}</tr>
+    """ + "".join(f"""
+    <tr>
+        <td><img src="{{icon_{key}}}" alt="icon" style="width: 40px; height: 40px;"> {label}</td>
+        <td>{{{key}:.2f}}</td>{{stats_{key}}}
+    </tr>""" for key, _, label in TABLE_ROWS) + """
+    </table>""",
+    icons={f"icon_{key}": icon_file[icon] for key, icon, _ in TABLE_ROWS},
+)
+
+# Function to generate the HTML table for the latest parameters
+# stats (a windowstats.StreamStats summary) adds the rolling statistics next
+# to the instantaneous values
+def generate_table_html(params, stats=None):
+    values = {key: params[key] for key, _, _ in TABLE_ROWS}
+    values['stats_header'] = header_cells(stats)
+    for key, _, _ in TABLE_ROWS:
+        values[f'stats_{key}'] = stats_cells(stats, key)
+    return TABLE.render(values)[0]
+
+# Results of the performance model, in the order compute_parameters returns
+# them: one slotted record per operating point, one Batch column per field
+# for calculate_parameters_batch
+RESULT_FIELDS = (
+    'engine_torque', 'fuel_consumption', 'engine_power', 'specific_fuel_consumption',
+    'fuel_consumption_area', 'implement_draft', 'drawbar_power', 'tractive_efficiency',
+    'throttle', 'engine_speed', 'forward_speed', 'implement_depth', 'slip',
+)
+Parameters = record_type(RESULT_FIELDS, 'Parameters')
+
+# Tractor performance model for one operating point
+def compute_parameters(throttle, engine_speed, forward_speed, implement_depth, gear_ratio,
+                       width=IMPLEMENT_WIDTH, soil_factor=SOIL_FACTOR, engine_map=None):
+    slip = calculate_slip(engine_speed, forward_speed, gear_ratio)
+
+    if engine_map is not None:
+        # Torque and fuel from the precomputed lookup table
+        ent, fcp = engine_map.lookup(throttle, engine_speed)
+    else:
+        # Calculate engine torque (Nm)
+        z = 24.49 * throttle + 42.483
+        r = z - engine_speed
+
+        ent = (
+            (r ** 3 * z ** 2) * (8.5558 * pow(10, -13)) +
+            (r ** 2 * z ** 2) * (-5.086 * pow(10, -9)) +
+            (r * z ** 2) * (3.1619 * pow(10, -7)) +
+            (r ** 3 * z) * (-1.909 * pow(10, -8)) +
+            (r ** 2 * z) * (1.5683 * pow(10, -5)) +
+            (r * z) * (-0.000435357) + 5.93541932
+        )
+
+        # Fuel consumption (L/h)
+        fcp = (
+            (z ** 3 * r ** 2) * (-2.2978 * pow(10, -25)) +
+            (z ** 2 * r ** 2) * (-3.0631 * pow(10, -11)) +
+            (z ** 3 * r) * (-5.2523 * pow(10, -23)) +
+            (z ** 2 * r) * (1.60046 * pow(10, -8)) +
+            (z ** 3) * (-5.60937 * pow(10, -21)) + 1.342006549
+        )
+
+    # Engine power (hp)
+    enp = (2 * 3.14 * engine_speed * ent) / (60 * 746)
+
+    # Specific fuel consumption (kg/hp-hr)
+    sfc = (fcp * 840) / enp if enp != 0 else 0
+
+    # Fuel consumption per tilled area (L/ha)
+    FC = (fcp * 10) / (width * forward_speed) if forward_speed != 0 else 0
+
+    # Implement draft (kN); the draft equation gives N
+    draft = soil_factor * (652 + 5.1 * forward_speed ** 2) * width * implement_depth / 1000
+
+    # Drawbar power (hp)
+    dbp = 0.3723 * (draft * forward_speed)
+
+    # Tractive efficiency (%)
+    te = dbp * (100 - slip) / (0.9 * enp) if enp != 0 else 0
+
+    return Parameters(ent, fcp, enp, sfc, FC, draft, dbp, te, throttle, engine_speed, forward_speed,
+                      implement_depth, slip)
+
+# Dummy function to simulate parameter calculation
+def calculate_parameters():
+    throttle = generate_throttle_values()
+    engine_speed = generate_engine_speed_values()
+    forward_speed = generate_forward_speed_values()
+    implement_depth = generate_implement_depth_values()
+    gear_ratio = random.choice(gear_ratios)
+
+    return compute_parameters(throttle, engine_speed, forward_speed, implement_depth, gear_ratio)
+
+# np.round rounds x * 100 in binary and can disagree with round(x, 2) on
+# near-ties; those few elements are redone with round() so both paths agree.
+def _round2(values):
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(v, 2) for v in values[near_tie].tolist()]
+    return rounded
+
+# Telemetry source backed by the generators above
+def simulator_source(rate_hz=None):
+    return SimulatorSource({
+        'throttle': generate_throttle_values,
+        'engine_speed': generate_engine_speed_values,
+        'forward_speed': generate_forward_speed_values,
+        'implement_depth': generate_implement_depth_values,
+        'gear_ratio': lambda: random.choice(gear_ratios),
+    }, rate_hz=rate_hz)
+
+# Engine torque (Nm) and fuel consumption (L/h) polynomials over arrays of
+# throttle (%) and engine speed (rpm); same equations as compute_parameters
+def engine_torque_and_fuel(throttle, engine_speed):
+    throttle = np.asarray(throttle, dtype=np.float64)
+    engine_speed = np.asarray(engine_speed, dtype=np.float64)
+
+    z = 24.49 * throttle + 42.483
+    r = z - engine_speed
+    return torque_and_fuel_zr(z, r)
+
+# The same polynomials in terms of the intermediates z (from throttle) and
+# r = z - engine speed
+def torque_and_fuel_zr(z, r):
+    # Shared powers, evaluated once per batch
+    z2 = z * z
+    z3 = z2 * z
+    r2 = r * r
+    r3 = r2 * r
+
+    ent = (
+        (r3 * z2) * 8.5558e-13 +
+        (r2 * z2) * -5.086e-9 +
+        (r * z2) * 3.1619e-7 +
+        (r3 * z) * -1.909e-8 +
+        (r2 * z) * 1.5683e-5 +
+        (r * z) * -0.000435357 + 5.93541932
+    )
+
+    fcp = (
+        (z3 * r2) * -2.2978e-25 +
+        (z2 * r2) * -3.0631e-11 +
+        (z3 * r) * -5.2523e-23 +
+        (z2 * r) * 1.60046e-8 +
+        z3 * -5.60937e-21 + 1.342006549
+    )
+    return ent, fcp
+
+# Same model as compute_parameters evaluated over whole arrays of samples.
+# Inputs may be arrays or scalars (broadcast together); returns a Batch of
+# float64 columns with the fields of the scalar result.  A measured slip (%)
+# can be passed in place of the one derived from the gear ratio, and an
+# enginemap.EngineMap in place of the exact torque and fuel polynomials.
+# A surrogate.Surrogate replaces the torque, fuel and draft equations with
+# its fitted models (it predicts draft for the implement it was fitted on,
+# whatever width and soil_factor say).
+def calculate_parameters_batch(throttle, engine_speed, forward_speed, implement_depth, gear_ratio,
+                               width=IMPLEMENT_WIDTH, soil_factor=SOIL_FACTOR, slip=None, engine_map=None,
+                               surrogate=None):
+    throttle, engine_speed, forward_speed, implement_depth, gear_ratio = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (throttle, engine_speed, forward_speed, implement_depth, gear_ratio))
+    )
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if slip is None:
+            slip = _round2(100 * (1 - forward_speed / (engine_speed / gear_ratio)))
+        else:
+            slip = np.broadcast_to(np.asarray(slip, dtype=np.float64), throttle.shape)
+
+        if surrogate is not None:
+            ent, fcp = surrogate.lookup_batch(throttle, engine_speed)
+        elif engine_map is None:
+            ent, fcp = engine_torque_and_fuel(throttle, engine_speed)
+        else:
+            ent, fcp = engine_map.lookup_batch(throttle, engine_speed)
+
+        enp = (2 * 3.14 * engine_speed * ent) / (60 * 746)
+
+        # Same zero guards as the scalar path
+        power_ok = enp != 0
+        sfc = np.where(power_ok, (fcp * 840) / enp, 0.0)
+        FC = np.where(forward_speed != 0, (fcp * 10) / (width * forward_speed), 0.0)
+
+        if surrogate is not None:
+            draft = surrogate.draft_batch(forward_speed, implement_depth)
+        else:
+            draft = soil_factor * (652 + 5.1 * forward_speed ** 2) * width * implement_depth / 1000
+        dbp = 0.3723 * (draft * forward_speed)
+        te = np.where(power_ok, dbp * (100 - slip) / (0.9 * enp), 0.0)
+
+    return Batch(zip(RESULT_FIELDS, (ent, fcp, enp, sfc, FC, draft, dbp, te, throttle, engine_speed,
+                                     forward_speed, implement_depth, slip)))
+ 
+# Channels kept by the shared producer: the plotted history plus the gear
+# ratio, so sessions can record everything from it
+PRODUCER_CHANNELS = HISTORY_CHANNELS + ('gear_ratio',)
+
+# Channels with rolling 1/5/15 minute statistics in the table
+STATS_CHANNELS = ('fuel_consumption', 'specific_fuel_consumption', 'tractive_efficiency')
+
+# Prediction engines of the page: the closed-form equations above or the
+# scikit-learn surrogate fitted on the logged sessions (surrogate.py)
+ENGINES = {
+    'equations': "Closed-form equations",
+    'surrogate': "Learned model (scikit-learn)",
+}
+
+def engine_surrogate(engine):
+    if engine == 'equations':
+        return None
+    # Imported here so scikit-learn is only loaded when the model is used
+    from surrogate import default_surrogate
+    return default_surrogate()
+
+# Shared producer computing the parameters for every sample received from
+# source (default: the random generators above) once a second, with the
+# prediction engine named engine (see ENGINES)
+def make_producer(source=None, engine='equations'):
+    if source is None:
+        source = simulator_source()
+    surrogate = engine_surrogate(engine)
+
+    def read():
+        with perf.phase('performance', 'generate'):
+            batch = source.read()
+        if not len(batch['time']):
+            return None
+        with perf.phase('performance', 'compute'):
+            results = calculate_parameters_batch(
+                batch['throttle'], batch['engine_speed'], batch['forward_speed'],
+                batch['implement_depth'], batch['gear_ratio'], surrogate=surrogate,
+            )
+            # Store the samples against the source's elapsed time
+            results['time'] = batch['time']
+            results['gear_ratio'] = batch['gear_ratio']
+            with producer.lock:
+                stats.extend(results)
+        return results
+
+    # One figure per producer, updated in place for each new sample.
+    # liveplot (matplotlib) is imported here rather than at the top because
+    # the advisory, fleet and engine map modules import this one for the
+    # model alone.
+    from liveplot import LivePlot
+    plot = LivePlot(PLOT_SERIES, xlabel="Time (s)")
+    stats = StreamStats(STATS_CHANNELS)
+    producer = Producer(read, PRODUCER_CHANNELS, HISTORY_SAMPLES, period=1.0, page='performance',
+                        shared={'plot': plot, 'stats': stats}, resources=(source,))
+    return producer.start()
+
+# Table of the latest sample with the rolling statistics
+def table_html(producer):
+    with producer.lock:
+        return generate_table_html(producer.latest(), producer.shared['stats'].summary())
+
+# Producer used when the page is not given one (e.g. run on its own), one
+# per prediction engine
+@st.cache_resource
+def default_producer(engine='equations'):
+    return make_producer(engine=engine)
+
+# Prediction engine picked in the sidebar
+def prediction_engine():
+    return st.sidebar.radio("Prediction engine", list(ENGINES), format_func=ENGINES.get)
+
+# Plot of the retained history as PNG bytes
+# incremental_plot=False rebuilds the figure (and closes it) instead of
+# updating the producer's one
+def plot_png(producer, incremental_plot=True):
+    from liveplot import LivePlot, figure_png
+    if not incremental_plot:
+        _, _, series = producer.snapshot()
+        with LivePlot(PLOT_SERIES, xlabel="Time (s)") as frame:
+            return figure_png(frame.update(series['time'], series))
+    # The shared plot is drawn under the lock, so it reads the history
+    # without copying it
+    with producer.lock:
+        _, _, series = producer.snapshot(copy=False)
+        return figure_png(producer.shared['plot'].update(series['time'], series))
+
+# Main function to display tractor parameters
+# The page polls producer (default: default_producer()) once a second from a
+# fragment, so it never blocks the script and switching pages is instant.
+# A sessionlog.SessionRecorder passed as recorder receives every sample
+# produced while the page is open.  engine names the prediction engine of
+# the default producer (see ENGINES).
+def display_parameters(incremental_plot=True, producer=None, recorder=None, engine='equations'):
+    if producer is None:
+        producer = default_producer(engine)
+
+    st.markdown("<h1>Real-time Tractor Performance Prediction</h1>", unsafe_allow_html=True)
+    if engine == 'surrogate':
+        info = engine_surrogate(engine).info
+        st.caption(f"Torque, fuel and draft from the learned model, fitted on {info['source']} "
+                   f"(held-out R²: torque {info['r2_engine_torque']:.4f}, fuel {info['r2_fuel_consumption']:.4f}, "
+                   f"draft {info['r2_implement_draft']:.4f})")
+
+    @st.fragment(run_every=1.0)
+    def live():
+        params = producer.latest()
+        if params is None:
+            return
+
+        # Persist the samples and results received since the last run
+        if recorder is not None:
+            held, cursor = st.session_state.get('performance_cursor', (None, None))
+            cursor = pump(producer, recorder, cursor if held is recorder else None)
+            st.session_state['performance_cursor'] = (recorder, cursor)
+
+        # Generate the table with icons and larger font
+        with perf.phase('performance', 'render_html'):
+            st.markdown(producer.memo('table', lambda: table_html(producer)), unsafe_allow_html=True)
+
+        # Plot the real-time data with dots and shaded areas
+        with perf.phase('performance', 'render_plot'):
+            png = producer.memo(('plot', incremental_plot), lambda: plot_png(producer, incremental_plot))
+            st.image(png, use_column_width=True)
+
+    live()
+
+# Run the real-time display function
+if __name__ == "__main__":
+    display_parameters(engine=prediction_engine())
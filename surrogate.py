@@ -0,0 +1,197 @@
+# surrogate.py
+import argparse
+import os
+import pickle
+
+import joblib
+import numpy as np
+import sklearn
+import streamlit as st
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+
+from sessionlog import SessionLog, UNITS
+from speednslip import calculate_parameters_batch, gear_ratios
+
+# Learned prediction engine for the Performance Prediction page.
+#
+# Two scikit-learn regressions stand in for the closed-form equations:
+#   - the engine model predicts torque and fuel consumption from throttle
+#     and engine speed,
+#   - the implement model predicts draft from forward speed and depth.
+# Both are polynomial regressions on standardized inputs.  They are fitted
+# on the sessions recorded under sessions/ (see sessionlog.py) or, while
+# fewer than MIN_ROWS usable rows have been logged, on synthetic samples
+# from the closed-form model over the simulator ranges.  The fitted
+# Surrogate is saved to MODEL_PATH with joblib and loaded from there next
+# time, unless it was saved by another scikit-learn version or an older
+# MODEL_VERSION.
+#
+# Predictions are made for whole batches: the producer passes everything
+# its source returned in a tick to calculate_parameters_batch(surrogate=...),
+# which costs one predict() per model instead of one per sample.
+# Predictions skip scikit-learn's finiteness check, so a NaN input gives NaN
+# outputs (as with the equations) instead of an error, and the check's
+# overhead is saved.
+
+SESSIONS_DIR = "sessions"
+MODEL_PATH = os.path.join("models", "surrogate.joblib")
+MIN_ROWS = 1000
+# Raised when the targets change meaning (2: implement draft in kN)
+MODEL_VERSION = 2
+
+ENGINE_FEATURES = ('throttle', 'engine_speed')
+ENGINE_TARGETS = ('engine_torque', 'fuel_consumption')
+IMPLEMENT_FEATURES = ('forward_speed', 'implement_depth')
+IMPLEMENT_TARGETS = ('implement_draft',)
+
+def _matrix(columns, names):
+    return np.column_stack([np.asarray(columns[name], dtype=np.float64) for name in names])
+
+# Finite (features, targets) rows of columns
+def _rows(columns, features, targets):
+    x, y = _matrix(columns, features), _matrix(columns, targets)
+    keep = np.isfinite(x).all(axis=1) & np.isfinite(y).all(axis=1)
+    return x[keep], y[keep]
+
+# Model channels of every session under directory recorded with the
+# closed-form model, concatenated (None when there is none)
+def session_samples(directory=SESSIONS_DIR):
+    channels = ENGINE_FEATURES + ENGINE_TARGETS + IMPLEMENT_FEATURES + IMPLEMENT_TARGETS
+    parts = []
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            try:
+                log = SessionLog(path)
+            except (OSError, ValueError):
+                continue
+            # Sessions recorded in other units (draft in N, before schema
+            # version 2) would mix two scales in one target, and sessions
+            # whose results came from the surrogate would fit it to itself
+            if log.metadata.get('engine') == 'surrogate':
+                continue
+            if len(log) and all(log.units.get(channel) == UNITS[channel] for channel in channels):
+                parts.append(log.query(channels=channels))
+    if not parts:
+        return None
+    return {channel: np.concatenate([part[channel] for part in parts]) for channel in channels}
+
+# Closed-form results at n random operating points over the simulator ranges
+def synthetic_samples(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    return calculate_parameters_batch(
+        rng.uniform(45, 85, n), rng.uniform(1200, 1800, n), rng.uniform(0.8, 4.5, n),
+        rng.uniform(5, 25, n), rng.choice(gear_ratios, n),
+    )
+
+class Surrogate:
+    def __init__(self, degree=5):
+        self.degree = degree
+        self.engine = make_pipeline(StandardScaler(), PolynomialFeatures(degree), LinearRegression())
+        self.implement = make_pipeline(StandardScaler(), PolynomialFeatures(3), LinearRegression())
+        self.info = {}
+
+    # Fit both models on columns, holding out test_size of the rows to
+    # report R^2 per target in self.info
+    def fit(self, columns, source="", test_size=0.2, seed=0):
+        self.info = {'source': source, 'sklearn': sklearn.__version__, 'version': MODEL_VERSION}
+        for name, model, features, targets in (
+            ('engine', self.engine, ENGINE_FEATURES, ENGINE_TARGETS),
+            ('implement', self.implement, IMPLEMENT_FEATURES, IMPLEMENT_TARGETS),
+        ):
+            x, y = _rows(columns, features, targets)
+            if len(x) < 2 * self.degree ** 2:
+                raise ValueError(f"not enough rows to fit {', '.join(targets)}: {len(x)}")
+            x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=test_size, random_state=seed)
+            model.fit(x_train, y_train)
+            predicted = model.predict(x_test).reshape(y_test.shape)
+            for k, target in enumerate(targets):
+                residual = np.sum((y_test[:, k] - predicted[:, k]) ** 2)
+                total = np.sum((y_test[:, k] - y_test[:, k].mean()) ** 2)
+                self.info[f'r2_{target}'] = float(1 - residual / total) if total else float('nan')
+            self.info[f'rows_{name}'] = len(x)
+        return self
+
+    # (engine torque, fuel consumption) arrays, like enginemap.EngineMap
+    def lookup_batch(self, throttle, engine_speed):
+        throttle, engine_speed = np.broadcast_arrays(
+            np.asarray(throttle, dtype=np.float64), np.asarray(engine_speed, dtype=np.float64)
+        )
+        with sklearn.config_context(assume_finite=True):
+            predicted = self.engine.predict(np.column_stack((throttle.ravel(), engine_speed.ravel())))
+        return predicted[:, 0].reshape(throttle.shape), predicted[:, 1].reshape(throttle.shape)
+
+    # Implement draft array
+    def draft_batch(self, forward_speed, implement_depth):
+        forward_speed, implement_depth = np.broadcast_arrays(
+            np.asarray(forward_speed, dtype=np.float64), np.asarray(implement_depth, dtype=np.float64)
+        )
+        with sklearn.config_context(assume_finite=True):
+            predicted = self.implement.predict(np.column_stack((forward_speed.ravel(), implement_depth.ravel())))
+        return predicted.reshape(forward_speed.shape)
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump(self, path)
+
+# Saved Surrogate at path, or None if there is none, it cannot be read
+# (truncated, corrupt or pickled against other code) or it was saved by
+# another scikit-learn version or model version
+def load(path=MODEL_PATH):
+    try:
+        surrogate = joblib.load(path)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError,
+            TypeError, IndexError, KeyError):
+        return None
+    if (not isinstance(surrogate, Surrogate) or surrogate.info.get('sklearn') != sklearn.__version__
+            or surrogate.info.get('version') != MODEL_VERSION):
+        return None
+    return surrogate
+
+# Surrogate fitted on the logged sessions, or on synthetic samples while
+# they hold fewer than min_rows usable rows
+def fit(sessions_dir=SESSIONS_DIR, min_rows=MIN_ROWS, seed=0):
+    columns = session_samples(sessions_dir)
+    if columns is not None:
+        usable = min(len(_rows(columns, ENGINE_FEATURES, ENGINE_TARGETS)[0]),
+                     len(_rows(columns, IMPLEMENT_FEATURES, IMPLEMENT_TARGETS)[0]))
+        if usable >= min_rows:
+            return Surrogate().fit(columns, source=f"{usable} logged samples", seed=seed)
+    return Surrogate().fit(synthetic_samples(seed=seed), source="synthetic samples", seed=seed)
+
+# Saved model, or a new one fitted and saved (kept in memory only if it
+# cannot be written)
+def load_or_fit(path=MODEL_PATH, sessions_dir=SESSIONS_DIR):
+    surrogate = load(path)
+    if surrogate is None:
+        surrogate = fit(sessions_dir)
+        try:
+            surrogate.save(path)
+        except OSError:
+            pass
+    return surrogate
+
+# One model per process, shared by every session
+@st.cache_resource
+def default_surrogate():
+    return load_or_fit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the performance surrogate model on the logged sessions")
+    parser.add_argument('--sessions', default=SESSIONS_DIR)
+    parser.add_argument('--out', default=MODEL_PATH)
+    parser.add_argument('--min-rows', type=int, default=MIN_ROWS)
+    args = parser.parse_args()
+
+    # Fit through the module so the pickle refers to surrogate.Surrogate,
+    # not __main__.Surrogate
+    import surrogate as module
+    surrogate = module.fit(args.sessions, args.min_rows)
+    surrogate.save(args.out)
+    print(f"saved {args.out}: {surrogate.info}")
+
+if __name__ == "__main__":
+    main()
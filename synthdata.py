@@ -0,0 +1,294 @@
+# synthdata.py
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+from advisory import SLIP_NOISE, WHEEL_KMH_PER_RPM, depth_slip
+from fieldcoverage import EARTH_RADIUS_M
+from sessionlog import SESSION_CHANNELS, SessionRecorder
+from speednslip import calculate_parameters_batch, IMPLEMENT_WIDTH
+
+# Seeded synthetic multi-tractor sessions for load-testing the pipeline.
+#
+# Each tractor works its own field in straight passes joined by
+# semicircular headland turns (implement raised), with correlated
+# channels:
+#   - throttle, working depth, engine speed noise, slip noise, GPS drift and
+#     the overflow (return) fuel flow are first-order autoregressive (AR(1))
+#     processes around per-tractor set points, each with its own time
+#     constant;
+#   - engine speed follows throttle and droops with depth (draft load);
+#   - slip grows with depth, and forward speed is the wheel speed in the
+#     tractor's gear less the slip;
+#   - the GPS fix follows the distance travelled along the passes, plus a
+#     slowly drifting bias and white noise;
+#   - the net fuel flow follows throttle and load; the main line carries
+#     the overflow plus the net flow.
+#
+# FleetSimulator.chunk() produces the next n samples of every tractor as
+# (tractors, n) arrays with a handful of NumPy operations per channel.  The
+# AR(1) recursions are solved in closed form over blocks of samples (a
+# scaled cumulative sum) with the state carried between blocks and chunks.
+# Every tractor and noise process draws from its own
+# np.random.SeedSequence child, so a tractor's session depends only on the
+# seed, its index and the sample rate: not on how many other tractors are
+# simulated, and on the chunk size only through rounding (about 1e-14).
+# FleetSimulator(first=k) simulates tractors k, k+1, ... of the same fleet,
+# which write() uses to work through a large fleet a group at a time.
+
+CHANNELS = (
+    'tractor_id', 'time', 'throttle', 'engine_speed', 'forward_speed', 'implement_depth', 'gear_ratio',
+    'slip', 'latitude', 'longitude', 'main_flow_rate', 'overflow_flow_rate',
+)
+
+# Gears used for tillage (low range): 2-5 km/h at working engine speeds
+TILLAGE_GEARS = (160, 120, 80)
+
+# AR(1) processes: name -> (time constant s, stationary standard deviation)
+PROCESSES = {
+    'throttle': (20.0, 3.0),        # %
+    'depth': (10.0, 1.0),           # cm
+    'engine_speed': (2.0, 10.0),    # rpm
+    'slip': (3.0, SLIP_NOISE),      # %
+    'drift_east': (300.0, 1.5),     # m
+    'drift_north': (300.0, 1.5),    # m
+    'overflow': (5.0, 0.03),        # L/min
+}
+GPS_NOISE_M = 0.3
+
+# Tractors write() keeps files open for at once (a session is 17 files)
+WRITE_GROUP = 8
+
+# Largest a ** -k used by the block solution of the AR(1) recursion
+_AR_SCALE_LIMIT = 1e100
+
+# x[t] = a x[t-1] + e[t] along axis 1 of innovations, starting from x0 (one
+# value per row)
+def _ar1(x0, innovations, a):
+    out = np.empty_like(innovations)
+    block = max(1, min(256, int(math.log(_AR_SCALE_LIMIT) / -math.log(a)))) if 0 < a < 1 else 256
+    k = np.arange(1, block + 1)
+    up, down = a ** k, a ** -k.astype(np.float64)
+    for start in range(0, innovations.shape[1], block):
+        e = innovations[:, start:start + block]
+        m = e.shape[1]
+        out[:, start:start + m] = up[:m] * (x0[:, None] + np.cumsum(e * down[:m], axis=1))
+        x0 = out[:, start + m - 1]
+    return out
+
+class FleetSimulator:
+    def __init__(self, tractors=10, rate_hz=10.0, seed=0, latitude=22.31278, longitude=87.33152,
+                 width=IMPLEMENT_WIDTH, gears=TILLAGE_GEARS, first=0):
+        self.tractors = tractors
+        self.rate_hz = rate_hz
+        self.dt = 1.0 / rate_hz
+        self.width = width
+        self.emitted = 0
+
+        # The children SeedSequence(seed).spawn() would give tractors
+        # first..first + tractors - 1
+        children = [np.random.SeedSequence(seed, spawn_key=(first + i,)) for i in range(tractors)]
+        streams = [child.spawn(1 + len(PROCESSES) + 2) for child in children]
+        # Per-tractor set points and field layout
+        params = [np.random.default_rng(s[0]) for s in streams]
+        draws = np.array([rng.random(7) for rng in params]).reshape(tractors, 7)
+        self.tractor_id = np.arange(first + 1, first + tractors + 1, dtype=np.float64)
+        self.throttle_set = 55 + 25 * draws[:, 0]
+        self.depth_set = 8 + 14 * draws[:, 1]
+        self.gear_ratio = np.asarray(gears, dtype=np.float64)[(draws[:, 2] * len(gears)).astype(int)]
+        self.pass_length = 100 + 200 * draws[:, 3]
+        heading = 2 * math.pi * draws[:, 4]
+        self.cos_heading = np.cos(heading)[:, None]
+        self.sin_heading = np.sin(heading)[:, None]
+        self.lat0 = latitude + 0.02 * (draws[:, 5] - 0.5)
+        self.lon0 = longitude + 0.02 * (draws[:, 6] - 0.5)
+
+        # One generator per tractor and noise process
+        self.noise = {name: [np.random.default_rng(s[1 + i]) for s in streams] for i, name in enumerate(PROCESSES)}
+        self.gps_noise = [np.random.default_rng(s[-1]) for s in streams]
+        self.coefficients = {}
+        self.state = {}
+        for name, (tau, sigma) in PROCESSES.items():
+            a = math.exp(-self.dt / tau)
+            self.coefficients[name] = (a, sigma * math.sqrt(1 - a * a))
+            # Start from the stationary distribution
+            self.state[name] = sigma * np.array([rng.standard_normal() for rng in self.noise[name]])
+        self.distance = np.zeros(tractors)
+
+    def _process(self, name, n):
+        a, scale = self.coefficients[name]
+        # Single precision draws are about twice as fast and plenty for noise
+        # (the float64 scale makes the product, and the AR state, double)
+        draws = np.stack([rng.standard_normal(n, dtype=np.float32) for rng in self.noise[name]])
+        innovations = np.float64(scale) * draws
+        values = _ar1(self.state[name], innovations, a)
+        self.state[name] = values[:, -1]
+        return values
+
+    # Position along the passes (metres east and north of the field origin)
+    # and whether the implement is raised, for distances travelled s
+    def _field_position(self, s):
+        spacing = self.width
+        radius = spacing / 2
+        length = self.pass_length[:, None]
+        cycle = length + math.pi * radius
+        k = np.floor(s / cycle)
+        rem = s - k * cycle
+        forward = k % 2 == 0
+        along = np.where(forward, rem, length - rem)
+        across = k * spacing
+        # Turns are a small fraction of the samples, so only they pay for
+        # the trigonometry
+        turning = rem >= length
+        rows, columns = np.nonzero(turning)
+        theta = (rem[rows, columns] - length[rows, 0]) / radius
+        along[rows, columns] = np.where(forward[rows, columns], length[rows, 0] + radius * np.sin(theta),
+                                        -radius * np.sin(theta))
+        across[rows, columns] += radius - radius * np.cos(theta)
+        east = along * self.cos_heading - across * self.sin_heading
+        north = along * self.sin_heading + across * self.cos_heading
+        return east, north, turning
+
+    # Next n samples of every tractor: {channel: (tractors, n) array}
+    def chunk(self, n):
+        shape = (self.tractors, n)
+        t = (self.emitted + np.arange(n)) * self.dt
+        self.emitted += n
+
+        throttle = np.clip(self.throttle_set[:, None] + self._process('throttle', n), 45, 85)
+        depth = np.clip(self.depth_set[:, None] + self._process('depth', n), 3, 30)
+        # Governed engine speed follows the throttle and droops under draft
+        engine_speed = 1200 + (throttle - 45) * 15 - 8 * (depth - 15) + self._process('engine_speed', n)
+        slip = depth_slip(depth, self._process('slip', n))
+        forward_speed = engine_speed / self.gear_ratio[:, None] * WHEEL_KMH_PER_RPM * (1 - slip / 100)
+
+        # Distance at the end of every sample interval, then the pass layout
+        s = self.distance[:, None] + np.cumsum(forward_speed / 3.6 * self.dt, axis=1)
+        self.distance = s[:, -1]
+        east, north, raised = self._field_position(s)
+        depth = np.where(raised, 0.0, depth)
+        # (n, 2) draws keep the east/north pairs the same whatever the chunk size
+        gps = np.stack([rng.standard_normal((n, 2), dtype=np.float32).T for rng in self.gps_noise], axis=1) * GPS_NOISE_M
+        east = east + self._process('drift_east', n) + gps[0]
+        north = north + self._process('drift_north', n) + gps[1]
+        latitude = self.lat0[:, None] + np.degrees(north / EARTH_RADIUS_M)
+        longitude = self.lon0[:, None] + np.degrees(east / (EARTH_RADIUS_M * np.cos(np.radians(self.lat0[:, None]))))
+
+        # Net consumption 2-10 L/h with throttle and load
+        net_lph = 2 + 8 * (throttle - 45) / 40 * (0.4 + 0.6 * depth / 25)
+        overflow = np.clip(1.07 + self._process('overflow', n), 0.95, 1.2)
+
+        return {
+            'tractor_id': np.broadcast_to(self.tractor_id[:, None], shape),
+            'time': np.broadcast_to(t, shape),
+            'throttle': np.round(throttle),
+            'engine_speed': np.round(engine_speed),
+            'forward_speed': forward_speed,
+            'implement_depth': depth,
+            'gear_ratio': np.broadcast_to(self.gear_ratio[:, None], shape),
+            'slip': slip,
+            'latitude': latitude,
+            'longitude': longitude,
+            'main_flow_rate': overflow + net_lph / 60,
+            'overflow_flow_rate': overflow,
+        }
+
+# Whole fleet as flat time-major columns (all tractors at t0, then at t1,
+# ...), like an ingest stream; ingest.encode_frames() turns them into frames
+def generate(tractors=10, duration_s=60.0, rate_hz=10.0, seed=0, chunk_s=60.0, **kwargs):
+    simulator = FleetSimulator(tractors, rate_hz, seed, **kwargs)
+    total = int(round(duration_s * rate_hz))
+    step = max(1, int(round(chunk_s * rate_hz)))
+    parts = []
+    for start in range(0, total, step):
+        chunk = simulator.chunk(min(step, total - start))
+        parts.append({name: values.T.ravel() for name, values in chunk.items()})
+    return {name: np.concatenate([part[name] for part in parts]) if parts else np.empty(0) for name in CHANNELS}
+
+# Session log columns for one tractor's chunk: the samples plus the
+# performance model results (with the measured slip)
+def _session_batch(chunk, i):
+    batch = {name: values[i] for name, values in chunk.items()}
+    results = calculate_parameters_batch(
+        batch['throttle'], batch['engine_speed'], batch['forward_speed'], batch['implement_depth'],
+        batch['gear_ratio'], slip=batch['slip'],
+    )
+    return {**results, **batch}
+
+# Write one session per tractor under directory, streaming chunk_s at a
+# time, as fmt:
+#   'npy'     -> tractor_NNNN.npy structured arrays (telemetry.ReplaySource)
+#   'csv'     -> tractor_NNNN.csv with a header row (telemetry.ReplaySource)
+#   'session' -> tractor_NNNN/ session logs with the model results
+#                (sessionlog.SessionLog, surrogate.py)
+# Tractors are simulated and written group tractors at a time, so the
+# number of open files doesn't grow with the fleet.  Returns the number of
+# rows written.
+def write(directory, fmt='npy', tractors=10, duration_s=3600.0, rate_hz=10.0, seed=0, chunk_s=60.0,
+          group=WRITE_GROUP, **kwargs):
+    if fmt not in ('npy', 'csv', 'session'):
+        raise ValueError(f"unknown format {fmt!r}, expected 'npy', 'csv' or 'session'")
+    os.makedirs(directory, exist_ok=True)
+    for first in range(0, tractors, group):
+        _write_group(directory, fmt, first, min(group, tractors - first), duration_s, rate_hz, seed, chunk_s,
+                     **kwargs)
+    return int(round(duration_s * rate_hz)) * tractors
+
+def _write_group(directory, fmt, first, tractors, duration_s, rate_hz, seed, chunk_s, **kwargs):
+    simulator = FleetSimulator(tractors, rate_hz, seed, first=first, **kwargs)
+    total = int(round(duration_s * rate_hz))
+    step = max(1, int(round(chunk_s * rate_hz)))
+    names = [os.path.join(directory, f"tractor_{first + i + 1:04d}") for i in range(tractors)]
+
+    outputs = []
+    try:
+        # Opened inside the try, so a failure part way closes what is open
+        for name in names:
+            if fmt == 'npy':
+                dtype = np.dtype([(channel, np.float64) for channel in CHANNELS])
+                outputs.append(np.lib.format.open_memmap(name + '.npy', mode='w+', dtype=dtype, shape=(total,)))
+            elif fmt == 'csv':
+                outputs.append(open(name + '.csv', 'w', encoding='utf-8'))
+                outputs[-1].write(','.join(CHANNELS) + '\n')
+            else:
+                outputs.append(SessionRecorder(name, SESSION_CHANNELS, flush_rows=step))
+
+        for start in range(0, total, step):
+            chunk = simulator.chunk(min(step, total - start))
+            for i, output in enumerate(outputs):
+                if fmt == 'npy':
+                    rows = output[start:start + len(chunk['time'][i])]
+                    for name in CHANNELS:
+                        rows[name] = chunk[name][i]
+                elif fmt == 'csv':
+                    np.savetxt(output, np.column_stack([chunk[name][i] for name in CHANNELS]),
+                               delimiter=',', fmt='%.10g')
+                else:
+                    output.append(_session_batch(chunk, i))
+    finally:
+        for output in outputs:
+            if fmt == 'npy':
+                output.flush()
+            else:
+                output.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Write seeded synthetic tractor sessions for load tests")
+    parser.add_argument('directory')
+    parser.add_argument('--format', choices=('npy', 'csv', 'session'), default='npy')
+    parser.add_argument('--tractors', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=3600.0, help="seconds per session")
+    parser.add_argument('--rate', type=float, default=10.0, help="samples per second")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = write(args.directory, args.format, args.tractors, args.duration, args.rate, args.seed)
+    seconds = time.perf_counter() - start
+    print(f"wrote {rows:,} rows to {args.directory} in {seconds:.1f} s ({rows / seconds / 1e6:.2f} M rows/s)")
+
+if __name__ == "__main__":
+    main()
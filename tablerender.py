@@ -0,0 +1,104 @@
+# tablerender.py
+import base64
+import io
+import os
+import threading
+from functools import lru_cache
+from string import Formatter
+
+import streamlit as st
+from PIL import Image
+
+# Parameter tables compiled once and refilled with new values each tick.
+#
+# The pages used to rebuild a large f-string for every sample, with about
+# 16 remote image URLs that the browser could refetch on each render and
+# that break without connectivity in the field.  A TableTemplate parses its
+# str.format layout once into literal chunks and value fields; render()
+# only formats the fields whose value changed since the last call and
+# returns the previous HTML unchanged when none did.
+#
+# Icons are local files under static/.  With server.enableStaticServing on
+# (see .streamlit/config.toml) they are referenced as app/static/<file> and
+# cached by the browser; otherwise they are inlined as data URIs of
+# thumbnails.
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+# Icons are shown at 40-50 px, so inlined copies are shrunk to a WebP
+# thumbnail first (the source PNGs are up to 50 KB)
+INLINE_ICON_PX = 100
+
+# img src for a file in static/
+@lru_cache(maxsize=None)
+def _data_uri(filename):
+    image = Image.open(os.path.join(STATIC_DIR, filename))
+    image.thumbnail((INLINE_ICON_PX, INLINE_ICON_PX))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP")
+    data = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return f"data:image/webp;base64,{data}"
+
+def icon_src(filename):
+    if st.get_option("server.enableStaticServing"):
+        return f"app/static/{filename}"
+    return _data_uri(filename)
+
+class TableTemplate:
+    # template is a str.format layout; icons maps field names to files in
+    # static/ and is resolved when the template is compiled (on first use)
+    def __init__(self, template, icons=None):
+        self.template = template
+        self.icons = dict(icons or {})
+        self.chunks = None
+        self.lock = threading.Lock()
+
+    def _compile(self):
+        self.chunks = []
+        self.fields = []
+        literal = []
+        for text, name, spec, conversion in Formatter().parse(self.template):
+            literal.append(text)
+            if name is None:
+                continue
+            if name in self.icons:
+                literal.append(icon_src(self.icons[name]))
+                continue
+            self.chunks.append("".join(literal))
+            literal = []
+            self.fields.append((name, spec, conversion))
+        self.chunks.append("".join(literal))
+        self.values = [object()] * len(self.fields)
+        self.cells = [""] * len(self.fields)
+        self.html = None
+
+    # HTML for values (a mapping of field name -> value); the second result
+    # tells whether it differs from the previous render
+    def render(self, values):
+        with self.lock:
+            return self._render(values)
+
+    def _render(self, values):
+        if self.chunks is None:
+            self._compile()
+        changed = False
+        for k, (name, spec, conversion) in enumerate(self.fields):
+            value = values[name]
+            if value == self.values[k] and type(value) is type(self.values[k]):
+                continue
+            self.values[k] = value
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            self.cells[k] = format(value, spec)
+            changed = True
+        if changed or self.html is None:
+            parts = [self.chunks[0]]
+            for cell, chunk in zip(self.cells, self.chunks[1:]):
+                parts.append(cell)
+                parts.append(chunk)
+            self.html = "".join(parts)
+        return self.html, changed
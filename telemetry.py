@@ -0,0 +1,162 @@
+# telemetry.py
+import os
+import time
+import numpy as np
+
+from samples import Batch, record_type
+
+# Pluggable telemetry sources for the dashboard pages.
+#
+# A source hands out everything that arrived since the previous read() as a
+# samples.Batch of equal-length NumPy columns, always including a 'time'
+# column in seconds.  Pages consume whole batches, so a source producing
+# hundreds of samples per second costs the page loop one call per tick, not
+# one per sample.
+class TelemetrySource:
+    channels = ()
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Last sample of a batch (a Batch or a dict of columns) as a record of plain
+# Python values, or None for an empty batch
+def latest(batch):
+    if not batch or not len(next(iter(batch.values()))):
+        return None
+    if isinstance(batch, Batch):
+        return batch.record()
+    return record_type(batch)(*(values[-1].item() for values in batch.values()))
+
+# Wraps the page's random generators.
+#
+# generators maps channel name -> callable.  Channels listed in initial are
+# random walks: their generator receives the previous value (e.g.
+# generate_latitude(current_lat)).  With rate_hz=None every read() yields one
+# sample, which is how the pages have always behaved; with a rate, read()
+# yields as many samples as have come due since the last call.  Samples are
+# written channel by channel straight into the rows of one float64 block.
+class SimulatorSource(TelemetrySource):
+    def __init__(self, generators, initial=None, rate_hz=None, clock=time.monotonic):
+        self.generators = dict(generators)
+        self.state = dict(initial or {})
+        self.channels = ('time',) + tuple(self.generators)
+        self.rate_hz = rate_hz
+        self.clock = clock
+        self.start = clock()
+        self.emitted = 0
+
+    def read(self):
+        elapsed = self.clock() - self.start
+        if self.rate_hz is None:
+            n = 1
+        else:
+            n = max(int(elapsed * self.rate_hz) + 1 - self.emitted, 0)
+        batch = Batch.empty(self.channels, n)
+        if self.rate_hz is None:
+            batch['time'][0] = elapsed
+        else:
+            np.divide(np.arange(self.emitted, self.emitted + n), self.rate_hz, out=batch['time'])
+        self.emitted += n
+
+        for name, generate in self.generators.items():
+            values = batch[name]
+            if name in self.state:
+                state = self.state[name]
+                for i in range(n):
+                    values[i] = state = generate(state)
+                self.state[name] = state
+            else:
+                for i in range(n):
+                    values[i] = generate()
+        return batch
+
+# Streams a recorded log back at real time (speed=1) or N times faster.
+#
+# Accepts a numeric CSV file with a header row or a binary .npy structured array;
+# .npy logs are memory-mapped so long recordings are not read up front.  The
+# time column must be in seconds and non-decreasing.  Each read() returns the
+# slice of rows whose recorded time has been reached, so arbitrarily high
+# sample rates cost one slice per channel.  With loop=True playback restarts
+# at the end of the log, otherwise read() returns empty batches.
+class ReplaySource(TelemetrySource):
+    def __init__(self, path, speed=1.0, loop=False, time_channel='time', clock=time.monotonic):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+
+        data = load_log(path)
+        if time_channel not in data:
+            raise ValueError(f"{path} has no '{time_channel}' column")
+        times = data.pop(time_channel)
+        self.columns = {'time': times, **data}
+        self.channels = tuple(self.columns)
+        self.origin = float(times[0]) if len(times) else 0.0
+        # One lap spans the recording plus one mean sample interval, so the
+        # first sample of the next lap does not land on the last of this one
+        span = float(times[-1]) - self.origin if len(times) else 0.0
+        self.duration = span + span / (len(times) - 1) if len(times) > 1 else 0.0
+        self.cursor = 0
+        self.lap = 0
+        self.start = clock()
+
+    def _slice(self, begin, end, offset):
+        batch = Batch({name: values[begin:end] for name, values in self.columns.items()})
+        if offset:
+            batch['time'] = batch['time'] + offset
+        return batch
+
+    def read(self):
+        times = self.columns['time']
+        position = self.origin + (self.clock() - self.start) * self.speed
+        if self.loop and self.duration > 0:
+            lap = int((position - self.origin) // self.duration)
+            position -= lap * self.duration
+            if lap != self.lap:
+                # Finish the previous lap before starting the new one
+                tail = self._slice(self.cursor, len(times), self.lap * self.duration)
+                self.cursor, self.lap = 0, lap
+                head = self._slice(0, np.searchsorted(times, position, side='right'), lap * self.duration)
+                self.cursor = len(head['time'])
+                return Batch({name: np.concatenate((tail[name], head[name])) for name in self.channels})
+
+        end = int(np.searchsorted(times, position, side='right'))
+        batch = self._slice(self.cursor, end, self.lap * self.duration)
+        self.cursor = max(self.cursor, end)
+        return batch
+
+    @property
+    def finished(self):
+        return not self.loop and self.cursor >= len(self.columns['time'])
+
+# Columns of a recorded CSV (numeric, header row) or .npy structured-array log
+def load_log(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        records = np.load(path, mmap_mode='r')
+        return {name: records[name] for name in records.dtype.names}
+    if extension == '.csv':
+        with open(path, encoding='utf-8') as f:
+            names = [name.strip() for name in f.readline().split(',')]
+        values = np.loadtxt(path, delimiter=',', skiprows=1, ndmin=2)
+        return {name: values[:, i].copy() for i, name in enumerate(names)}
+    raise ValueError(f"unsupported telemetry log format: {path}")
+
+# Write columns as a binary .npy structured-array log readable by ReplaySource
+def save_log(path, columns):
+    names = list(columns)
+    records = np.empty(len(columns[names[0]]), dtype=[(name, np.asarray(columns[name]).dtype) for name in names])
+    for name in names:
+        records[name] = columns[name]
+    np.save(path, records)
@@ -0,0 +1,61 @@
+# The NumPy batch path of the performance model must agree with the scalar
+# path it replaced, row for row.
+# Run from the repository root:  python -m pytest tests
+import warnings
+import numpy as np
+
+from speednslip import RESULT_FIELDS, calculate_parameters_batch, compute_parameters, gear_ratios
+
+TOLERANCE = 1e-9
+
+def make_inputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.integers(45, 86, n).astype(np.float64),
+        rng.integers(1200, 1401, n).astype(np.float64),
+        np.round(rng.uniform(1.8, 4.5, n), 2),
+        np.round(rng.uniform(5, 25, n), 2),
+        rng.choice(gear_ratios, n).astype(np.float64),
+    )
+
+# Engine map giving no torque at all, so engine power is exactly zero
+class ZeroTorqueMap:
+    def lookup(self, throttle, engine_speed):
+        return 0.0, 1.5
+
+    def lookup_batch(self, throttle, engine_speed):
+        return np.zeros_like(throttle), np.full_like(throttle, 1.5)
+
+def assert_rows_match(inputs, **kwargs):
+    batch = calculate_parameters_batch(*inputs, **kwargs)
+    for k, row in enumerate(zip(*(values.tolist() for values in inputs))):
+        scalar = compute_parameters(*row, **kwargs)
+        for name in RESULT_FIELDS:
+            expected, actual = scalar[name], batch[name][k]
+            if expected != expected:
+                assert actual != actual, (name, row, expected, actual)
+            else:
+                assert abs(actual - expected) <= TOLERANCE * max(abs(expected), 1.0), (name, row, expected, actual)
+    return batch
+
+def test_batch_matches_scalar():
+    assert_rows_match(make_inputs(2000))
+
+def test_zero_forward_speed_matches_scalar():
+    # Fuel per area is guarded against a standing tractor
+    assert_rows_match(tuple(np.array(values, dtype=np.float64) for values in (
+        [60, 75], [1300, 1350], [0.0, 0.0], [10, 20], [80, 40],
+    )))
+
+def test_zero_engine_power_matches_scalar():
+    # Specific fuel consumption and tractive efficiency are guarded against
+    # zero engine power, in both paths and without a division warning
+    inputs = tuple(np.array(values, dtype=np.float64) for values in (
+        [60, 75, 50], [1300, 1350, 1250], [2.5, 0.0, 3.1], [10, 20, 15], [80, 40, 120],
+    ))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        batch = assert_rows_match(inputs, engine_map=ZeroTorqueMap())
+    assert np.all(batch['engine_power'] == 0)
+    assert np.all(np.isfinite(batch['specific_fuel_consumption']))
+    assert np.all(np.isfinite(batch['tractive_efficiency']))
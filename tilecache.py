@@ -0,0 +1,366 @@
+# tilecache.py
+import argparse
+import ipaddress
+import math
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline map tiles for the GPS page.
+#
+# TileCache keeps XYZ tiles on disk as directory/z/x/y.png (the layout tile
+# servers and tools use, so a cache directory can itself be the upstream of
+# another cache) with an LRU tier of recently served tiles in memory.  A
+# tile missing from both is read through from the upstream provider, an
+# http(s) URL template or a local directory of tiles, and written to disk;
+# when the upstream fails the tile is not asked for again for retry_after
+# seconds, so a page without connectivity doesn't wait on a timeout per
+# tile on every rebuild.  upstream=None serves only what is on disk.  The
+# cache stops writing new tiles once the directory holds max_disk_bytes;
+# they are still served, from the memory tier.
+#
+# seed() downloads every tile of a bounding box over a range of zooms
+# ahead of time, for a field that is mapped before going out to it:
+#
+#     python tilecache.py seed --bounds 22.30 87.32 22.32 87.34 --zooms 13 18
+#
+# TileServer serves the cache over HTTP from a thread, at the URL template
+# given to the folium tile layer in place of the online one.  Tiles are
+# sent with a long Cache-Control max-age, so the browser doesn't request
+# them again when the map is rebuilt.  It is the viewer's browser that
+# fetches the tiles, so the template names the server as the browser
+# reaches it: url_for(host) with the host the page was loaded from, or
+# public_url when the server sits behind a proxy or another name.
+#
+# A server bound to anything but loopback refuses a cache that reads
+# through from an http(s) upstream: it would let anyone on the network
+# download tiles through this machine, past the seed() limits below.
+# Such a server serves the seeded cache only.
+#
+# The OpenStreetMap tile servers ask that tiles are not bulk downloaded;
+# seed() refuses ranges of more than max_tiles tiles and fetches with a
+# couple of connections, and every request carries a User-Agent naming the
+# application and where to reach its maintainers, as their tile usage
+# policy requires.  Deployments should put their own contact in
+# user_agent.
+
+DEFAULT_UPSTREAM = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+ATTRIBUTION = '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+USER_AGENT = "TracAdvise-tilecache/1.0 (+https://github.com/Ambuj-coder1997/TracAdvise)"
+DEFAULT_DIRECTORY = "tiles"
+DEFAULT_PORT = 9872
+MAX_SEED_TILES = 5000
+MAX_DISK_BYTES = 256 * 2 ** 20
+MAX_ZOOM = 19                  # highest zoom of the OpenStreetMap standard layer
+BROWSER_MAX_AGE = 7 * 24 * 3600
+MAX_LATITUDE = 85.0511287798
+
+# Tile (x, y) containing a position at zoom z (Web Mercator)
+def tile_of(latitude, longitude, z):
+    n = 2 ** z
+    latitude = math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude)))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(latitude)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+# Every (z, x, y) covering bounds (south, west, north, east) at the zooms
+# min_zoom..max_zoom
+def tiles_in(bounds, min_zoom, max_zoom):
+    south, west, north, east = bounds
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = tile_of(north, west, z)
+        x1, y1 = tile_of(south, east, z)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+def count_tiles(bounds, min_zoom, max_zoom):
+    south, west, north, east = bounds
+    total = 0
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = tile_of(north, west, z)
+        x1, y1 = tile_of(south, east, z)
+        total += (x1 - x0 + 1) * (y1 - y0 + 1)
+    return total
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+# URL or path template with {z}, {x} and {y}; a directory of tiles stands
+# for directory/{z}/{x}/{y}.png
+def _template(upstream):
+    if upstream is None or '{z}' in upstream:
+        return upstream
+    if upstream.startswith('file://'):
+        upstream = upstream[len('file://'):]
+    return os.path.join(upstream, '{z}', '{x}', '{y}.png')
+
+def remote(template):
+    return template is not None and template.startswith(('http://', 'https://'))
+
+# Whether a server bound to host is reachable from this machine only
+def loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+# Bytes of the tiles under directory
+def _directory_bytes(directory):
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.endswith('.png'):
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total
+
+class TileStats:
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.fetched = 0
+        self.fetch_failures = 0
+        self.missing = 0
+        self.not_stored = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+class TileCache:
+    def __init__(self, directory=DEFAULT_DIRECTORY, upstream=DEFAULT_UPSTREAM, memory_bytes=32 * 2 ** 20,
+                 timeout=5.0, retry_after=60.0, user_agent=USER_AGENT, max_disk_bytes=MAX_DISK_BYTES):
+        self.directory = directory
+        self.upstream = _template(upstream)
+        self.memory_bytes = memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.user_agent = user_agent
+        self.stats = TileStats()
+        self._memory = OrderedDict()   # (z, x, y) -> bytes, least recently used first
+        self._held = 0
+        self._failed = {}              # (z, x, y) -> time of the last failed fetch
+        self._disk_bytes = None        # bytes on disk, counted at the first store
+        self._lock = threading.Lock()
+
+    def path(self, z, x, y):
+        return os.path.join(self.directory, str(z), str(x), f"{y}.png")
+
+    # Tile bytes, or None if it is neither cached nor available upstream
+    def get(self, z, x, y):
+        key = (z, x, y)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return data
+        if not valid_tile(z, x, y):
+            return None
+        data = self._load(key)
+        if data is None:
+            with self._lock:
+                self.stats.missing += 1
+            return None
+        with self._lock:
+            self._remember(key, data)
+        return data
+
+    # From disk, else from upstream onto disk
+    def _load(self, key):
+        try:
+            with open(self.path(*key), 'rb') as f:
+                data = f.read()
+            with self._lock:
+                self.stats.disk_hits += 1
+            return data
+        except FileNotFoundError:
+            pass
+        data = self._fetch(key)
+        if data is not None:
+            self._store(key, data)
+            with self._lock:
+                self.stats.fetched += 1
+        return data
+
+    def _fetch(self, key):
+        if self.upstream is None:
+            return None
+        failed = self._failed.get(key)
+        if failed is not None and time.monotonic() - failed < self.retry_after:
+            return None
+        z, x, y = key
+        source = self.upstream.format(z=z, x=x, y=y)
+        try:
+            if remote(source):
+                request = urllib.request.Request(source, headers={'User-Agent': self.user_agent})
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    data = response.read()
+            else:
+                with open(source, 'rb') as f:
+                    data = f.read()
+        except (OSError, ValueError):
+            with self._lock:
+                self._failed[key] = time.monotonic()
+                self.stats.fetch_failures += 1
+            return None
+        self._failed.pop(key, None)
+        return data
+
+    # Written under a temporary name and renamed, so a reader never sees a
+    # partial tile; not written once the cache holds max_disk_bytes
+    def _store(self, key, data):
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = _directory_bytes(self.directory)
+            if self.max_disk_bytes is not None and self._disk_bytes + len(data) > self.max_disk_bytes:
+                self.stats.not_stored += 1
+                return
+            self._disk_bytes += len(data)
+        path = self.path(*key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{threading.get_ident()}.part"
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._held -= len(previous)
+        self._memory[key] = data
+        self._held += len(data)
+        while self._held > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._held -= len(evicted)
+
+    # Download the tiles of bounds (south, west, north, east) at zooms
+    # min_zoom..max_zoom that are not on disk yet.  Seeded tiles go to disk
+    # only, not into the memory tier.  Returns (already cached, fetched,
+    # failed).
+    def seed(self, bounds, min_zoom, max_zoom, workers=2, max_tiles=MAX_SEED_TILES):
+        total = count_tiles(bounds, min_zoom, max_zoom)
+        if total > max_tiles:
+            raise ValueError(f"{total} tiles in {bounds} at zoom {min_zoom}-{max_zoom}, more than {max_tiles}")
+        missing = [key for key in tiles_in(bounds, min_zoom, max_zoom) if not os.path.exists(self.path(*key))]
+        with ThreadPoolExecutor(max(1, workers)) as pool:
+            loaded = list(pool.map(self._load, missing))
+        failed = sum(data is None for data in loaded)
+        return total - len(missing), len(missing) - failed, failed
+
+_TILE_PATH = re.compile(r"/(\d+)/(\d+)/(\d+)\.png")
+
+class _TileHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        match = _TILE_PATH.fullmatch(self.path.split('?', 1)[0])
+        data = self.server.cache.get(*map(int, match.groups())) if match else None
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg' if data[:3] == b'\xff\xd8\xff' else 'image/png')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', f'public, max-age={BROWSER_MAX_AGE}')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class TileServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cache, host='127.0.0.1', port=DEFAULT_PORT, public_url=None):
+        if remote(cache.upstream) and not loopback(host):
+            raise ValueError(f"a tile server on {host} would read through to {cache.upstream}: "
+                             "serve the cache only (upstream=None) or bind to loopback")
+        self.cache = cache
+        self.public_url = public_url
+        super().__init__((host, port), _TileHandler)
+
+    # Tile URL template for the folium tile layer.  A server bound to every
+    # interface is named by host, the name the browser reaches this machine
+    # by (default: loopback); otherwise by the address it is bound to.
+    def url_for(self, host=None):
+        if self.public_url is not None:
+            return self.public_url
+        bound, port = self.server_address[:2]
+        if bound not in ('', '0.0.0.0', '::'):
+            host = bound
+        elif not host:
+            host = '127.0.0.1'
+        if ':' in host:
+            host = f"[{host}]"
+        return f"http://{host}:{port}/{{z}}/{{x}}/{{y}}.png"
+
+    @property
+    def url(self):
+        return self.url_for()
+
+# Server for cache running in a daemon thread; port 0 (or a port already in
+# use) picks a free one
+def start_in_thread(cache, host='127.0.0.1', port=DEFAULT_PORT, public_url=None):
+    try:
+        server = TileServer(cache, host, port, public_url)
+    except OSError:
+        server = TileServer(cache, host, 0, public_url)
+    threading.Thread(target=server.serve_forever, name='tile-server', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-seed and serve the offline map tile cache")
+    parser.add_argument('mode', choices=('seed', 'serve'))
+    parser.add_argument('--directory', default=DEFAULT_DIRECTORY)
+    parser.add_argument('--upstream', default=DEFAULT_UPSTREAM,
+                        help="tile URL template or directory of z/x/y.png tiles; 'none' serves the cache only")
+    parser.add_argument('--bounds', type=float, nargs=4, metavar=('SOUTH', 'WEST', 'NORTH', 'EAST'))
+    parser.add_argument('--zooms', type=int, nargs=2, metavar=('MIN', 'MAX'), default=(13, 18))
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-tiles', type=int, default=MAX_SEED_TILES)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--public-url',
+                        help="tile URL template browsers fetch from, when it isn't http://HOST:PORT/{z}/{x}/{y}.png")
+    parser.add_argument('--user-agent', default=USER_AGENT,
+                        help="User-Agent sent upstream, naming the application and a contact")
+    parser.add_argument('--max-disk-mb', type=float, default=MAX_DISK_BYTES / 2 ** 20)
+    args = parser.parse_args()
+
+    upstream = None if args.upstream == 'none' else args.upstream
+    if args.mode == 'serve' and remote(_template(upstream)) and not loopback(args.host):
+        print(f"serving on {args.host}: cached tiles only, not read through from {upstream}")
+        upstream = None
+    cache = TileCache(args.directory, upstream, user_agent=args.user_agent,
+                      max_disk_bytes=int(args.max_disk_mb * 2 ** 20))
+    if args.mode == 'seed':
+        if args.bounds is None:
+            parser.error("seed needs --bounds")
+        start = time.perf_counter()
+        cached, fetched, failed = cache.seed(args.bounds, *args.zooms, workers=args.workers,
+                                             max_tiles=args.max_tiles)
+        print(f"{cached} tiles already cached, {fetched} fetched, {failed} failed "
+              f"in {time.perf_counter() - start:.1f} s")
+        if cache.stats.not_stored:
+            print(f"{cache.stats.not_stored} fetched tiles not stored: the cache is at --max-disk-mb")
+    else:
+        server = TileServer(cache, args.host, args.port, args.public_url)
+        print(f"serving {args.directory} at {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
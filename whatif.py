@@ -0,0 +1,197 @@
+# whatif.py
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from advisory import SLIP_NOISE, depth_slip, forward_speed
+from metricgraph import performance_graph
+from speednslip import gear_options, IMPLEMENT_WIDTH, SOIL_FACTOR
+
+# Monte Carlo what-if simulation for gear and depth planning.
+#
+# Operating points are drawn from the ranges the performance page
+# generators (speednslip.generate_*) encode, and every point is evaluated
+# in every gear, so the gears are compared on the same points.  Those
+# generators draw slip independently of depth and speed; here it follows
+# the depth through advisory.depth_slip(), the model synthdata uses, and
+# the forward speed in a gear follows from the engine speed, the gear ratio
+# and the slip (advisory.forward_speed).  A metricgraph performance graph
+# evaluates them: after the first gear only the nodes downstream of the
+# forward speed are recomputed; torque, fuel flow and engine power are
+# reused.  The points are split into fixed-size chunks, each drawn from its
+# own child of one np.random.SeedSequence: the result depends only on the
+# seed, the sample count and the chunk size, never on how many workers ran
+# the chunks or in which order they finished.
+#
+# Chunks run in a process pool and return fixed-bin histograms per (gear,
+# metric) rather than samples, so merging is a sum of counts and the memory
+# per chunk stays constant.  The bin edges are quantiles of a small pilot
+# sample (drawn from its own seed child), so the bins are narrow where the
+# values are dense: the polynomials give heavy tails that equal-width bins
+# would spend almost all their resolution on.  Values outside the pilot
+# range go to under/overflow bins that reach the exact minimum and maximum.
+# Percentiles are interpolated inside their bin, so they are within one bin
+# of the exact ones.  Non-finite results are counted and left out.
+
+METRICS = ('fuel_consumption_area', 'drawbar_power', 'tractive_efficiency')
+PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_SIZE = 200_000
+BINS = 4096
+PILOT_SIZE = 100_000
+
+# Operating points as drawn by the speednslip generators: integer throttle
+# and engine speed, depth rounded to 2 decimals.  The slip (%) is not one
+# of their ranges but advisory.depth_slip() of the depth with independent
+# noise, the stationary spread of synthdata's slip process.
+def sample_operating_points(rng, n):
+    depth = np.round(rng.uniform(5, 25, n), 2)
+    return {
+        'throttle': rng.integers(45, 86, n).astype(np.float64),
+        'engine_speed': rng.integers(1200, 1401, n).astype(np.float64),
+        'implement_depth': depth,
+        'slip': depth_slip(depth, rng.normal(0, SLIP_NOISE, n)),
+    }
+
+# {gear name: {metric: values}} for n points drawn from seed
+def _evaluate(seed, n, width, soil_factor):
+    points = sample_operating_points(np.random.default_rng(seed), n)
+    graph = performance_graph(METRICS, width, soil_factor, measured_slip=True)
+    results = {}
+    for gear, ratio in gear_options.items():
+        speed = forward_speed(points['engine_speed'], ratio, points['slip'])
+        graph.update(gear_ratio=ratio, forward_speed=speed, **points)
+        results[gear] = {metric: graph[metric] for metric in METRICS}
+    return results
+
+# Histograms of one chunk: {gear: {metric: (counts, low, high, sum, invalid)}}
+# where counts holds [underflow, bins..., overflow] for the bin edges of
+# that gear and metric
+def _run_chunk(seed, n, edges, width, soil_factor):
+    histograms = {}
+    for gear, metrics in _evaluate(seed, n, width, soil_factor).items():
+        histograms[gear] = {}
+        for metric, values in metrics.items():
+            # Sorting first and looking the edges up in the sorted values is
+            # several times faster than looking every value up in the edges
+            finite = np.sort(values[np.isfinite(values)])
+            below = np.searchsorted(finite, edges[gear][metric], side='left')
+            counts = np.diff(below, prepend=0, append=len(finite))
+            histograms[gear][metric] = (
+                counts,
+                finite[0] if len(finite) else np.inf,
+                finite[-1] if len(finite) else -np.inf,
+                float(finite.sum()),
+                len(values) - len(finite),
+            )
+    return histograms
+
+def _merge(total, chunk):
+    if total is None:
+        return chunk
+    for gear, metrics in chunk.items():
+        for metric, (counts, low, high, value_sum, invalid) in metrics.items():
+            t_counts, t_low, t_high, t_sum, t_invalid = total[gear][metric]
+            total[gear][metric] = (t_counts + counts, min(t_low, low), max(t_high, high),
+                                   t_sum + value_sum, t_invalid + invalid)
+    return total
+
+# Bin edges per gear and metric: BINS + 1 quantiles of the pilot sample
+# (fewer where values repeat)
+def _pilot_edges(seed, width, soil_factor):
+    edges = {}
+    for gear, metrics in _evaluate(seed, PILOT_SIZE, width, soil_factor).items():
+        edges[gear] = {}
+        for metric, values in metrics.items():
+            finite = np.sort(values[np.isfinite(values)])
+            if not len(finite):
+                finite = np.zeros(1)
+            ranks = np.linspace(0, len(finite) - 1, BINS + 1).round().astype(np.intp)
+            edges[gear][metric] = np.unique(finite[ranks])
+    return edges
+
+# Percentile q (0-100) of a merged histogram, interpolated within its bin
+def _percentile(counts, edges, low, high, q):
+    total = counts.sum()
+    if not total:
+        return float('nan')
+    # Bin boundaries, the under/overflow bins reaching the extremes
+    bounds = np.concatenate(([min(low, edges[0])], edges, [max(high, edges[-1])]))
+    cumulative = np.cumsum(counts)
+    rank = q / 100 * total
+    k = min(int(np.searchsorted(cumulative, rank, side='left')), len(counts) - 1)
+    before = cumulative[k - 1] if k else 0
+    fraction = (rank - before) / counts[k] if counts[k] else 0.0
+    value = bounds[k] + fraction * (bounds[k + 1] - bounds[k])
+    return float(min(max(value, low), high))
+
+# One pool per process, created on first use.  Workers come from a fork
+# server (where available) that has this module preloaded, so they neither
+# inherit the threads of a running Streamlit server nor re-import the model
+# per task.
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool(workers):
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            if sys.platform != 'win32' and 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            pool = _pools[workers] = ProcessPoolExecutor(workers, mp_context=context)
+        return pool
+
+# Distribution of fuel per tilled area, drawbar power and tractive
+# efficiency in each gear over samples random operating points.
+#
+# Returns {'gears': {gear: {metric: {'p5': ..., 'mean': ..., 'invalid': ...}}},
+# 'samples': ..., 'seed': ..., 'seconds': ...}, where invalid counts the
+# non-finite results.  workers defaults to the CPU count; workers=1 runs in
+# this process.
+def simulate(samples=2_000_000, seed=0, workers=None, percentiles=PERCENTILES, chunk_size=CHUNK_SIZE,
+             width=IMPLEMENT_WIDTH, soil_factor=SOIL_FACTOR):
+    if samples < 1:
+        raise ValueError(f"samples must be at least 1, got {samples}")
+    start = time.perf_counter()
+    pilot, *chunks = np.random.SeedSequence(seed).spawn(1 + -(-samples // chunk_size))
+    sizes = [min(chunk_size, samples - k * chunk_size) for k in range(len(chunks))]
+    edges = _pilot_edges(pilot, width, soil_factor)
+
+    workers = workers or os.cpu_count() or 1
+    total = None
+    if workers == 1 or len(chunks) == 1:
+        for chunk, n in zip(chunks, sizes):
+            total = _merge(total, _run_chunk(chunk, n, edges, width, soil_factor))
+    else:
+        pool = _pool(workers)
+        futures = [pool.submit(_run_chunk, chunk, n, edges, width, soil_factor) for chunk, n in zip(chunks, sizes)]
+        # Merged in submission order; integer counts make the order
+        # irrelevant anyway, and the float sums are then reproducible too
+        for future in futures:
+            total = _merge(total, future.result())
+
+    gears = {}
+    for gear, metrics in total.items():
+        gears[gear] = {}
+        for metric, (counts, low, high, value_sum, invalid) in metrics.items():
+            row = {f'p{q:g}': _percentile(counts, edges[gear][metric], low, high, q) for q in percentiles}
+            valid = int(counts.sum())
+            row['mean'] = value_sum / valid if valid else float('nan')
+            row['invalid'] = int(invalid)
+            gears[gear][metric] = row
+    return {'gears': gears, 'samples': samples, 'seed': seed, 'seconds': time.perf_counter() - start}
+
+# Rows (one per gear and metric) for a table of simulate()'s result
+def percentile_rows(result):
+    return [
+        {'gear': gear, 'ratio': gear_options[gear], 'metric': metric, **row}
+        for gear, metrics in result['gears'].items()
+        for metric, row in metrics.items()
+    ]
@@ -0,0 +1,202 @@
+# windowstats.py
+import math
+from collections import deque
+
+# Rolling statistics over the last few minutes of a channel, in O(1) per
+# sample whatever the window length.
+#
+# Each WindowStats keeps the samples of its window in a deque and, next to
+# it:
+#   - two monotonic deques for the minimum and maximum (each sample enters
+#     and leaves each deque once),
+#   - a running mean and sum of squared deviations (Welford's update, with
+#     the matching downdate when a sample expires) for the standard
+#     deviation,
+#   - a QuantileSketch for p95.
+# StreamStats bundles one WindowStats per (channel, window) and is fed whole
+# batches.  Windows are measured on the batch time channel, so replayed
+# sessions aggregate over their own clock.  NaN samples are ignored.
+
+# Rolling windows shown on the pages (seconds)
+WINDOWS = (60, 300, 900)
+
+# Streaming quantile estimate with a bounded relative error.
+#
+# Values are counted in logarithmic buckets (bucket k holds |x| in
+# (gamma^(k-1), gamma^k]), so any quantile is within relative_accuracy of
+# the exact one and removing a value is as cheap as adding it.  The number
+# of buckets grows with the log of the value range, not the sample count.
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _bucket(self, x):
+        return math.ceil(math.log(abs(x)) / self.log_gamma)
+
+    def _update(self, x, n):
+        self.count += n
+        if x == 0:
+            self.zeros += n
+            return
+        buckets = self.positive if x > 0 else self.negative
+        k = self._bucket(x)
+        remaining = buckets.get(k, 0) + n
+        if remaining:
+            buckets[k] = remaining
+        else:
+            del buckets[k]
+
+    def add(self, x):
+        self._update(x, 1)
+
+    def remove(self, x):
+        self._update(x, -1)
+
+    def _value(self, k):
+        return 2 * self.gamma ** k / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for k in sorted(self.negative, reverse=True):
+            seen += self.negative[k]
+            if seen > rank:
+                return -self._value(k)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.positive):
+            seen += self.positive[k]
+            if seen > rank:
+                return self._value(k)
+        return self._value(max(self.positive))
+
+# Mean, standard deviation, min, max and p95 of the samples whose time lies
+# within window_seconds of the newest one
+class WindowStats:
+    def __init__(self, window_seconds, relative_accuracy=0.01):
+        self.window_seconds = window_seconds
+        self.samples = deque()
+        self.minima = deque()
+        self.maxima = deque()
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.added = 0
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, t, x):
+        if math.isnan(x):
+            return
+        self.expire(t)
+        # Samples are tagged with their arrival number so the extremum
+        # deques can tell which entry is leaving even with repeated times
+        i = self.added
+        self.added += 1
+        self.samples.append((i, t, x))
+        while self.minima and self.minima[-1][1] > x:
+            self.minima.pop()
+        self.minima.append((i, x))
+        while self.maxima and self.maxima[-1][1] < x:
+            self.maxima.pop()
+        self.maxima.append((i, x))
+        self.sketch.add(x)
+
+        # Welford update
+        delta = x - self.mean
+        self.mean += delta / len(self.samples)
+        self.m2 += delta * (x - self.mean)
+
+    # Drop the samples older than the window ending at time now
+    def expire(self, now):
+        cutoff = now - self.window_seconds
+        while self.samples and self.samples[0][1] <= cutoff:
+            i, _, x = self.samples.popleft()
+            if self.minima[0][0] == i:
+                self.minima.popleft()
+            if self.maxima[0][0] == i:
+                self.maxima.popleft()
+            self.sketch.remove(x)
+
+            # Welford downdate
+            n = len(self.samples)
+            if not n:
+                self.mean = self.m2 = 0.0
+                continue
+            delta = x - self.mean
+            self.mean -= delta / n
+            self.m2 = max(self.m2 - delta * (x - self.mean), 0.0)
+
+    def summary(self):
+        n = len(self.samples)
+        if not n:
+            return {'count': 0, 'mean': math.nan, 'std': math.nan, 'min': math.nan, 'max': math.nan, 'p95': math.nan}
+        return {
+            'count': n,
+            'mean': self.mean,
+            'std': math.sqrt(self.m2 / (n - 1)) if n > 1 else 0.0,
+            'min': self.minima[0][1],
+            'max': self.maxima[0][1],
+            'p95': self.sketch.quantile(0.95),
+        }
+
+# WindowStats for several channels and windows, fed with column batches
+class StreamStats:
+    def __init__(self, channels, windows=WINDOWS, time_channel='time', relative_accuracy=0.01):
+        self.channels = tuple(channels)
+        self.windows = tuple(windows)
+        self.time_channel = time_channel
+        self.stats = {
+            name: {window: WindowStats(window, relative_accuracy) for window in self.windows}
+            for name in self.channels
+        }
+
+    def extend(self, columns):
+        times = columns[self.time_channel].tolist()
+        for name in self.channels:
+            values = columns[name].tolist()
+            for window_stats in self.stats[name].values():
+                for t, x in zip(times, values):
+                    window_stats.add(t, x)
+
+    # {channel: {window seconds: summary dict}}
+    def summary(self):
+        return {
+            name: {window: stats.summary() for window, stats in windows.items()}
+            for name, windows in self.stats.items()
+        }
+
+# Table cells for the pages: one <td> per window with the mean ± standard
+# deviation, range and p95 of channel, empty cells for channels without
+# statistics and nothing at all when summary is None
+def header_cells(summary, cell="th"):
+    if summary is None:
+        return ""
+    windows = next(iter(summary.values()))
+    return "".join(f"<{cell}><b>{window // 60} min</b></{cell}>" for window in windows)
+
+def stats_cells(summary, channel, digits=2):
+    if summary is None:
+        return ""
+    windows = next(iter(summary.values()))
+    if channel not in summary:
+        return "<td></td>" * len(windows)
+    cells = []
+    for s in summary[channel].values():
+        if not s['count']:
+            cells.append("<td>-</td>")
+            continue
+        cells.append(
+            f"<td><small>{s['mean']:.{digits}f} ± {s['std']:.{digits}f}<br>"
+            f"{s['min']:.{digits}f} – {s['max']:.{digits}f}, p95 {s['p95']:.{digits}f}</small></td>"
+        )
+    return "".join(cells)